@@ -33,12 +33,26 @@ cache.create()
 
 settings = Settings(location = PATH["CACHE"], defaults = {
     "jobs":                     DEFAULT["jobs"],
-    "trim_chunks":              DEFAULT["trim_chunks"],
+    "stream":                   DEFAULT["stream"],
+    "sra_cache_size":           DEFAULT["sra_cache_size"],
+    "fastq_compression":        DEFAULT["fastq_compression"],
+    "fastqc_batch_size":        DEFAULT["fastqc_batch_size"],
+    "qc_engine":                DEFAULT["qc_engine"],
+    "trim_backend":             DEFAULT["trim_backend"],
+    "primer_backend":           DEFAULT["primer_backend"],
+    "trim_shard_size":          DEFAULT["trim_shard_size"],
+    "merge_compression":        DEFAULT["merge_compression"],
+    "derep_backend":            DEFAULT["derep_backend"],
+    "classify_backend":         DEFAULT["classify_backend"],
+    "cluster_mode":             DEFAULT["cluster_mode"],
+    "tree_mode":                DEFAULT["tree_mode"],
+    "incremental":              DEFAULT["incremental"],
     "primer_difference":        DEFAULT["primer_difference"],
     "quality_average":          DEFAULT["quality_average"],
     "maximum_ambiguity":        DEFAULT["maximum_ambiguity"],
     "maximum_homopolymers":     DEFAULT["maximum_homopolymers"],
     "classification_cutoff":    DEFAULT["classification_cutoff"],
+    "classification_iterations": DEFAULT["classification_iterations"],
     "filter_taxonomy":          DEFAULT["filter_taxonomy"],
     "taxonomy_level":           DEFAULT["taxonomy_level"],
     "cutoff_level":             DEFAULT["cutoff_level"],
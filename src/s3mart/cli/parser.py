@@ -67,6 +67,11 @@ def get_parser():
         default = getenv("FORCE", False),
         help    = "Force."
     )
+    parser.add_argument("--report",
+        action  = "store_true",
+        default = getenv("REPORT", False),
+        help    = "Report the time and memory taken by mothur commands across runs."
+    )
 
     if _CAN_ANSI_FORMAT or "pytest" in sys.modules:
         parser.add_argument("--no-color",
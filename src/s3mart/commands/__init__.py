@@ -24,6 +24,7 @@ ARGUMENTS = dict(
     output						= None,
     ignore_error				= False,
     force						= False,
+    report						= False,
     verbose		 				= False
 )
 
@@ -71,4 +72,21 @@ def _command(*args, **kwargs):
         logger.info("Writing to output file %s..." % file_)
         touch(file_)
     
-    logger.info("Using %s jobs..." % a.jobs)
\ No newline at end of file
+    logger.info("Using %s jobs..." % a.jobs)
+
+    if a.report:
+        # imported here, s3mart.data requires the settings s3mart initialises after the commands.
+        from s3mart.data.mothur import read_profiles, report_profiles
+
+        rows = report_profiles(read_profiles())
+
+        if not rows:
+            cli.echo("No mothur runs profiled yet.")
+
+        for i, row in enumerate(rows):
+            if not i:
+                cli.echo("%-20s %-24s %6s %12s %12s %12s %12s" % ("run", "command", "runs", "wall (s)",
+                    "reported (s)", "cpu (s)", "peak rss (MB)"))
+
+            cli.echo("%-20s %-24s %6d %12.1f %12.1f %12.1f %12.1f" % (row["name"], row["command"], row["runs"],
+                row["wall"], row["reported"], row["cpu"], row["peak_rss"] / (1024 * 1024)))
@@ -14,12 +14,26 @@ CONST = {
 
 DEFAULT = {
     "jobs":                     getenv("JOBS", CPU_COUNT, prefix = _PREFIX),
-    "trim_chunks":              8,
+    "stream":                   False,
+    "sra_cache_size":           50 * 1024 ** 3,
+    "fastq_compression":        "none",
+    "fastqc_batch_size":        64,
+    "qc_engine":                "fastqc",
+    "trim_backend":             "mothur",
+    "primer_backend":           "mothur",
+    "trim_shard_size":          0,
+    "merge_compression":        "none",
+    "derep_backend":            "mothur",
+    "classify_backend":         "mothur",
+    "cluster_mode":             "split",
+    "tree_mode":                "sequences",
+    "incremental":              False,
     "primer_difference":        5,
     "quality_average":          35,
     "maximum_ambiguity":        0,
     "maximum_homopolymers":     8,
     "classification_cutoff":    80,
+    "classification_iterations": 100,
     "filter_taxonomy":          ["chloroplast", "mitochondria", "archaea", "eukaryota", "unknown"],
     "taxonomy_level":           6,
     "cutoff_level":             0.03,
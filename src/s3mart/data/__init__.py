@@ -20,13 +20,19 @@ from s3mart.data.functions import (
     get_input_data,
     get_fastq,
     check_quality,
+    quality_check,
     trim_seqs,
+    stream_seqs,
     merge_seqs,
     preprocess_seqs,
+    assign_seqs,
     build_plots,
     patch_tree_file,
 )
 from s3mart.data.util  import install_silva
+from s3mart.data.budget import resource_budget
+from s3mart.data.fastq  import get_fastq_files
+from s3mart.data.manifest import refresh_manifest
 
 logger = log.get_logger(name = NAME)
 
@@ -36,7 +42,7 @@ def get_fastq_group(group, data_dir = None, *args, **kwargs):
     jobs = kwargs.get("jobs", settings.get("jobs"))
     fastqc = kwargs.pop("fastqc", True)
 
-    with parallel.no_daemon_pool(processes = jobs) as pool:
+    with resource_budget(jobs), parallel.no_daemon_pool(processes = jobs) as pool:
         length = len(group)
 
         function = build_fn(get_fastq, data_dir = data_dir, fastqc = fastqc, *args, **kwargs)
@@ -48,34 +54,35 @@ def check_data(input = None, data_dir = None, *args, **kwargs):
     data_dir, groups = get_input_data(input = input, data_dir = data_dir, *args, **kwargs)
 
     data_dir = get_data_dir(NAME, data_dir)
+    jobs     = kwargs.get("jobs", settings.get("jobs"))
 
     logger.info("Checking data integrity...")
 
+    sra_ids  = [d["sra"] for data in itervalues(groups) for d in data]
+    manifest = refresh_manifest(data_dir, sra_ids, jobs = jobs)
+
     stats = autodict()
 
     global_total_sra = 0
     global_total_sra_available = 0
 
-    n_groups = len(groups)
-
-    for group, data in tq.tqdm(iteritems(groups), total = n_groups, desc = "Checking data integrity"):
+    for group, data in iteritems(groups):
         n_sra_success = 0
         total_sra     = len(data)
 
         for d in data:
             sra_id = d["sra"]
+            entry  = manifest.get(sra_id)
 
-            path_sra_fastq = osp.join(data_dir, sra_id)
-            files = get_files(path_sra_fastq, "*.fastq")
-
-            if not files:
+            if not entry or not entry["files"]:
                 logger.warning("No FASTQ files found for SRA ID: %s" % sra_id)
                 stats["sra"][sra_id]["fastq"] = False
             else:
                 stats["sra"][sra_id]["fastq"] = [{
-                    "path": path,
-                    "size": osp.getsize(path),
-                } for path in files]
+                    "path":  f["path"],
+                    "size":  f["size"],
+                    "reads": f["reads"],
+                } for f in entry["files"]]
                 n_sra_success += 1
 
         stats["group"][group]["sra"] = {
@@ -101,52 +108,95 @@ def get_data(input = None, data_dir = None, *args, **kwargs):
 
     logger.info("Data directory at %s." % data_dir)
 
-    if groups:
+    stream   = kwargs.get("stream", settings.get("stream"))
+
+    if groups and stream:
+        logger.info("Fetching and trimming FASTQ files in streaming mode...")
+        stream_seqs(data_dir = data_dir, data = groups, *args, **kwargs)
+    elif groups:
         logger.info("Fetching FASTQ files...")
-        with parallel.no_daemon_pool(processes = jobs) as pool:
-            function = build_fn(get_fastq_group, data_dir = data_dir, *args, **kwargs)
-            list(pool.imap(function, itervalues(groups)))
+
+        # a single pool over all SRAs, every tool invoked borrows from the same budget.
+        metas  = [meta for group in itervalues(groups) for meta in group]
+        length = len(metas)
+
+        fastqc = kwargs.pop("fastqc", True)
+
+        with resource_budget(jobs), parallel.no_daemon_pool(processes = jobs) as pool:
+            # quality checks are batched across all SRAs once every FASTQ file is available.
+            function = build_fn(get_fastq, data_dir = data_dir, fastqc = False, *args, **kwargs)
+            results  = pool.imap(function, metas)
+
+            list(tq.tqdm(results, total = length))
+
+            if fastqc:
+                logger.info("Checking quality of FASTQ files...")
+
+                files = [f for meta in metas for f in get_fastq_files(osp.join(data_dir, meta["sra"]))]
+                quality_check(files, output_dir = osp.join(data_dir, "fastqc"), jobs = jobs,
+                    engine = kwargs.get("qc_engine"))
 
 def preprocess_data(input = None, data_dir = None, *args, **kwargs):
     data_dir, data = get_input_data(input = input, data_dir = data_dir, *args, **kwargs)
     data_dir = get_data_dir(NAME, data_dir)
 
     minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
+    incremental    = kwargs.get("incremental", settings.get("incremental"))
+    jobs           = kwargs.get("jobs", settings.get("jobs"))
 
-    fastqc  = kwargs.get("fastqc",  True)
-    multiqc = fastqc and kwargs.get("multiqc", True)
+    with resource_budget(jobs):
+        fastqc  = kwargs.get("fastqc",  True)
+        multiqc = fastqc and kwargs.get("multiqc", True)
 
-    if multiqc:
-        check_quality(data_dir = data_dir, multiqc = multiqc, *args, **kwargs)
-    else:
-        logger.warning("MultiQC is disabled. Skipping quality check.")
+        if multiqc:
+            check_quality(data_dir = data_dir, multiqc = multiqc, *args, **kwargs)
+        else:
+            logger.warning("MultiQC is disabled. Skipping quality check.")
 
-    logger.info("Attempting to trim FASTQ files...")
-    trim_seqs(data_dir = data_dir, data = data, *args, **kwargs)
+        logger.info("Attempting to trim FASTQ files...")
+        trim_seqs(data_dir = data_dir, data = data, *args, **kwargs)
 
-    logger.info("Merging FASTQs...")
-    merge_seqs(data_dir = data_dir)
+        logger.info("Merging FASTQs...")
+        merge_seqs(data_dir = data_dir, **kwargs)
 
-    logger.info("Installing SILVA...")
-    silva_paths = install_silva()
+        logger.info("Installing SILVA...")
+        silva_paths = install_silva(pcr = True, jobs = jobs)
 
-    logger.success("SILVA successfully downloaded at %s." % silva_paths)
+        logger.success("SILVA successfully downloaded at %s." % silva_paths)
 
-    logger.info("Pre-processing FASTA + Group files...")
-    preprocess_seqs(data_dir = data_dir,
-        silva_seed = silva_paths["seed"], silva_gold = silva_paths["gold"],
-        silva_seed_tax = silva_paths["taxonomy"], *args, **kwargs
-    )
+        preprocessed = None
 
-    if minimal_output:
-        files = get_files(data_dir, "merged.*")
-        remove(*files)
+        if incremental:
+            logger.info("Assigning new groups to OTUs of the previous run...")
+            preprocessed = assign_seqs(data_dir = data_dir,
+                silva_gold = silva_paths["gold"], silva_seed_tax = silva_paths["taxonomy"],
+                silva_pcr  = silva_paths["pcr"], *args, **kwargs
+            )
 
-    logger.info("Render Plots...")
-    render_plots(input = input, data_dir = data_dir, *args, **kwargs)
+        if preprocessed is None:
+            logger.info("Pre-processing FASTA + Group files...")
+            preprocessed = preprocess_seqs(data_dir = data_dir,
+                silva_seed = silva_paths["seed"], silva_gold = silva_paths["gold"],
+                silva_seed_tax = silva_paths["taxonomy"], silva_pcr = silva_paths["pcr"], *args, **kwargs
+            )
 
-def render_plots(input = None, data_dir = None, *args, **kwargs):
-    data_dir, data = get_input_data(input = input, data_dir = data_dir, *args, **kwargs)
+        if not preprocessed:
+            # keep the merged files around for a subsequent run to resume from.
+            logger.warn("Preprocessing incomplete. Skipping plots.")
+            return
+
+        if minimal_output:
+            files = get_files(data_dir, "merged.*")
+            remove(*files)
+
+        logger.info("Render Plots...")
+        render_plots(input = input, data_dir = data_dir, data = data, *args, **kwargs)
+
+def render_plots(input = None, data_dir = None, data = None, *args, **kwargs):
+    if data is None:
+        data_dir, data = get_input_data(input = input, data_dir = data_dir, *args, **kwargs)
+
+    data_dir  = get_data_dir(NAME, data_dir)
     plot_dir  = osp.join(data_dir, "plots")
     makedirs(plot_dir, exist_ok = True)
 
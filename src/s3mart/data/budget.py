@@ -0,0 +1,180 @@
+import os, os.path as osp
+import time
+import fcntl
+import tempfile
+import contextlib
+
+from s3mart.config import PATH
+from s3mart.const  import CONST
+from s3mart import settings, __name__ as NAME
+
+from bpyutils.util.system import makedirs, make_temp_dir, touch
+from bpyutils import log
+
+logger = log.get_logger(name = NAME)
+
+CACHE  = PATH["CACHE"]
+
+_ENV_BUDGET_DIR  = "%s_BUDGET_DIR" % CONST["prefix"]
+_SLOT_PREFIX     = "slot-"
+_BORROWER_PREFIX = "borrower-"
+_POLL_INTERVAL   = 0.5
+
+class Budget:
+    """
+    A process-wide pool of CPU slots backed by lock files.
+
+    Each slot is a file within the budget directory that is held using an
+    exclusive ``flock``. Since the directory is shared through the environment,
+    every (nested) worker process forked off the pipeline borrows from the same
+    pool, thereby never exceeding the total number of jobs.
+
+    Borrowers are registered as lock files too, each borrower taking no more
+    than a fair share of the slots.
+    """
+    def __init__(self, path):
+        self.path  = path
+        self.slots = len([f for f in os.listdir(path) if f.startswith(_SLOT_PREFIX)])
+
+        self._borrower = None
+
+    @classmethod
+    def create(cls, path, slots):
+        makedirs(path, exist_ok = True)
+
+        for i in range(max(1, int(slots))):
+            touch(osp.join(path, "%s%s" % (_SLOT_PREFIX, i)))
+
+        return cls(path)
+
+    def _try_lock(self, i):
+        fd = os.open(osp.join(self.path, "%s%s" % (_SLOT_PREFIX, i)), os.O_RDWR)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            os.close(fd)
+            fd = None
+
+        return fd
+
+    def _release(self, fds):
+        for fd in fds:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @contextlib.contextmanager
+    def borrow(self):
+        """
+        Register as a borrower of the budget for the span of the context, so
+        that others acquiring slots meanwhile leave a share for it.
+        """
+        if self._borrower:
+            yield self
+            return
+
+        fd, path = tempfile.mkstemp(prefix = _BORROWER_PREFIX, dir = self.path)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+        self._borrower = path
+
+        try:
+            yield self
+        finally:
+            self._borrower = None
+
+            os.remove(path)
+            self._release([fd])
+
+    def active(self):
+        """
+        Count the borrowers registered (see ``borrow``), skipping those whose
+        process has died.
+        """
+        count = 0
+
+        for f in os.listdir(self.path):
+            if f.startswith(_BORROWER_PREFIX):
+                try:
+                    fd = os.open(osp.join(self.path, f), os.O_RDONLY)
+                except OSError:
+                    continue
+
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    count += 1
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                finally:
+                    os.close(fd)
+
+        return max(1, count)
+
+    @contextlib.contextmanager
+    def acquire(self, minimum = 1, maximum = None):
+        """
+        Borrow slots from the budget, blocking until at least ``minimum`` slots
+        are free and opportunistically taking up to ``maximum`` slots, though
+        no more than a fair share of the slots among the active borrowers.
+
+        Yields the number of slots held, to be used as the thread count for an
+        external tool.
+        """
+        maximum = min(maximum or self.slots, self.slots)
+        minimum = max(1, min(minimum, maximum))
+
+        held    = []
+
+        with self.borrow():
+            while True:
+                limit = min(maximum, max(minimum, self.slots // self.active()))
+
+                for i in range(self.slots):
+                    if len(held) >= limit:
+                        break
+
+                    fd = self._try_lock(i)
+
+                    if fd is not None:
+                        held.append(fd)
+
+                if len(held) >= minimum:
+                    break
+
+                # release partially acquired slots to avoid deadlocking with other waiters.
+                self._release(held)
+                held = []
+
+                time.sleep(_POLL_INTERVAL)
+
+            try:
+                yield len(held)
+            finally:
+                self._release(held)
+
+@contextlib.contextmanager
+def resource_budget(jobs = None):
+    """
+    Enter the process-wide resource budget, creating one of ``jobs`` slots if
+    no budget has been set up by a parent process.
+    """
+    path = os.environ.get(_ENV_BUDGET_DIR)
+
+    if path and osp.isdir(path):
+        yield Budget(path)
+    else:
+        jobs = int(jobs or settings.get("jobs"))
+
+        makedirs(CACHE, exist_ok = True)
+
+        with make_temp_dir(root_dir = CACHE) as tmp_dir:
+            logger.info("Setting up resource budget of %s slots at %s." % (jobs, tmp_dir))
+
+            budget = Budget.create(tmp_dir, jobs)
+            os.environ[_ENV_BUDGET_DIR] = tmp_dir
+
+            try:
+                yield budget
+            finally:
+                os.environ.pop(_ENV_BUDGET_DIR, None)
@@ -0,0 +1,225 @@
+import os.path as osp
+import io
+import re
+import collections
+import gzip
+import subprocess as sp
+from glob import glob
+
+from s3mart import __name__ as NAME
+
+from bpyutils.util.system import which, popen
+from bpyutils import log
+
+logger = log.get_logger(name = NAME)
+
+FASTQ_EXTENSIONS = (".fastq", ".fastq.gz", ".fastq.zst")
+
+_MATE_PATTERN = re.compile(r"^(?P<sample>.+)_(?P<mate>[12])$")
+
+COMPRESSION_EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst"
+}
+
+def is_fastq(path):
+    return path.endswith(FASTQ_EXTENSIONS)
+
+def get_fastq_files(dir_, recursive = True):
+    """
+    Find (optionally compressed) FASTQ files within a directory.
+    """
+    dir_  = osp.abspath(dir_)
+    files = []
+
+    for ext in FASTQ_EXTENSIONS:
+        pattern = "%s/**/*%s" % (dir_, ext) if recursive else "%s/*%s" % (dir_, ext)
+        files  += glob(pattern, recursive = recursive)
+
+    return sorted(files)
+
+def fastq_prefix(path):
+    """
+    Strip the directory and (compressed) FASTQ extension from a path.
+
+    Example::
+
+        >>> fastq_prefix("/data/SRR123/SRR123_1.fastq.gz")
+        'SRR123_1'
+    """
+    basename = osp.basename(path)
+
+    for ext in sorted(FASTQ_EXTENSIONS, key = len, reverse = True):
+        if basename.endswith(ext):
+            return basename[:-len(ext)]
+
+    prefix, _ = osp.splitext(basename)
+
+    return prefix
+
+def get_samples(files, paired = False):
+    """
+    Group FASTQ files into samples, pairing ``<sample>_1``/``<sample>_2``
+    mates when ``paired``. Files without a mate form single-end samples.
+    """
+    samples = collections.OrderedDict()
+
+    for f in files:
+        prefix = fastq_prefix(f)
+        match  = _MATE_PATTERN.match(prefix) if paired else None
+        key    = (osp.dirname(f), match.group("sample") if match else prefix, bool(match))
+
+        samples.setdefault(key, []).append(f)
+
+    result  = []
+
+    for mates in samples.values():
+        if len(mates) == 2:
+            result.append(sorted(mates))
+        else:
+            result += [[mate] for mate in mates]
+
+    return result
+
+def sample_name(files):
+    """
+    Get the name of a sample, stripping the mate suffix of paired files.
+
+    Example::
+
+        >>> sample_name(["/data/SRR123/SRR123_1.fastq", "/data/SRR123/SRR123_2.fastq"])
+        'SRR123'
+    """
+    prefix = fastq_prefix(files[0])
+
+    if len(files) == 2:
+        match  = _MATE_PATTERN.match(prefix)
+        prefix = match.group("sample") if match else prefix
+
+    return prefix
+
+def get_compression(path):
+    for compression, ext in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(ext):
+            return compression
+
+    return None
+
+def _zstd_reader(path):
+    try:
+        import zstandard
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd = True))
+    except ImportError:
+        proc = sp.Popen(["zstd", "-dcq", path], stdout = sp.PIPE)
+        return proc.stdout
+
+def open_fastq(path):
+    """
+    Open a (optionally compressed) FASTQ file as a binary stream, decompressing
+    on the fly.
+    """
+    compression = get_compression(path)
+
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    elif compression == "zstd":
+        return _zstd_reader(path)
+
+    return open(path, "rb")
+
+def read_fastq(path):
+    """
+    Stream records of a (optionally compressed) FASTQ file as tuples of
+    ``(name, sequence, quality)`` bytes.
+    """
+    with open_fastq(path) as f:
+        while True:
+            header = f.readline()
+
+            if not header:
+                break
+
+            sequence = f.readline().rstrip()
+            f.readline()
+            quality  = f.readline().rstrip()
+
+            yield header[1:].rstrip(), sequence, quality
+
+def read_fastq_batches(path, batch_size = 100000, chunk_size = 16 * 1024 * 1024):
+    """
+    Stream a (optionally compressed) 4-line FASTQ file in batches, yielding
+    tuples of ``(names, sequences, qualities)`` lists of bytes.
+
+    Reads are parsed from large blocks rather than line by line, which is
+    considerably faster for the short reads typical of 16S data.
+    """
+    names, sequences, qualities = [], [], []
+
+    with open_fastq(path) as f:
+        buffer = b""
+
+        while True:
+            chunk = f.read(chunk_size)
+            lines = (buffer + chunk).split(b"\n")
+
+            if chunk:
+                buffer = lines.pop()
+            else:
+                buffer = b""
+
+                while lines and not lines[-1]:
+                    lines.pop()
+
+            n = len(lines) // 4 * 4
+
+            if chunk and n < len(lines):
+                buffer = b"\n".join(lines[n:] + [buffer])
+
+            names     += [name[1:] for name in lines[0:n:4]]
+            sequences += lines[1:n:4]
+            qualities += lines[3:n:4]
+
+            while len(names) >= batch_size:
+                yield names[:batch_size], sequences[:batch_size], qualities[:batch_size]
+
+                names, sequences, qualities = names[batch_size:], sequences[batch_size:], qualities[batch_size:]
+
+            if not chunk:
+                break
+
+    if names:
+        yield names, sequences, qualities
+
+def compress_fastq(path, compression = "gzip", threads = 1):
+    """
+    Compress a FASTQ file in place using a multi-threaded compressor
+    (``pigz``/``zstd``), returning the path to the compressed file.
+    """
+    if compression == "gzip":
+        if which("pigz"):
+            command = "pigz -f -p {threads} {path}"
+        else:
+            command = "gzip -f {path}"
+    elif compression == "zstd":
+        command = "zstd -q -f --rm -T{threads} {path}"
+    else:
+        raise ValueError("Unknown compression %s." % compression)
+
+    popen(command.format(threads = threads, path = path))
+
+    return "%s%s" % (path, COMPRESSION_EXTENSIONS[compression])
+
+def decompress_fastq(path, target):
+    """
+    Decompress a FASTQ file to a target path.
+    """
+    with open_fastq(path) as src, open(target, "wb") as dst:
+        while True:
+            chunk = src.read(1024 * 1024)
+
+            if not chunk:
+                break
+
+            dst.write(chunk)
+
+    return target
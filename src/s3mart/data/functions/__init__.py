@@ -1,8 +1,12 @@
-from s3mart.data.functions.get_input_data  import get_input_data
+from s3mart.data.functions.get_input_data  import get_input_data, get_study
 from s3mart.data.functions.get_fastq       import get_fastq
-from s3mart.data.functions.check_quality   import check_quality
+from s3mart.data.functions.check_quality   import check_quality, fastqc_batch, quality_check
 from s3mart.data.functions.trim_seqs       import trim_seqs
+from s3mart.data.functions.stream_seqs     import stream_seqs
 from s3mart.data.functions.merge_seqs      import merge_seqs
+from s3mart.data.functions.classify_seqs   import classify_seqs
+from s3mart.data.functions.cluster_seqs    import cluster_seqs
+from s3mart.data.functions.assign_seqs     import assign_seqs
 from s3mart.data.functions.preprocess_seqs import preprocess_seqs
 from s3mart.data.functions.build_plots     import build_plots
 from s3mart.data.functions.patch_tree_file import patch_tree_file
\ No newline at end of file
@@ -0,0 +1,442 @@
+import os, os.path as osp
+import collections
+
+from s3mart import settings, __name__ as NAME
+
+from bpyutils.util.array   import sequencify
+from bpyutils.util.ml      import get_data_dir
+from bpyutils.util.system  import makedirs, remove
+from bpyutils import log
+
+from s3mart.data.util   import build_mothur_script, stage_files
+from s3mart.data.budget import resource_budget
+from s3mart.data.mothur import run_mothur
+from s3mart.data.native.derep  import read_fasta, read_groups, read_count_table, dereplicate
+from s3mart.data.native.tree   import get_otu_representatives, write_distances
+from s3mart.data.native.assign import map_sequences
+from s3mart.data.functions.merge_seqs    import get_merged_files
+from s3mart.data.functions.classify_seqs import classify_seqs
+from s3mart.data.functions.cluster_seqs  import read_bin_list
+
+logger = log.get_logger(name = NAME)
+
+_DIR_NAME_OTUS        = "otus"
+_DIR_NAME_INCREMENTAL = "incremental"
+
+_FILENAME_REPRESENTATIVES = "representatives"
+
+_OUTPUTS = ("shared", "taxonomy", "list")
+
+def get_otu_index(data_dir):
+    """
+    Get the paths to the OTU index of a data directory, the (aligned)
+    representative of each OTU named after its OTU along with its taxonomy.
+    """
+    return {
+        "fasta":    osp.join(data_dir, _DIR_NAME_OTUS, "%s.fasta" % _FILENAME_REPRESENTATIVES),
+        "taxonomy": osp.join(data_dir, _DIR_NAME_OTUS, "%s.taxonomy" % _FILENAME_REPRESENTATIVES)
+    }
+
+def read_otu_taxonomy(path):
+    """
+    Read a consensus taxonomy (as written by ``classify.otu``), returning the
+    size and taxonomy of each OTU.
+    """
+    taxonomy = collections.OrderedDict()
+
+    with open(path) as f:
+        f.readline()
+
+        for line in f:
+            if line.strip():
+                otu, size, lineage = line.rstrip("\n").split("\t")
+                taxonomy[otu] = [int(size), lineage]
+
+    return taxonomy
+
+def write_otu_taxonomy(path, taxonomy):
+    with open(path, "w") as f:
+        f.write("OTU\tSize\tTaxonomy\n")
+
+        for otu, (size, lineage) in taxonomy.items():
+            f.write("%s\t%s\t%s\n" % (otu, size, lineage))
+
+    return path
+
+def read_shared(path):
+    """
+    Read a shared file, returning its label, its OTUs and the abundance of
+    each OTU within each group.
+    """
+    label, otus, rows = None, [ ], collections.OrderedDict()
+
+    with open(path) as f:
+        otus = f.readline().rstrip("\n").split("\t")[3:]
+
+        for line in f:
+            if line.strip():
+                fields = line.rstrip("\n").split("\t")
+
+                label  = fields[0]
+                rows[fields[1]] = [int(x) for x in fields[3:]]
+
+    return label, otus, rows
+
+def write_shared(path, label, otus, rows):
+    with open(path, "w") as f:
+        f.write("\t".join(["label", "Group", "numOtus"] + otus) + "\n")
+
+        for group, abundances in rows.items():
+            f.write("\t".join([str(label), group, str(len(otus))] + [str(x) for x in abundances]) + "\n")
+
+    return path
+
+def _replace(path, write_fn, *args):
+    # output files are hard-links to the preprocessed files, replaced rather than written through.
+    write_fn("%s.tmp" % path, *args)
+    os.replace("%s.tmp" % path, path)
+
+def build_otu_index(fasta, list_file, count_table, taxonomy, target_dir, label = None):
+    """
+    Build the OTU index (see ``get_otu_index``) of a run from its aligned
+    unique sequences, list file, count table and consensus taxonomy, the most
+    abundant sequence of each OTU being its representative.
+    """
+    representatives = get_otu_representatives(list_file, count_table, label = label)
+    names    = { name.encode(): otu for otu, name in representatives.items() }
+
+    taxonomy = read_otu_taxonomy(taxonomy)
+    index    = get_otu_index(target_dir)
+
+    makedirs(osp.dirname(index["fasta"]), exist_ok = True)
+
+    with open("%s.tmp" % index["fasta"], "wb") as f:
+        for name, sequence in read_fasta(fasta):
+            if name in names:
+                f.write(b">%s\n%s\n" % (names[name].encode(), sequence))
+
+    _replace(index["taxonomy"], write_otu_taxonomy, taxonomy)
+    os.replace("%s.tmp" % index["fasta"], index["fasta"])
+
+    logger.success("Built OTU index of %s representatives at %s." % (len(names), osp.dirname(index["fasta"])))
+
+    return index
+
+def name_otus(otus, n):
+    """
+    Name ``n`` OTUs following the OTUs ``otus`` (``Otu<n>`` zero-padded to the
+    width of the existing names), leaving the existing names as they are.
+    """
+    numbers = [int(otu[3:]) for otu in otus]
+    width   = len(otus[0]) - 3 if otus else 1
+    start   = max(numbers) + 1 if numbers else 1
+
+    return ["Otu%0*d" % (width, i) for i in range(start, start + n)]
+
+def update_outputs(outputs, assigned, counts, groups, taxonomy):
+    """
+    Update the ``shared``, ``taxonomy`` and ``list`` files ``outputs`` of a
+    previous run with sequences ``assigned`` to OTUs, adding a row for each
+    of the ``groups``. OTUs of ``taxonomy`` not yet within the outputs are
+    added along with it. The list file is updated at the label of the shared
+    file.
+    """
+    label, otus, rows = read_shared(outputs["shared"])
+
+    existing = set(otus)
+    new      = [otu for otu in taxonomy if otu not in existing]
+    otus     = otus + new
+    index    = { otu: i for i, otu in enumerate(otus) }
+
+    for abundances in rows.values():
+        abundances.extend([0] * len(new))
+
+    for group in groups:
+        rows[group] = [0] * len(otus)
+
+    sizes    = collections.Counter()
+    members  = collections.defaultdict(list)
+
+    for name, otu in assigned.items():
+        count = counts[name]
+
+        for group, c in count.items():
+            if group != "_total":
+                rows[group][index[otu]] += c
+
+        sizes[otu] += count["_total"]
+        members[otu].append(name)
+
+    _replace(outputs["shared"], write_shared, label, otus, rows)
+
+    taxonomy_ = read_otu_taxonomy(outputs["taxonomy"])
+
+    for otu in otus:
+        if otu not in taxonomy_:
+            taxonomy_[otu] = [0, taxonomy[otu]]
+
+        taxonomy_[otu][0] += sizes[otu]
+
+    _replace(outputs["taxonomy"], write_otu_taxonomy, taxonomy_)
+
+    with open(outputs["list"]) as f:
+        lines = f.read().splitlines()
+
+    def write_list(path):
+        header = lines[0].split("\t")
+
+        with open(path, "w") as f:
+            f.write("\t".join(header + new) + "\n")
+
+            for line in lines[1:]:
+                fields = line.split("\t")
+
+                if fields[0] == label:
+                    fields = fields[:2] + [",".join([names] + members[otu]) if members[otu] else names
+                        for otu, names in zip(header[2:], fields[2:])]
+                    fields[1] = str(len(otus))
+                    fields   += [",".join(members[otu]) for otu in new]
+
+                f.write("\t".join(fields) + "\n")
+
+    _replace(outputs["list"], write_list)
+
+    return { "otus": len(new), "groups": len(groups) }
+
+def _split_groups(merged, known, fasta, group):
+    """
+    Write the sequences of groups not ``known`` into a FASTA and group file,
+    returning the groups written.
+    """
+    names, groups = set(), set()
+
+    with open(group, "wb") as f:
+        for name, group_ in read_groups(merged["group"]):
+            if group_.decode() not in known:
+                names.add(name)
+                groups.add(group_.decode())
+
+                f.write(b"%s\t%s\n" % (name, group_))
+
+    with open(fasta, "wb") as f:
+        for name, sequence in read_fasta(merged["fasta"]):
+            if name in names:
+                f.write(b">%s\n%s\n" % (name, sequence))
+
+    return sorted(groups)
+
+def _write_subset(fasta, count_table, names, output_fasta, output_count):
+    with open(output_fasta, "wb") as f:
+        for name, sequence in read_fasta(fasta):
+            if name.decode() in names:
+                f.write(b">%s\n%s\n" % (name, sequence))
+
+    with open(count_table) as source, open(output_count, "w") as target:
+        for line in source:
+            if line.startswith("#") or line.startswith("Representative_Sequence") or \
+                line.split("\t", 1)[0] in names:
+                target.write(line)
+
+def _run_stage(stage, work_dir, outputs, **kwargs):
+    mothur_file = osp.join(work_dir, "%s.mothur" % stage)
+    build_mothur_script(template = "mothur/assign", output = mothur_file, stage = stage, **kwargs)
+
+    code    = run_mothur(mothur_file, cwd = work_dir, name = "assign-%s" % stage)
+    missing = [f for f in outputs if not osp.exists(osp.join(work_dir, f))]
+
+    if code or missing:
+        logger.error("Error running assignment stage %s. Missing outputs: %s" % (stage, missing))
+        return False
+
+    return True
+
+def assign_seqs(data_dir = None, **kwargs):
+    """
+    Assign the sequences of groups not yet within the outputs of a previous
+    run to its OTUs (closed-reference), mapping each aligned unique sequence
+    to the nearest OTU representative within ``cutoff_level``. Sequences
+    left unmapped are checked for chimeras, classified and clustered de novo
+    into new OTUs.
+
+    ``output.shared``, ``output.taxonomy`` and ``output.list`` along with the
+    OTU index are updated in place. Once new OTUs are added, ``output.tre``
+    is rebuilt over the representative of every OTU (as a ``tree_mode`` of
+    ``otus`` does), its leaves being OTUs rather than sequences. Returns
+    ``None`` if there's no previous run to assign sequences to, otherwise
+    whether the outputs were updated.
+    """
+    data_dir = get_data_dir(NAME, data_dir)
+    jobs     = kwargs.get("jobs", settings.get("jobs"))
+
+    minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
+
+    index    = get_otu_index(data_dir)
+    outputs  = { type_: osp.join(data_dir, "output.%s" % type_) for type_ in _OUTPUTS }
+
+    silva_pcr = kwargs.get("silva_pcr")
+
+    if not silva_pcr or not all(osp.exists(f) for f in list(index.values()) + list(outputs.values())):
+        logger.warn("No OTU index of a previous run found within %s." % data_dir)
+        return None
+
+    compression    = kwargs.get("merge_compression", settings.get("merge_compression"))
+    compression    = None if compression == "none" else compression
+
+    merged         = get_merged_files(data_dir, compression = compression)
+
+    classify_backend = kwargs.get("classify_backend", settings.get("classify_backend"))
+    cutoff_level     = settings.get("cutoff_level")
+
+    filter_taxonomy = settings.get("filter_taxonomy")
+    if not isinstance(filter_taxonomy, (list, tuple)):
+        filter_taxonomy = eval(filter_taxonomy)
+        filter_taxonomy = sequencify(filter_taxonomy)
+
+    work_dir = osp.join(data_dir, _DIR_NAME_INCREMENTAL)
+    remove(work_dir, recursive = True, raise_err = False)
+    makedirs(work_dir, exist_ok = True)
+
+    _, _, rows = read_shared(outputs["shared"])
+
+    new_fasta  = osp.join(work_dir, "new.fasta")
+    new_group  = osp.join(work_dir, "new.group")
+
+    groups     = _split_groups(merged, set(rows), new_fasta, new_group)
+
+    if not groups:
+        logger.warn("No new groups found, outputs already up to date.")
+        remove(work_dir, recursive = True)
+        return True
+
+    logger.info("Assigning %s new group(s) to OTUs of the previous run..." % len(groups))
+
+    pcr_dir    = osp.dirname(silva_pcr)
+    references = [osp.join(pcr_dir, f) for f in sorted(os.listdir(pcr_dir))]
+
+    template_kwargs = dict(
+        silva_pcr      = osp.join(work_dir, osp.basename(silva_pcr)),
+        silva_seed_tax = osp.join(work_dir, osp.basename(kwargs["silva_seed_tax"])),
+        silva_gold     = osp.join(work_dir, osp.basename(kwargs["silva_gold"])),
+
+        maxhomop              = settings.get("maximum_homopolymers"),
+        classification_cutoff = settings.get("classification_cutoff"),
+        classification_iterations = settings.get("classification_iterations"),
+        filter_taxonomy       = filter_taxonomy,
+        cutoff_level          = cutoff_level
+    )
+
+    with resource_budget(jobs) as budget, budget.acquire(maximum = jobs) as processors:
+        stage_files(kwargs["silva_gold"], *references, dest = work_dir)
+
+        unique_fasta = osp.join(work_dir, "new.unique.fasta")
+        count_table  = osp.join(work_dir, "new.count_table")
+
+        dereplicate(new_fasta, new_group, unique_fasta, count_table, jobs = processors)
+
+        if not _run_stage("align", work_dir, ["aligned.fasta", "aligned.count_table"], prefix = "aligned",
+            fasta = unique_fasta, count = count_table, processors = processors, **template_kwargs):
+            return False
+
+        aligned   = osp.join(work_dir, "aligned.fasta")
+        _, counts = read_count_table(osp.join(work_dir, "aligned.count_table"))
+
+        mapped    = map_sequences(aligned, index["fasta"], cutoff = cutoff_level)
+        assigned  = { name: otu for name, (otu, _) in mapped.items() }
+
+        logger.info("Mapped %s of %s unique sequences to existing OTUs." % (len(mapped), len(counts)))
+
+        taxonomy  = collections.OrderedDict((otu, lineage) for otu, (_, lineage) in
+            read_otu_taxonomy(index["taxonomy"]).items())
+
+        remainder = set(name for name in counts if name not in mapped)
+
+        if remainder:
+            logger.info("Clustering %s unmapped sequences de novo..." % len(remainder))
+
+            _write_subset(aligned, osp.join(work_dir, "aligned.count_table"), remainder,
+                osp.join(work_dir, "remainder.fasta"), osp.join(work_dir, "remainder.count_table"))
+
+            if not _run_stage("chimera", work_dir, ["chimera.fasta", "chimera.count_table"], prefix = "chimera",
+                fasta = osp.join(work_dir, "remainder.fasta"), count = osp.join(work_dir, "remainder.count_table"),
+                processors = processors, **template_kwargs):
+                return False
+
+            classified = classify_seqs(osp.join(work_dir, "chimera.fasta"), osp.join(work_dir, "chimera.count_table"),
+                osp.join(work_dir, "chimera.wang.taxonomy"), references = references,
+                shards = processors, processors = processors,
+                silva_pcr      = template_kwargs["silva_pcr"],
+                silva_seed_tax = template_kwargs["silva_seed_tax"],
+                classification_cutoff     = template_kwargs["classification_cutoff"],
+                classification_iterations = template_kwargs["classification_iterations"],
+                backend = classify_backend
+            )
+
+            if not classified:
+                logger.error("Error classifying unmapped sequences.")
+                return False
+
+            denovo = {
+                "fasta":    "denovo.fasta",
+                "count":    "denovo.count_table",
+                "list":     "denovo.opti_mcc.list",
+                "taxonomy": "denovo.opti_mcc.%s.cons.taxonomy" % cutoff_level
+            }
+            denovo = { type_: osp.join(work_dir, f) for type_, f in denovo.items() }
+
+            if not _run_stage("cluster", work_dir, list(denovo.values()), prefix = "denovo",
+                fasta = osp.join(work_dir, "chimera.fasta"), count = osp.join(work_dir, "chimera.count_table"),
+                taxonomy = classified, processors = processors, **template_kwargs):
+                return False
+
+            # pre-clustered sequences carry the counts of the sequences merged into them.
+            _, denovo_counts = read_count_table(denovo["count"])
+            counts.update(denovo_counts)
+
+            otus  = read_bin_list(denovo["list"], label = cutoff_level)
+            abundance = lambda otu: sum(counts[name]["_total"] for name in otus[otu])
+
+            order = sorted(otus, key = lambda otu: (-abundance(otu), otu))
+            names = dict(zip(order, name_otus(list(taxonomy), len(order))))
+
+            cons  = read_otu_taxonomy(denovo["taxonomy"])
+
+            for otu in order:
+                taxonomy[names[otu]] = cons[otu][1]
+
+                for name in otus[otu]:
+                    assigned[name] = names[otu]
+
+            logger.info("Clustered unmapped sequences into %s new OTUs." % len(order))
+
+            # the most abundant sequence of each new OTU, as ``build_otu_index`` picks them.
+            representatives = { max(otus[otu], key = lambda name: counts[name]["_total"]).encode(): names[otu]
+                for otu in order }
+
+            with open(index["fasta"], "ab") as f:
+                for name, sequence in read_fasta(denovo["fasta"]):
+                    if name in representatives:
+                        f.write(b">%s\n%s\n" % (representatives[name].encode(), sequence))
+
+        stats = update_outputs(outputs, assigned, counts, groups, taxonomy)
+
+        _replace(index["taxonomy"], write_otu_taxonomy, read_otu_taxonomy(outputs["taxonomy"]))
+
+        tree = osp.join(data_dir, "output.tre")
+
+        if stats["otus"] and osp.exists(tree):
+            # the previous tree has no leaves for new OTUs, rebuilt over every OTU's representative.
+            logger.info("Rebuilding the tree over the representatives of %s OTUs..." % len(taxonomy))
+
+            phylip = write_distances(index["fasta"], list(taxonomy), osp.join(work_dir, "otus.phylip.dist"))
+
+            if not _run_stage("tree", work_dir, ["otus.phylip.tre"], phylip = phylip, **template_kwargs):
+                return False
+
+            os.replace(osp.join(work_dir, "otus.phylip.tre"), tree)
+
+    logger.success("Assigned %s new group(s), adding %s new OTUs." % (stats["groups"], stats["otus"]))
+
+    if minimal_output:
+        remove(work_dir, recursive = True)
+
+    return True
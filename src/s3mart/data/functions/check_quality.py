@@ -9,24 +9,91 @@ from bpyutils.util.system  import (
     get_files,
     remove
 )
+from bpyutils.util.array   import chunkify
 from bpyutils import log
 
+from s3mart.data.budget import resource_budget
+from s3mart.data.fastq  import fastq_prefix, get_compression
+from s3mart.data.native import native_qc
+
 logger = log.get_logger(name = NAME)
 
 def fastqc_check(file_, output_dir = None, threads = None):
-    output_dir = output_dir or os.cwd()
-    threads    = threads or settings.get("jobs")
+    output_dir = output_dir or os.getcwd()
 
-    basename   = osp.basename(file_)
-    prefix, _  = osp.splitext(basename)
+    prefix     = fastq_prefix(file_)
 
     if not get_files(output_dir, "%s_fastqc.*" % prefix):
-        with ShellEnvironment(cwd = output_dir) as shell:
-            shell("fastqc -q --threads {threads} {fastq_file} -o {out_dir}".format(
-                threads = threads, out_dir = output_dir, fastq_file = file_))
+        # FastQC parallelises over files, a single file never uses more than one thread.
+        with resource_budget() as budget, budget.acquire(maximum = threads or 1) as threads:
+            with ShellEnvironment(cwd = output_dir) as shell:
+                if get_compression(file_) == "zstd":
+                    # FastQC can't read zstd, stream the decompressed reads instead.
+                    shell("zstd -dcq {fastq_file} | fastqc -q --threads {threads} stdin:{prefix} -o {out_dir}".format(
+                        threads = threads, out_dir = output_dir, fastq_file = file_, prefix = prefix))
+                else:
+                    shell("fastqc -q --threads {threads} {fastq_file} -o {out_dir}".format(
+                        threads = threads, out_dir = output_dir, fastq_file = file_))
     else:
         logger.warn("FASTQC for file %s already exists." % file_)
 
+def _get_fastqc_index(output_dir):
+    index = set()
+
+    if osp.isdir(output_dir):
+        for fname in os.listdir(output_dir):
+            for suffix in ("_fastqc.zip", "_fastqc.html"):
+                if fname.endswith(suffix):
+                    index.add(fname[:-len(suffix)])
+
+    return index
+
+def fastqc_batch(files, output_dir = None, jobs = None, batch_size = None):
+    """
+    Run FastQC over a list of files using a few batched invocations rather
+    than a JVM per file. Files that already have a report within
+    ``output_dir`` are skipped.
+    """
+    output_dir = output_dir or os.getcwd()
+    jobs       = int(jobs or settings.get("jobs"))
+    batch_size = int(batch_size or settings.get("fastqc_batch_size"))
+
+    makedirs(output_dir, exist_ok = True)
+
+    index      = _get_fastqc_index(output_dir)
+    pending    = [f for f in files if fastq_prefix(f) not in index]
+
+    if len(pending) < len(files):
+        logger.warn("FASTQC for %s file(s) already exists." % (len(files) - len(pending)))
+
+    # FastQC can't read zstd files, these are streamed one by one.
+    streamed   = [f for f in pending if get_compression(f) == "zstd"]
+    pending    = [f for f in pending if get_compression(f) != "zstd"]
+
+    for file_ in streamed:
+        fastqc_check(file_, output_dir = output_dir)
+
+    with resource_budget(jobs) as budget:
+        for batch in chunkify(pending, batch_size):
+            with budget.acquire(maximum = min(len(batch), jobs)) as threads:
+                logger.info("Running FASTQC on %s file(s) using %s threads..." % (len(batch), threads))
+
+                with ShellEnvironment(cwd = output_dir) as shell:
+                    shell("fastqc -q --threads {threads} {fastq_files} -o {out_dir}".format(
+                        threads = threads, out_dir = output_dir, fastq_files = " ".join(batch)))
+
+def quality_check(files, output_dir = None, jobs = None, engine = None):
+    """
+    Check the quality of FASTQ files using either FastQC or the native QC
+    engine (see ``qc_engine``).
+    """
+    engine = engine or settings.get("qc_engine")
+
+    if engine == "native":
+        native_qc(files, output_dir = output_dir, jobs = jobs)
+    else:
+        fastqc_batch(files, output_dir = output_dir, jobs = jobs)
+
 def check_quality(data_dir = None, multiqc = False, **kwargs):    
     data_dir = get_data_dir(NAME, data_dir)
     # jobs     = kwargs.get("jobs", settings.get("jobs"))
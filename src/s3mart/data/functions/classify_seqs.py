@@ -0,0 +1,187 @@
+import os.path as osp
+import collections
+
+from multiprocessing.pool import ThreadPool
+
+from s3mart import __name__ as NAME
+
+from bpyutils.util.system  import makedirs, get_files, remove
+from bpyutils import parallel, log
+
+from s3mart.data.util   import build_mothur_script, stage_files, concatenate_files
+from s3mart.data.mothur import run_mothur
+from s3mart.data.native.derep import read_fasta, read_count_table
+from s3mart.data.native.classify import build_index, classify, _CONFIDENCE_PATTERN
+
+logger = log.get_logger(name = NAME)
+
+_DIR_NAME_SHARDS     = "classify.shards"
+_FILENAME_SHARD      = "shard"
+
+# fewer sequences aren't worth the cost of loading the classifier's tables again.
+_MIN_SHARD_SEQUENCES = 1000
+
+BACKENDS             = ("mothur", "native")
+
+def write_tax_summary(taxonomy, count_table, output):
+    """
+    Summarise a taxonomy weighted by a count table, as ``classify.seqs`` does
+    within its ``.tax.summary`` file.
+
+    Taxa are listed depth-first with their children sorted by name, each child
+    ranked after its parent (``0.2.1`` being the first child of the second
+    child of the root).
+    """
+    groups, counts = read_count_table(count_table)
+
+    tree = { "name": "Root", "level": 0, "total": 0, "groups": collections.Counter(), "children": { } }
+
+    with open(taxonomy) as f:
+        for line in f:
+            name, lineage = line.rstrip("\n").split("\t")
+
+            count = counts.get(name, { "_total": 1 })
+            total = count["_total"]
+
+            node  = tree
+
+            node["total"] += total
+            node["groups"].update({ k: v for k, v in count.items() if k != "_total" })
+
+            for level, taxon in enumerate(filter(None, lineage.split(";")), start = 1):
+                taxon = _CONFIDENCE_PATTERN.sub("", taxon)
+
+                if taxon not in node["children"]:
+                    node["children"][taxon] = { "name": taxon, "level": level, "total": 0,
+                        "groups": collections.Counter(), "children": { } }
+
+                node = node["children"][taxon]
+
+                node["total"] += total
+                node["groups"].update({ k: v for k, v in count.items() if k != "_total" })
+
+    def lines(node, rank):
+        row = [node["level"], rank, node["name"], len(node["children"]), node["total"]] + \
+            [node["groups"][group] for group in groups]
+
+        yield "\t".join(str(x) for x in row)
+
+        for i, name in enumerate(sorted(node["children"]), start = 1):
+            for line in lines(node["children"][name], "%s.%s" % (rank, i)):
+                yield line
+
+    with open(output, "w") as f:
+        f.write("\t".join(["taxlevel", "rankID", "taxon", "daughterlevels", "total"] + groups) + "\n")
+
+        for line in lines(tree, "0"):
+            f.write(line + "\n")
+
+    return output
+
+def shard_fasta(fasta, target_dir, shards = 1):
+    """
+    Split a FASTA file into (at most) ``shards`` contiguous shards of
+    ``target_dir``, returning the path to each shard in order.
+    """
+    total = sum(1 for _ in read_fasta(fasta))
+    size  = max(_MIN_SHARD_SEQUENCES, -(-total // max(1, shards)))
+
+    paths = [ ]
+    f     = None
+
+    for i, (name, sequence) in enumerate(read_fasta(fasta)):
+        if not i % size:
+            if f:
+                f.close()
+
+            shard_dir = makedirs(osp.join(target_dir, str(len(paths))), exist_ok = True)
+            paths.append(osp.join(shard_dir, "%s.fasta" % _FILENAME_SHARD))
+
+            f = open(paths[-1], "wb")
+
+        f.write(b">%s\n%s\n" % (name, sequence))
+
+    if f:
+        f.close()
+    else:
+        paths.append(osp.join(makedirs(osp.join(target_dir, "0"), exist_ok = True), "%s.fasta" % _FILENAME_SHARD))
+        open(paths[-1], "wb").close()
+
+    return paths
+
+def _classify_shard(path, references = (), **kwargs):
+    shard_dir   = osp.dirname(path)
+
+    # the reference along with the classifier's tables, built once and linked.
+    stage_files(*references, dest = shard_dir)
+
+    mothur_file = osp.join(shard_dir, "script")
+    build_mothur_script(
+        template = "mothur/classify",
+        output   = mothur_file,
+        fasta    = path,
+        silva_pcr      = osp.join(shard_dir, osp.basename(kwargs["silva_pcr"])),
+        silva_seed_tax = osp.join(shard_dir, osp.basename(kwargs["silva_seed_tax"])),
+        classification_cutoff     = kwargs["classification_cutoff"],
+        classification_iterations = kwargs["classification_iterations"],
+        processors = kwargs.get("processors", 1)
+    )
+
+    code = run_mothur(mothur_file, cwd = shard_dir, name = "classify")
+
+    taxonomy = get_files(shard_dir, "%s.*.wang.taxonomy" % _FILENAME_SHARD)
+
+    if code or not taxonomy:
+        logger.error("Unable to classify shard %s." % path)
+        return None
+
+    return taxonomy[0]
+
+def classify_seqs(fasta, count_table, target, references = (), shards = 1, backend = "mothur", **kwargs):
+    """
+    Classify a FASTA file into the taxonomy ``target``, summarised (see
+    ``write_tax_summary``) into a ``.tax.summary`` with the counts of
+    ``count_table`` as ``classify.seqs`` does.
+
+    The ``mothur`` backend splits the FASTA file into contiguous shards, each
+    classified by ``classify.seqs`` in parallel and concatenated (in order).
+    The ``native`` backend classifies sequences against a k-mer table built
+    (once) from the reference (see ``s3mart.data.native.classify``).
+
+    Returns the path to the taxonomy, ``None`` if classification failed.
+    Raises ``ValueError`` for any other backend.
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown classification backend: %s. Expected one of %s." % (backend, ", ".join(BACKENDS)))
+
+    processors = int(kwargs.pop("processors", 1))
+
+    if backend == "native":
+        index = build_index(kwargs["silva_pcr"], kwargs["silva_seed_tax"])
+        classify(fasta, index, target, cutoff = kwargs["classification_cutoff"],
+            iters = kwargs["classification_iterations"], jobs = processors)
+    else:
+        work_dir   = osp.join(osp.dirname(osp.abspath(target)), _DIR_NAME_SHARDS)
+        remove(work_dir, recursive = True, raise_err = False)
+
+        paths      = shard_fasta(fasta, work_dir, shards = shards)
+        processors = max(1, processors // len(paths))
+
+        logger.info("Classifying %s in %s shard(s) using %s processor(s) each..." % (fasta, len(paths), processors))
+
+        with parallel.pool(class_ = ThreadPool, processes = len(paths)) as pool:
+            taxonomies = pool.map(lambda path: _classify_shard(path, references = references,
+                processors = processors, **kwargs), paths)
+
+        if not all(taxonomies):
+            return None
+
+        concatenate_files(taxonomies, target)
+
+        remove(work_dir, recursive = True)
+
+    write_tax_summary(target, count_table, "%s.tax.summary" % osp.splitext(target)[0])
+
+    logger.success("Classified %s into %s." % (fasta, target))
+
+    return target
@@ -0,0 +1,238 @@
+import os.path as osp
+import time
+import json
+import threading
+import contextlib
+
+from multiprocessing.pool import ThreadPool
+
+from s3mart import __name__ as NAME
+
+from bpyutils.util.array   import chunkify
+from bpyutils.util.system  import makedirs, get_files, remove
+from bpyutils import parallel, log
+
+from s3mart.data.util   import build_mothur_script
+from s3mart.data.mothur import run_mothur
+from s3mart.data.native.derep import read_fasta, read_count_table
+from s3mart.data.native.tree  import read_list
+from s3mart.data.native.classify import _CONFIDENCE_PATTERN
+
+logger = log.get_logger(name = NAME)
+
+_DIR_NAME_BINS  = "cluster.bins"
+_FILENAME_BIN   = "bin"
+
+# bins written per pass over the FASTA file, bounding the number of files open.
+_MAX_OPEN_FILES = 256
+
+def get_bins(taxonomy, taxonomy_level = 6):
+    """
+    Split sequences into bins by their taxon at ``taxonomy_level`` (as
+    ``cluster.split(taxlevel=...)`` does), returning the names of the
+    sequences within each bin.
+    """
+    bins = { }
+
+    with open(taxonomy) as f:
+        for line in f:
+            name, lineage = line.rstrip("\n").split("\t")
+            taxa = [_CONFIDENCE_PATTERN.sub("", t) for t in lineage.split(";") if t]
+
+            bins.setdefault(";".join(taxa[:int(taxonomy_level)]), []).append(name)
+
+    return bins
+
+def schedule_bins(bins, jobs = 1):
+    """
+    Order bins by their number of sequences (largest first) and assign each a
+    share of processors proportional to its number of distances.
+    """
+    jobs  = int(jobs)
+
+    bins  = [{ "taxon": taxon, "names": names, "size": len(names) } for taxon, names in bins.items()]
+    bins.sort(key = lambda x: x["size"], reverse = True)
+
+    total = sum(b["size"] ** 2 for b in bins) or 1
+
+    for i, b in enumerate(bins):
+        b["id"]         = i
+        b["processors"] = max(1, min(jobs, int(round(jobs * b["size"] ** 2 / total))))
+
+    return bins
+
+class _Processors:
+    """
+    Processors shared by the bins clustered at the same time, a bin waiting
+    until its share is free.
+    """
+    def __init__(self, total):
+        self.free       = total
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def acquire(self, processors):
+        with self._condition:
+            self._condition.wait_for(lambda: self.free >= processors)
+            self.free -= processors
+
+        try:
+            yield processors
+        finally:
+            with self._condition:
+                self.free += processors
+                self._condition.notify_all()
+
+def run_bins(bins, function, jobs = 1):
+    """
+    Run ``function`` over bins in parallel (in order), never running more
+    bins at once than the sum of their processors allows within ``jobs``.
+    Yields the result of each bin as it completes.
+    """
+    jobs       = int(jobs)
+    processors = _Processors(jobs)
+
+    def run(b):
+        with processors.acquire(min(b["processors"], jobs)):
+            return function(b)
+
+    with parallel.pool(class_ = ThreadPool, processes = max(1, min(jobs, len(bins)))) as pool:
+        for result in pool.imap_unordered(run, bins):
+            yield result
+
+def _write_bins(bins, fasta, count_table, target_dir):
+    index = { name: b["id"] for b in bins for name in b["names"] }
+
+    for b in bins:
+        b["dir"] = makedirs(osp.join(target_dir, str(b["id"])), exist_ok = True)
+
+    for group in chunkify(bins, _MAX_OPEN_FILES):
+        ids   = set(b["id"] for b in group)
+        files = { b["id"]: open(osp.join(b["dir"], "%s.fasta" % _FILENAME_BIN), "wb") for b in group }
+
+        for name, sequence in read_fasta(fasta):
+            id_ = index.get(name.decode())
+
+            if id_ in ids:
+                files[id_].write(b">%s\n%s\n" % (name, sequence))
+
+        for f in files.values():
+            f.close()
+
+    # the count table of each bin, keeping the header (and group indices) of the table.
+    header, rows = [ ], { }
+
+    with open(count_table) as f:
+        for line in f:
+            if line.startswith("#") or line.startswith("Representative_Sequence"):
+                header.append(line)
+            else:
+                rows[line.split("\t", 1)[0]] = line
+
+    for b in bins:
+        with open(osp.join(b["dir"], "%s.count_table" % _FILENAME_BIN), "w") as f:
+            f.writelines(header)
+            f.writelines(rows[name] for name in b["names"] if name in rows)
+
+def _cluster_bin(b, cutoff_level = None):
+    start = time.time()
+
+    if b["size"] == 1:
+        otus = [b["names"]]
+    else:
+        mothur_file = osp.join(b["dir"], "script")
+        build_mothur_script(
+            template     = "mothur/cluster_bin",
+            output       = mothur_file,
+            fasta        = osp.join(b["dir"], "%s.fasta" % _FILENAME_BIN),
+            count        = osp.join(b["dir"], "%s.count_table" % _FILENAME_BIN),
+            cutoff_level = cutoff_level,
+            processors   = b["processors"]
+        )
+
+        code  = run_mothur(mothur_file, cwd = b["dir"], name = "cluster-bin")
+        lists = get_files(b["dir"], "*.opti_mcc.list")
+
+        if code or not lists:
+            logger.error("Unable to cluster bin %s (%s)." % (b["id"], b["taxon"]))
+            return None
+
+        otus = list(read_bin_list(lists[0], label = cutoff_level).values())
+
+    return { "id": b["id"], "taxon": b["taxon"], "sequences": b["size"], "processors": b["processors"],
+        "otus": otus, "wall": time.time() - start }
+
+def read_bin_list(path, label = None):
+    """
+    Read the OTUs of a list file at a ``label``, the last label if the list
+    file doesn't have it (OptiClust labels all-singleton lists ``unique``).
+    """
+    try:
+        return read_list(path, label = label)
+    except ValueError:
+        with open(path) as f:
+            lines = f.read().splitlines()
+
+        return read_list(path, label = lines[-1].split("\t", 1)[0])
+
+def merge_lists(results, counts, output, label):
+    """
+    Merge the OTUs of every bin into a single list file, sorted by abundance
+    (most abundant first) and named ``Otu<n>`` zero-padded as mothur does.
+    """
+    abundance = lambda names: sum(counts.get(name, { "_total": 1 })["_total"] for name in names)
+
+    otus  = [otu for result in results for otu in result["otus"]]
+    otus.sort(key = lambda names: (-abundance(names), names[0]))
+
+    width = len(str(len(otus)))
+
+    with open(output, "w") as f:
+        f.write("\t".join(["label", "numOtus"] + ["Otu%0*d" % (width, i) for i in range(1, len(otus) + 1)]) + "\n")
+        f.write("\t".join([str(label), str(len(otus))] + [",".join(names) for names in otus]) + "\n")
+
+    return output
+
+def cluster_seqs(fasta, count_table, taxonomy, output, taxonomy_level = 6, cutoff_level = 0.03, jobs = 1):
+    """
+    Cluster sequences split into bins by their taxonomy, clustering each bin
+    with OptiClust in parallel (largest first, see ``run_bins``) and merging
+    every bin's OTUs into the list file ``output``.
+
+    The time taken by each bin is written to a ``.bins.json`` next to
+    ``output``. Returns the path to the list file, ``None`` if any bin failed.
+    """
+    work_dir = osp.join(osp.dirname(osp.abspath(output)), _DIR_NAME_BINS)
+    remove(work_dir, recursive = True, raise_err = False)
+
+    bins     = schedule_bins(get_bins(taxonomy, taxonomy_level = taxonomy_level), jobs = jobs)
+
+    logger.info("Clustering %s sequences in %s bins..." % (sum(b["size"] for b in bins), len(bins)))
+
+    _write_bins(bins, fasta, count_table, work_dir)
+
+    results  = [ ]
+
+    # the processors of the stage are shared by the bins, not borrowed from the budget again.
+    for result in run_bins(bins, lambda b: _cluster_bin(b, cutoff_level = cutoff_level), jobs = jobs):
+        if result:
+            logger.info("[bin %s] Clustered %s sequences (%s) into %s OTUs in %.1fs using %s processors." %
+                (result["id"], result["sequences"], result["taxon"], len(result["otus"]), result["wall"],
+                result["processors"]))
+
+        results.append(result)
+
+    if not all(results):
+        return None
+
+    results.sort(key = lambda x: x["id"])
+
+    _, counts = read_count_table(count_table)
+    merge_lists(results, counts, output, cutoff_level)
+
+    with open("%s.bins.json" % osp.splitext(output)[0], "w") as f:
+        json.dump([{ k: v for k, v in result.items() if k != "otus" } for result in results], f, indent = 2)
+
+    remove(work_dir, recursive = True)
+
+    return output
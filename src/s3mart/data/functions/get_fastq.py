@@ -1,17 +1,18 @@
 import os.path as osp
 from s3mart import settings, __name__ as NAME
 
-from s3mart.data.functions.check_quality import fastqc_check
+from s3mart.data.functions.check_quality import quality_check
+from s3mart.data.budget import resource_budget
+from s3mart.data.sra_cache import SRACache
+from s3mart.data.fastq import get_fastq_files, compress_fastq
 
 from bpyutils.util.ml      import get_data_dir
-from bpyutils.util.types   import build_fn
 from bpyutils.util.system  import (
     ShellEnvironment,
-    get_files,
     makedirs,
     remove
 )
-from bpyutils import log, parallel
+from bpyutils import log
 
 logger = log.get_logger(name = NAME)
 
@@ -25,17 +26,25 @@ def get_fastq(meta, data_dir = None, *args, **kwargs):
     
     fastqc = kwargs.get("fastqc", True)
 
+    compression = kwargs.get("fastq_compression", settings.get("fastq_compression"))
+
     fastqc_dir = osp.join(data_dir, "fastqc")
     makedirs(fastqc_dir, exist_ok = True)
 
-    with ShellEnvironment(cwd = data_dir) as shell:
+    # registered for the whole fetch, each fetch running at once is left a share of the budget.
+    with resource_budget(jobs) as budget, budget.borrow(), ShellEnvironment(cwd = data_dir) as shell:
         sra_dir = osp.join(data_dir, sra)
 
+        cache    = SRACache()
+        cached   = cache.get(sra, sra_dir)
+
         logger.info("Checking if SRA %s is prefetched..." % sra)
         path_sra = osp.join(sra_dir, sra, "%s.sra" % sra)
 
         if not osp.exists(path_sra):
             logger.info("Performing prefetch for SRA %s in directory %s." % (sra, sra_dir))
+
+            # network-bound, not gated on the budget.
             code = shell("prefetch -O {output_dir} {sra}".format(output_dir = sra_dir, sra = sra))
 
             if not code:
@@ -43,6 +52,7 @@ def get_fastq(meta, data_dir = None, *args, **kwargs):
 
                 logger.info("Validating SRA %s..." % sra)
                 logger.info("Performing vdb-validate for SRA %s in directory %s." % (sra, sra_dir))
+
                 code = shell("vdb-validate {dir}".format(dir = osp.join(sra_dir, sra)))
 
                 if not code:
@@ -57,13 +67,22 @@ def get_fastq(meta, data_dir = None, *args, **kwargs):
             logger.warn("SRA %s already prefeteched." % sra)
 
         logger.info("Checking if FASTQ files for SRA %s has been downloaded..." % sra)
-        fastq_files = get_files(sra_dir, "*.fastq")
+        fastq_files = get_fastq_files(sra_dir)
         
         if not fastq_files:
             logger.info("Downloading FASTQ file(s) for SRA %s..." % sra)
             args = "--split-files" if layout == "paired" else "" 
-            code = shell("fasterq-dump --threads {threads} {args} {sra}".format(
-                threads = jobs, args = args, sra = sra), cwd = sra_dir)
+
+            with budget.acquire(maximum = jobs) as threads:
+                code = shell("fasterq-dump --threads {threads} {args} {sra}".format(
+                    threads = threads, args = args, sra = sra), cwd = sra_dir)
+
+                if not code and compression and compression != "none":
+                    logger.info("Compressing FASTQ file(s) for SRA %s using %s..." % (sra, compression))
+
+                    for fastq_file in get_fastq_files(sra_dir):
+                        if fastq_file.endswith(".fastq"):
+                            compress_fastq(fastq_file, compression = compression, threads = threads)
 
             if not code:
                 logger.success("Successfully downloaded FASTQ file(s) for SRA %s." % sra)
@@ -72,14 +91,16 @@ def get_fastq(meta, data_dir = None, *args, **kwargs):
         else:
             logger.warn("FASTQ file(s) for SRA %s already exist." % sra)
 
-        fastq_files = get_files(sra_dir, "*.fastq")
+        fastq_files = get_fastq_files(sra_dir)
+
+        if fastq_files and not cached:
+            cache.put(sra, sra_dir, [f for f in [path_sra] + fastq_files if osp.exists(f)])
 
         if fastqc:
             logger.info("Checking quality of FASTQ files...")
 
-            with parallel.pool(processes = jobs) as pool:
-                function_ = build_fn(fastqc_check, output_dir = fastqc_dir, threads = jobs)
-                list(pool.imap(function_, fastq_files))
+            quality_check(fastq_files, output_dir = fastqc_dir, jobs = jobs,
+                engine = kwargs.get("qc_engine"))
         else:
             logger.warn("Skipping FASTQC quality check.")
 
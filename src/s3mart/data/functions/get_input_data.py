@@ -1,4 +1,6 @@
 import os.path as osp
+import json
+import collections
 
 from s3mart.config  import PATH
 from s3mart import __name__ as NAME
@@ -10,23 +12,71 @@ from bpyutils.util.string  import check_url, safe_decode
 from bpyutils.util.system  import write
 from bpyutils import log, request as req
 
+from s3mart.data.util import checksum
+
 logger = log.get_logger(name = NAME)
 
 CACHE  = PATH["CACHE"]
 
-def get_input_data(input = None, data_dir = None, *args, **kwargs):
+_STUDIES = { }
+
+class Study(collections.namedtuple("Study", ("path", "key", "rows"))):
+    """
+    An immutable, parsed input data sheet. ``key`` is the hash of the file it
+    was parsed from.
+    """
+    def groups(self):
+        return group_by([dict(row) for row in self.rows], "group")
+
+def _fetch_input(url, data_dir):
+    path      = osp.join(data_dir, "input.csv")
+    path_meta = osp.join(data_dir, "input.json")
+
+    meta      = { }
+    headers   = { }
+
+    if osp.exists(path) and osp.exists(path_meta):
+        with open(path_meta) as f:
+            meta = json.load(f)
+
+        if meta.get("url") == url:
+            if meta.get("etag"):
+                headers["If-None-Match"]     = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = req.get(url, headers = headers)
+
+    if response.status_code == 304:
+        logger.info("Input %s has not been modified, using %s." % (url, path))
+    else:
+        response.raise_for_status()
+
+        response_headers = getattr(response, "headers", None) or { }
+
+        write(path, safe_decode(response.content), force = True)
+        write(path_meta, json.dumps({
+            "url": url,
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified")
+        }), force = True)
+
+    return path
+
+def get_study(input = None, data_dir = None):
+    """
+    Get the parsed study for an input, memoised on the hash of the input file.
+    Remote inputs are fetched using a conditional GET.
+
+    Returns a tuple of the data directory and the ``Study`` (``None`` if the
+    input isn't a file).
+    """
     data_dir = get_data_dir(NAME, data_dir)
 
     if input:
         if check_url(input, raise_err = False):
-            response = req.get(input)
-            response.raise_for_status()
-
-            content  = response.content
+            input = _fetch_input(input, data_dir)
 
-            input    = osp.join(data_dir, "input.csv")
-            write(input, safe_decode(content))
-        
         input = osp.abspath(input)
 
         if osp.isdir(input):
@@ -34,10 +84,23 @@ def get_input_data(input = None, data_dir = None, *args, **kwargs):
     else:
         input = osp.join(PATH["DATA"], "sample.csv")
 
-    groups = {}
+    study = None
 
     if osp.isfile(input):
-        data   = read_csv(input)
-        groups = group_by(data, "group")
+        key = (input, checksum(input))
+
+        if key not in _STUDIES:
+            rows = read_csv(input)
+            _STUDIES[key] = Study(path = input, key = key[1],
+                rows = tuple(tuple(row.items()) for row in rows))
+
+        study = _STUDIES[key]
+
+    return data_dir, study
+
+def get_input_data(input = None, data_dir = None, *args, **kwargs):
+    data_dir, study = get_study(input = input, data_dir = data_dir)
+
+    groups = study.groups() if study else {}
 
-    return data_dir, groups
\ No newline at end of file
+    return data_dir, groups
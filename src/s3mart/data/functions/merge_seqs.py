@@ -1,73 +1,92 @@
 import os.path as osp
+import json
+
+from multiprocessing.pool import ThreadPool
 
-from s3mart.config  import PATH
 from s3mart import __name__ as NAME
 
 from bpyutils.util.ml      import get_data_dir
-from bpyutils.util.system  import (
-    ShellEnvironment,
-    make_temp_dir, get_files, move,
-    remove
-)
-from bpyutils import log
+from bpyutils.util.system  import get_files, remove, read, write
+from bpyutils.util.types   import lmap
+from bpyutils.exception    import PopenError
+from bpyutils import parallel, log
 
 from s3mart.data.functions.trim_seqs import _FILENAME_TRIMMED, _DATA_DIR_NAME_TRIMMED
-from s3mart.data.util import build_mothur_script
+from s3mart.data.fastq import COMPRESSION_EXTENSIONS
+from s3mart.data.util  import concatenate_files
 from s3mart import settings
 
 logger = log.get_logger(name = NAME)
 
-CACHE  = PATH["CACHE"]
+_FILENAME_MERGED_INPUTS = "merged.json"
+
+def get_merged_files(data_dir, compression = None):
+    """
+    Get the paths to the merged ``fasta`` and ``group`` files of a data
+    directory.
+    """
+    ext = COMPRESSION_EXTENSIONS[compression] if compression else ""
+
+    return {
+        "fasta": osp.join(data_dir, "merged.fasta%s" % ext),
+        "group": osp.join(data_dir, "merged.group%s" % ext)
+    }
 
 def merge_seqs(data_dir = None, force = False, **kwargs):
     minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
+    jobs           = kwargs.get("jobs", settings.get("jobs"))
+
+    compression    = kwargs.get("merge_compression", settings.get("merge_compression"))
+    compression    = None if compression == "none" else compression
 
     success  = False
 
     data_dir = get_data_dir(NAME, data_dir = data_dir)
 
     logger.info("Finding files in directory: %s" % data_dir)
-    
-    trimmed = get_files(data_dir, "%s.fasta" % _FILENAME_TRIMMED)
-    groups  = get_files(data_dir, "%s.group" % _FILENAME_TRIMMED)
+
+    # a deterministic order, with each group file following its fasta file.
+    trimmed = sorted(get_files(data_dir, "%s.fasta" % _FILENAME_TRIMMED))
+    trimmed = [f for f in trimmed if osp.exists(osp.join(osp.dirname(f), "%s.group" % _FILENAME_TRIMMED))]
+    groups  = [osp.join(osp.dirname(f), "%s.group" % _FILENAME_TRIMMED) for f in trimmed]
 
     if trimmed and groups:
         logger.info("Merging %s filter and %s group files." % (len(trimmed), len(groups)))
 
-        output_fasta = osp.join(data_dir, "merged.fasta")
-        output_group = osp.join(data_dir, "merged.group")
-
-        if not any(osp.exists(f) for f in (output_fasta, output_group)) or force:
-            with make_temp_dir(root_dir = CACHE) as tmp_dir:
-                mothur_file = osp.join(tmp_dir, "script")
-                build_mothur_script(
-                    template     = "mothur/merge", 
-                    output       = mothur_file,
-                    input_fastas = trimmed,
-                    input_groups = groups,
-                    output_fasta = output_fasta,
-                    output_group = output_group
-                )
-
-                with ShellEnvironment(cwd = tmp_dir) as shell:
-                    code = shell("mothur %s" % mothur_file)
-
-                    if not code:
-                        # HACK: weird hack around failure of mothur detecting output for merge.files
-                        merged_fasta = get_files(data_dir, "merged.fasta")
-                        merged_group = get_files(data_dir, "merged.group")
-
-                        move(*merged_fasta, dest = output_fasta)
-                        move(*merged_group, dest = output_group)
-
-                        logger.success("Successfully merged.")
-
-                        success = True
-                    else:
-                        logger.error("Error merging files.")
+        output  = get_merged_files(data_dir, compression = compression)
+        outputs = (output["fasta"], output["group"])
+
+        # the files merged (relative to the data directory), recorded next to the merged files.
+        inputs  = [osp.relpath(f, data_dir) for f in trimmed + groups]
+        record  = osp.join(data_dir, _FILENAME_MERGED_INPUTS)
+
+        # re-merge whenever a group has been (re-)trimmed since the last merge or groups were added or removed.
+        stale   = not all(osp.exists(f) for f in outputs + (record,)) or \
+            json.loads(read(record)) != inputs or \
+            max(lmap(osp.getmtime, trimmed + groups)) > min(lmap(osp.getmtime, outputs))
+
+        if stale or force:
+            threads = max(1, int(jobs) // 2)
+
+            remove(record, raise_err = False)
+
+            try:
+                with parallel.pool(class_ = ThreadPool, processes = 2) as pool:
+                    sizes = pool.starmap(lambda sources, target: concatenate_files(sources, target,
+                        compression = compression, threads = threads), ((trimmed, outputs[0]), (groups, outputs[1])))
+
+                write(record, json.dumps(inputs), force = True)
+
+                logger.success("Successfully merged %s bytes into %s." % (sum(sizes), outputs))
+
+                success = True
+            except (OSError, PopenError) as e:
+                logger.error("Error merging files. Error: %s" % e)
+        else:
+            logger.warn("Merged files already up to date.")
     else:
         logger.warn("No files found to merge.")
 
     if success and minimal_output:
         trimmed_dir = osp.join(data_dir, _DATA_DIR_NAME_TRIMMED)
-        remove(trimmed_dir, recursive = True)
\ No newline at end of file
+        remove(trimmed_dir, recursive = True)
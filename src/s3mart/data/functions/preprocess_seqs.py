@@ -1,100 +1,367 @@
-import os.path as osp
+import os, os.path as osp
+import hashlib
+import json
 
 from s3mart.config  import PATH
 from s3mart import settings, __name__ as NAME
 
 from bpyutils.util.array   import sequencify
 from bpyutils.util.ml      import get_data_dir
-from bpyutils.util.system  import (
-    ShellEnvironment, makedirs,
-    make_temp_dir, copy, move
-)
+from bpyutils.util.system  import makedirs, remove
+from bpyutils._compat import iteritems
 from bpyutils import log
 
-from s3mart.data.util import build_mothur_script
+from s3mart.data.util import build_mothur_script, stage_files, link_file
+from s3mart.data.budget import resource_budget
+from s3mart.data.ledger import Ledger
+from s3mart.data.mothur import run_mothur
+from s3mart.data.fastq  import decompress_fastq
+from s3mart.data.native.derep import dereplicate
+from s3mart.data.native.tree  import get_otu_representatives, write_distances
+from s3mart.data.functions.merge_seqs import get_merged_files
+from s3mart.data.functions.classify_seqs import classify_seqs
+from s3mart.data.functions.cluster_seqs  import cluster_seqs
+from s3mart.data.functions.assign_seqs   import get_otu_index, build_otu_index
 
 logger = log.get_logger(name = NAME)
 
 CACHE  = PATH["CACHE"]
 
+_DIR_NAME_PREPROCESS = "preprocess"
+
+STAGES = ("align", "screen", "precluster", "chimera", "classify", "cluster", "tree")
+
+def get_stage_outputs(stage, cutoff_level = None, tree_mode = "sequences"):
+    """
+    Get the files (relative to the working directory) a preprocessing stage
+    outputs. Stages up to ``classify`` rename their outputs after the stage,
+    later ones are named after the ``classify`` outputs they're run on (or the
+    OTU representatives for a ``tree_mode`` of ``otus``).
+    """
+    if stage in ("align", "screen", "precluster", "chimera"):
+        return { "fasta": "%s.fasta" % stage, "count": "%s.count_table" % stage }
+
+    if stage == "classify":
+        return { "fasta": "classify.fasta", "count": "classify.count_table", "taxonomy": "classify.taxonomy" }
+
+    if stage == "cluster":
+        return {
+            "list":     "classify.opti_mcc.list",
+            "shared":   "classify.opti_mcc.shared",
+            "taxonomy": "classify.opti_mcc.%s.cons.taxonomy" % cutoff_level
+        }
+
+    if stage == "tree":
+        return { "tree": "%s.phylip.tre" % ("otus" if tree_mode == "otus" else "classify") }
+
+    raise ValueError("Unknown preprocessing stage: %s. Expected one of %s." % (stage, ", ".join(STAGES)))
+
+def get_stage_inputs(stage, cutoff_level = None):
+    """
+    Get the files a preprocessing stage is run on, i.e. the outputs of the
+    stage it follows (the merged files for ``align``).
+    """
+    if stage == "align":
+        return { }
+
+    if stage == "tree":
+        return get_stage_outputs("classify")
+
+    return get_stage_outputs(STAGES[STAGES.index(stage) - 1], cutoff_level = cutoff_level)
+
+def _file_identity(path):
+    if not osp.exists(path):
+        return None
+
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+def get_stage_signatures(params):
+    """
+    Get the signature of each stage given the parameters ``params`` of each
+    stage, chaining a stage's signature with the one of the stage it follows
+    so that a change to any stage invalidates every stage after it.
+    """
+    signatures = { }
+    previous   = None
+
+    for stage in STAGES:
+        key = hashlib.md5(json.dumps({ "previous": previous, "params": params.get(stage) },
+            sort_keys = True).encode()).hexdigest()
+
+        signatures[stage] = previous = key
+
+    return signatures
+
+def plan_stages(ledger, signatures, from_stage = None, to_stage = None):
+    """
+    Get the stages to be run, from the first stage not completed with its
+    current signature (or ``from_stage``) up to ``to_stage``.
+    """
+    for stage in (from_stage, to_stage):
+        if stage and stage not in STAGES:
+            raise ValueError("Unknown preprocessing stage: %s. Expected one of %s." % (stage, ", ".join(STAGES)))
+
+    if from_stage:
+        start = STAGES.index(from_stage)
+
+        for stage in STAGES[:start]:
+            if not ledger.has_outputs(stage):
+                raise ValueError("Cannot run from stage %s, stage %s hasn't been completed." % (from_stage, stage))
+
+            if not ledger.is_complete(stage, signatures[stage]):
+                logger.warn("Stage %s is out of date, running from stage %s regardless." % (stage, from_stage))
+    else:
+        start = next((i for i, stage in enumerate(STAGES) if not ledger.is_complete(stage, signatures[stage])),
+            len(STAGES))
+
+    end = STAGES.index(to_stage) + 1 if to_stage else len(STAGES)
+
+    return list(STAGES[start:end])
+
+def _prepare_merged(work_dir, merged, compression = None, derep_backend = None, processors = 1):
+    """
+    Prepare the merged files for mothur within the working directory, returning
+    the dereplicated files if dereplicated natively.
+    """
+    if derep_backend == "native":
+        # named after what unique.seqs + count.seqs would output.
+        unique_fasta = osp.join(work_dir, "merged.unique.fasta")
+        count_table  = osp.join(work_dir, "merged.count_table")
+
+        dereplicate(merged["fasta"], merged["group"], unique_fasta, count_table, jobs = processors)
+
+        return unique_fasta, count_table
+
+    # mothur doesn't read compressed fasta/group files.
+    for type_, path in iteritems(merged):
+        target = osp.join(work_dir, "merged.%s" % type_)
+
+        if compression:
+            decompress_fastq(path, target)
+        else:
+            stage_files(path, dest = work_dir)
+
+    return None, None
+
 def preprocess_seqs(data_dir = None, **kwargs):
     data_dir = get_data_dir(NAME, data_dir)
     jobs     = kwargs.get("jobs", settings.get("jobs"))
 
-    merged_fasta = osp.join(data_dir, "merged.fasta")
-    merged_group = osp.join(data_dir, "merged.group")
+    minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
+
+    from_stage   = kwargs.get("from_stage")
+    to_stage     = kwargs.get("to_stage")
+
+    compression  = kwargs.get("merge_compression", settings.get("merge_compression"))
+    compression  = None if compression == "none" else compression
+
+    merged       = get_merged_files(data_dir, compression = compression)
+
+    derep_backend    = kwargs.get("derep_backend", settings.get("derep_backend"))
+    classify_backend = kwargs.get("classify_backend", settings.get("classify_backend"))
+    cluster_mode     = kwargs.get("cluster_mode", settings.get("cluster_mode"))
+    tree_mode        = kwargs.get("tree_mode", settings.get("tree_mode"))
 
     silva_seed = kwargs["silva_seed"]
     silva_gold = kwargs["silva_gold"]
     silva_seed_tax = kwargs["silva_seed_tax"]
+    silva_pcr      = kwargs.get("silva_pcr")
 
     cutoff_level   = settings.get("cutoff_level")
 
-    files = (merged_fasta, merged_group, silva_seed, silva_gold, silva_seed_tax)
-    target_files = [{
-        "source": "merged.unique.good.unique.precluster.pick.pick.phylip.tre",
-        "target": osp.join(data_dir, "output.tre")
-    }, {
-        "source": "merged.unique.good.unique.precluster.pick.pick.opti_mcc.%s.cons.taxonomy" % cutoff_level,
-        "target": osp.join(data_dir, "output.taxonomy"),
-    }, {
-        "source": "merged.unique.good.unique.precluster.pick.count_table",
-        "target": osp.join(data_dir, "output.count_table")
-    }, {
-        "source": "merged.unique.good.unique.precluster.pick.pick.opti_mcc.list",
-        "target": osp.join(data_dir, "output.list")
-    }, {
-        "source": "merged.unique.good.unique.precluster.pick.pick.opti_mcc.shared",
-        "target": osp.join(data_dir, "output.shared")
-    }]
-
-    with make_temp_dir(root_dir = CACHE) as tmp_dir:
-        copy(*files, dest = tmp_dir)
-
-        silva_seed_splitext = osp.splitext(osp.basename(silva_seed))
-
-        filter_taxonomy = settings.get("filter_taxonomy")
-        if not isinstance(filter_taxonomy, (list, tuple)):
-            filter_taxonomy = eval(filter_taxonomy)
-            filter_taxonomy = sequencify(filter_taxonomy)
-            
-        mothur_file = osp.join(tmp_dir, "script")
-        build_mothur_script(
-            template = "mothur/preprocess",
-            output   = mothur_file,
-            merged_fasta = osp.join(tmp_dir, osp.basename(merged_fasta)),
-            merged_group = osp.join(tmp_dir, osp.basename(merged_group)),
-
-            silva_seed       = osp.join(tmp_dir, osp.basename(silva_seed)),
-            silva_seed_start = settings.get("silva_pcr_start"),
-            silva_seed_end   = settings.get("silva_pcr_end"),
-
-            silva_pcr   = osp.join(tmp_dir, "%s.pcr%s" % (silva_seed_splitext[0], silva_seed_splitext[1])),
-            
-            silva_seed_tax   = osp.join(tmp_dir, osp.basename(silva_seed_tax)),
-            silva_gold       = osp.join(tmp_dir, osp.basename(silva_gold)),
-
-            maxhomop              = settings.get("maximum_homopolymers"),
-            classification_cutoff = settings.get("classification_cutoff"),
-            filter_taxonomy       = filter_taxonomy,
-            taxonomy_level        = settings.get("taxonomy_level"),
-            cutoff_level          = settings.get("cutoff_level"),
-
-            processors            = jobs
-        )
-
-        with ShellEnvironment(cwd = tmp_dir) as shell:
-            code = shell("mothur %s" % mothur_file)
-
-            if not code:
-                makedirs(data_dir, exist_ok = True)
-
-                for tar_file in target_files:
-                    source = osp.join(tmp_dir, tar_file["source"])
-                    target = tar_file["target"]
-
-                    move(source, dest = target)
-
-                logger.success("Successfully preprocessed files.")
+    filter_taxonomy = settings.get("filter_taxonomy")
+    if not isinstance(filter_taxonomy, (list, tuple)):
+        filter_taxonomy = eval(filter_taxonomy)
+        filter_taxonomy = sequencify(filter_taxonomy)
+
+    # intermediates persist across runs, a rerun resumes from the first stage not completed.
+    work_dir = makedirs(osp.join(data_dir, _DIR_NAME_PREPROCESS), exist_ok = True)
+    ledger   = Ledger(work_dir)
+
+    silva_seed_splitext = osp.splitext(osp.basename(silva_seed))
+
+    template_kwargs = dict(
+        merged_fasta = osp.join(work_dir, "merged.fasta"),
+        merged_group = osp.join(work_dir, "merged.group"),
+
+        silva_seed       = osp.join(work_dir, osp.basename(silva_seed)),
+        silva_seed_start = settings.get("silva_pcr_start"),
+        silva_seed_end   = settings.get("silva_pcr_end"),
+
+        silva_pcr   = osp.join(work_dir, "%s.pcr%s" % (silva_seed_splitext[0], silva_seed_splitext[1])),
+        silva_pcr_cached = bool(silva_pcr),
+
+        silva_seed_tax   = osp.join(work_dir, osp.basename(silva_seed_tax)),
+        silva_gold       = osp.join(work_dir, osp.basename(silva_gold)),
+
+        maxhomop              = settings.get("maximum_homopolymers"),
+        classification_cutoff = settings.get("classification_cutoff"),
+        classification_iterations = settings.get("classification_iterations"),
+        filter_taxonomy       = filter_taxonomy,
+        taxonomy_level        = settings.get("taxonomy_level"),
+        cutoff_level          = cutoff_level
+    )
+
+    signatures = get_stage_signatures({
+        "align":    {
+            "merged": { type_: _file_identity(path) for type_, path in iteritems(merged) },
+            "derep_backend": derep_backend,
+            "silva_pcr": silva_pcr or [osp.basename(silva_seed),
+                template_kwargs["silva_seed_start"], template_kwargs["silva_seed_end"]]
+        },
+        "screen":   { "maxhomop": template_kwargs["maxhomop"] },
+        "chimera":  { "silva_gold": osp.basename(silva_gold) },
+        "classify": {
+            "silva_seed_tax": osp.basename(silva_seed_tax),
+            "classify_backend": classify_backend,
+            "classification_cutoff": template_kwargs["classification_cutoff"],
+            "classification_iterations": template_kwargs["classification_iterations"],
+            "filter_taxonomy": list(filter_taxonomy)
+        },
+        "cluster":  {
+            "cluster_mode": cluster_mode,
+            "taxonomy_level": template_kwargs["taxonomy_level"],
+            "cutoff_level": cutoff_level
+        },
+        "tree":     { "tree_mode": tree_mode }
+    })
+
+    stages = plan_stages(ledger, signatures, from_stage = from_stage, to_stage = to_stage)
+
+    if not stages:
+        logger.warn("Preprocessed files already up to date.")
+    else:
+        logger.info("Running preprocessing stages: %s" % ", ".join(stages))
+
+    target_files = [
+        ("chimera",  "count",    osp.join(data_dir, "output.count_table")),
+        ("cluster",  "taxonomy", osp.join(data_dir, "output.taxonomy")),
+        ("cluster",  "list",     osp.join(data_dir, "output.list")),
+        ("cluster",  "shared",   osp.join(data_dir, "output.shared")),
+        ("tree",     "tree",     osp.join(data_dir, "output.tre"))
+    ]
+
+    if silva_pcr:
+        # the cached PCR-trimmed alignment along with its k-mer and classifier databases.
+        pcr_dir    = osp.dirname(silva_pcr)
+        references = [osp.join(pcr_dir, f) for f in sorted(os.listdir(pcr_dir))]
+    else:
+        references = [template_kwargs["silva_pcr"], template_kwargs["silva_seed_tax"]]
+
+    with resource_budget(jobs) as budget, budget.acquire(maximum = jobs) as processors:
+        if stages:
+            if silva_pcr:
+                stage_files(silva_gold, *references, dest = work_dir)
             else:
-                logger.error("Error merging files.")
\ No newline at end of file
+                stage_files(silva_seed, silva_gold, silva_seed_tax, dest = work_dir)
+
+        for stage in stages:
+            # a stage is no longer complete once rerun, and neither are the ones after it.
+            ledger.unset(*STAGES[STAGES.index(stage):])
+            ledger.save()
+
+            logger.info("Running preprocessing stage %s..." % stage)
+
+            unique_fasta, count_table = None, None
+
+            if stage == "align":
+                unique_fasta, count_table = _prepare_merged(work_dir, merged, compression = compression,
+                    derep_backend = derep_backend, processors = processors)
+
+            inputs  = { type_: osp.join(work_dir, f) for type_, f in iteritems(get_stage_inputs(stage)) }
+            outputs = get_stage_outputs(stage, cutoff_level = cutoff_level, tree_mode = tree_mode)
+            phylip   = None
+            otu_list = None
+
+            if stage == "classify":
+                # without a cached classifier, shards would each build its tables.
+                inputs["taxonomy"] = classify_seqs(inputs["fasta"], inputs["count"],
+                    osp.join(work_dir, "classify.wang.taxonomy"), references = references,
+                    shards = processors if silva_pcr else 1, processors = processors,
+                    silva_pcr      = template_kwargs["silva_pcr"],
+                    silva_seed_tax = template_kwargs["silva_seed_tax"],
+                    classification_cutoff     = template_kwargs["classification_cutoff"],
+                    classification_iterations = template_kwargs["classification_iterations"],
+                    backend = classify_backend
+                )
+
+                if not inputs["taxonomy"]:
+                    logger.error("Error running preprocessing stage %s." % stage)
+                    return False
+
+            if stage == "cluster" and cluster_mode == "bins":
+                otu_list = cluster_seqs(inputs["fasta"], inputs["count"], inputs["taxonomy"],
+                    osp.join(work_dir, outputs["list"]), taxonomy_level = template_kwargs["taxonomy_level"],
+                    cutoff_level = cutoff_level, jobs = processors)
+
+                if not otu_list:
+                    logger.error("Error running preprocessing stage %s." % stage)
+                    return False
+
+            if stage == "tree" and tree_mode == "otus":
+                # a tree of the OTU representatives, leaves are renamed to their OTUs anyway.
+                cluster = ledger.get("cluster")["outputs"]
+                representatives = get_otu_representatives(osp.join(work_dir, cluster["list"]), inputs["count"],
+                    label = cutoff_level)
+
+                phylip  = write_distances(inputs["fasta"], list(representatives.values()),
+                    osp.join(work_dir, "otus.phylip.dist"))
+
+            mothur_file = osp.join(work_dir, "%s.mothur" % stage)
+            build_mothur_script(
+                template = "mothur/preprocess",
+                output   = mothur_file,
+
+                stage    = stage,
+                prefix   = stage if "fasta" in outputs else None,
+
+                fasta    = inputs.get("fasta"),
+                count    = inputs.get("count"),
+                taxonomy = inputs.get("taxonomy"),
+                phylip   = phylip,
+                otu_list = otu_list,
+
+                merged_unique_fasta = unique_fasta,
+                merged_count_table  = count_table,
+
+                processors = processors,
+
+                **template_kwargs
+            )
+
+            code = run_mothur(mothur_file, cwd = work_dir, name = "preprocess-%s" % stage)
+
+            missing = [f for f in outputs.values() if not osp.exists(osp.join(work_dir, f))]
+
+            if code or missing:
+                logger.error("Error running preprocessing stage %s. Missing outputs: %s" % (stage, missing))
+                return False
+
+            ledger.set(stage, signatures[stage], outputs)
+            ledger.save()
+
+            logger.success("Successfully ran preprocessing stage %s." % stage)
+
+    for stage, type_, target in target_files:
+        if ledger.has_outputs(stage):
+            link_file(osp.join(work_dir, ledger.get(stage)["outputs"][type_]), target)
+
+    complete = ledger.is_complete(STAGES[-1], signatures[STAGES[-1]])
+
+    if complete:
+        logger.success("Successfully preprocessed files.")
+
+        classify, cluster = ledger.get("classify")["outputs"], ledger.get("cluster")["outputs"]
+
+        # the OTU index outlives the working directory, for new groups to be assigned to.
+        if (stages or not osp.exists(get_otu_index(data_dir)["fasta"])) and \
+            osp.exists(osp.join(work_dir, classify["fasta"])):
+            build_otu_index(osp.join(work_dir, classify["fasta"]), osp.join(work_dir, cluster["list"]),
+                osp.join(work_dir, classify["count"]), osp.join(work_dir, cluster["taxonomy"]), data_dir,
+                label = cutoff_level)
+
+        if minimal_output:
+            remove(work_dir, recursive = True)
+
+    return complete
@@ -0,0 +1,125 @@
+import os.path as osp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import tqdm as tq
+
+from s3mart import settings, __name__ as NAME
+
+from bpyutils.util.ml      import get_data_dir
+from bpyutils.util.types   import build_fn
+from bpyutils.util.system  import makedirs
+from bpyutils._compat import iteritems
+from bpyutils import log
+
+from s3mart.data.budget import resource_budget
+from s3mart.data.fastq  import get_fastq_files
+from s3mart.data.manifest import refresh_manifest
+from s3mart.data.functions.get_fastq import get_fastq
+from s3mart.data.functions.check_quality import quality_check
+from s3mart.data.functions.trim_seqs import (
+    _trim_files,
+    _DATA_DIR_NAME_TRIMMED,
+    get_trim_units,
+    build_trim_config,
+    plan_trim_configs,
+    merge_trim_shards
+)
+
+logger = log.get_logger(name = NAME)
+
+def stream_seqs(data_dir = None, data = None, *args, **kwargs):
+    """
+    Download SRAs and trim them in a pipelined fashion, dispatching each trim
+    unit (sharded and scheduled as in ``trim_seqs``) as soon as all of its
+    FASTQ inputs are present.
+
+    SRAs are fetched by threads, their tools borrowing from the resource
+    budget, while units are trimmed by a pool of processes sized from the
+    budget. Units with an SRA that couldn't be fetched are skipped. Quality
+    checks are batched across all SRAs once fetched.
+    """
+    data_dir = get_data_dir(NAME, data_dir)
+    jobs     = kwargs.get("jobs", settings.get("jobs"))
+
+    fastqc         = kwargs.pop("fastqc", True)
+
+    shard_size     = kwargs.get("trim_shard_size", settings.get("trim_shard_size"))
+    minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
+
+    makedirs(osp.join(data_dir, _DATA_DIR_NAME_TRIMMED), exist_ok = True)
+
+    for group, values in iteritems(data):
+        for value in values:
+            value["group"] = group
+
+    units   = [unit for unit in get_trim_units(data) if unit["filtered"]]
+    pending = [set(d["sra"] for d in unit["filtered"]) for unit in units]
+
+    metas   = [meta for values in data.values() for meta in values]
+
+    logger.info("Streaming %s SRAs into %s trim units..." % (len(metas), len(units)))
+
+    with resource_budget(jobs) as budget, \
+        ThreadPoolExecutor(max_workers = budget.slots) as fetch_pool, \
+        ProcessPoolExecutor(max_workers = budget.slots) as trim_pool:
+        fetch_fn = build_fn(get_fastq, data_dir = data_dir, fastqc = False, *args, **kwargs)
+        trim_fn  = build_fn(_trim_files, data_dir = data_dir, *args, **kwargs)
+
+        futures  = { fetch_pool.submit(fetch_fn, meta): meta["sra"] for meta in metas }
+        trims    = []
+        sharded  = []
+        failed   = set()
+
+        for future in tq.tqdm(as_completed(futures), total = len(futures), desc = "Fetching SRAs"):
+            sra = futures[future]
+
+            try:
+                future.result()
+            except Exception as e:
+                logger.error("Unable to fetch SRA %s. Error: %s" % (sra, e))
+                failed.add(sra)
+
+            # get_fastq logs (rather than raises) most of its errors.
+            if not get_fastq_files(osp.join(data_dir, sra)):
+                failed.add(sra)
+
+            for i, unit in enumerate(units):
+                if sra in pending[i]:
+                    pending[i].discard(sra)
+
+                    if not pending[i]:
+                        missing = sorted(d["sra"] for d in unit["filtered"] if d["sra"] in failed)
+
+                        if missing:
+                            logger.error("[group %s] Skipping trim unit (layout: %s, trimmed: %s), unable to fetch SRA(s) %s." %
+                                (unit["group"], unit["layout"], unit["trim_type"], ", ".join(missing)))
+                            continue
+
+                        manifest = refresh_manifest(data_dir, [d["sra"] for d in unit["filtered"]],
+                            jobs = budget.slots)
+                        config   = build_trim_config(unit, data_dir = data_dir, manifest = manifest, **kwargs)
+
+                        if config:
+                            configs, shards = plan_trim_configs([config], jobs = budget.slots,
+                                shard_size = shard_size)
+
+                            if configs:
+                                logger.info("[group %s] Inputs ready, dispatching trim unit (layout: %s, trimmed: %s)." %
+                                    (unit["group"], unit["layout"], unit["trim_type"]))
+
+                            sharded += shards
+                            trims   += [trim_pool.submit(trim_fn, c) for c in configs]
+
+        if fastqc:
+            logger.info("Checking quality of FASTQ files...")
+
+            files = [f for meta in metas if meta["sra"] not in failed
+                for f in get_fastq_files(osp.join(data_dir, meta["sra"]))]
+            quality_check(files, output_dir = osp.join(data_dir, "fastqc"), jobs = budget.slots,
+                engine = kwargs.get("qc_engine"))
+
+        for future in tq.tqdm(as_completed(trims), total = len(trims), desc = "Trimming"):
+            future.result()
+
+    for config, shards in sharded:
+        merge_trim_shards(config, shards, minimal_output = minimal_output)
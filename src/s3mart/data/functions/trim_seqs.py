@@ -1,5 +1,9 @@
 import os, os.path as osp
 import itertools
+import collections
+import hashlib
+import shutil
+import json
 
 import tqdm as tq
 
@@ -11,9 +15,8 @@ from bpyutils.util.array   import chunkify, group_by, flatten
 from bpyutils.util._dict   import dict_from_list
 from bpyutils.util.types   import lmap, lfilter, build_fn
 from bpyutils.util.system  import (
-    ShellEnvironment,
     makedirs,
-    make_temp_dir, get_files, copy, write,
+    make_temp_dir, get_files, move, write,
     remove
 )
 from bpyutils.util.string    import get_random_str
@@ -21,7 +24,13 @@ from bpyutils.exception      import PopenError
 from bpyutils._compat import itervalues, iteritems
 from bpyutils import parallel, log
 
-from s3mart.data.util import build_mothur_script
+from s3mart.data.util import build_mothur_script, render_template, stage_files, checksum
+from s3mart.data.budget import resource_budget
+from s3mart.data.mothur import run_mothur
+from s3mart.data.manifest import Manifest, refresh_manifest
+from s3mart.data.fastq  import is_fastq, fastq_prefix, get_compression, decompress_fastq
+from s3mart.data.native.screen import screen_fastq
+from s3mart.data.primers import trim_primers
 from s3mart.data.functions.get_input_data import get_input_data
 
 logger = log.get_logger(name = NAME)
@@ -30,13 +39,121 @@ CACHE  = PATH["CACHE"]
 
 _DATA_DIR_NAME_TRIMMED = "trimmed"
 _FILENAME_TRIMMED      = "trimmed"
+_FILENAME_SHARD        = "shard"
+_DIR_NAME_SHARDS       = ".shards"
 
 def _get_fastq_file_line(fname):
-    prefix    = osp.basename(fname)
-    prefix, _ = osp.splitext(prefix)
+    prefix = fastq_prefix(fname)
 
     return "%s %s" % (prefix, fname)
 
+def _stage_fastq_files(files, tmp_dir):
+    """
+    Stage FASTQ files into a mothur working directory. mothur reads gzipped
+    FASTQ natively, any other compression is decompressed into the working
+    directory (or when a unit mixes compressions, since make.file only picks
+    up a single type).
+    """
+    compressions = set(lmap(get_compression, files))
+    file_type    = "gz" if compressions == set(["gzip"]) else "fastq"
+
+    staged       = []
+
+    for f in files:
+        if get_compression(f) and file_type != "gz":
+            target = osp.join(tmp_dir, "%s.fastq" % fastq_prefix(f))
+            decompress_fastq(f, target)
+        else:
+            target = stage_files(f, dest = tmp_dir)["paths"][0]
+
+        staged.append(target)
+
+    return staged, file_type
+
+def _get_target_path(target_dir, name = _FILENAME_TRIMMED):
+    target_types = ("fasta", "group", "summary")
+
+    return dict_from_list(
+        target_types,
+        lmap(lambda x: osp.join(target_dir, "%s.%s" % (name, x)), target_types)
+    )
+
+def _get_signature_path(target_dir, name = _FILENAME_TRIMMED):
+    return osp.join(target_dir, "%s.json" % name)
+
+def _input_key(path):
+    return "%s/%s" % (osp.basename(osp.dirname(path)), osp.basename(path))
+
+def _signature(inputs, params):
+    key = hashlib.md5(json.dumps({ "inputs": inputs, "params": params }, sort_keys = True).encode()).hexdigest()
+    return { "key": key, "inputs": inputs, "params": params }
+
+def trim_signature(config, manifest = None, **kwargs):
+    """
+    Build the signature of a trim unit from the checksums of its input files
+    (reusing the ones recorded in the manifest when fresh), the trimming
+    parameters and the mothur script it renders to.
+    """
+    backend        = kwargs.get("trim_backend", settings.get("trim_backend"))
+    primer_backend = kwargs.get("primer_backend", settings.get("primer_backend"))
+
+    known  = { }
+
+    if manifest:
+        for sra in set(osp.basename(osp.dirname(f)) for f in config["files"]):
+            if not manifest.is_stale(sra):
+                known.update((f["path"], f["checksum"]) for f in manifest.get(sra)["files"])
+
+    inputs = { _input_key(f): known.get(f) or checksum(f) for f in config["files"] }
+
+    params = {
+        "trim_backend":   backend,
+        "primer_backend": primer_backend,
+
+        "layout":     config["layout"],     "trim_type":  config["trim_type"],
+        "primer_f":   config["primer_f"],   "primer_r":   config["primer_r"],
+        "min_length": config["min_length"], "max_length": config["max_length"],
+
+        "quality_average":      settings.get("quality_average"),
+        "maximum_ambiguity":    settings.get("maximum_ambiguity"),
+        "maximum_homopolymers": settings.get("maximum_homopolymers"),
+        "primer_difference":    settings.get("primer_difference")
+    }
+
+    if backend != "native":
+        # render with placeholders for anything specific to a single run.
+        script = render_template(template = "mothur/trim",
+            inputdir = "<inputdir>", prefix = "<prefix>", processors = "<processors>", file_type = "<file_type>",
+            fastq_file = "<fastq_file>", group = "<group>" if config["layout"] == "single" else None,
+            oligos = "<oligos>" if config["trim_type"] == "false" and primer_backend != "cutadapt" else None,
+            qaverage = params["quality_average"], maxambig = params["maximum_ambiguity"],
+            maxhomop = params["maximum_homopolymers"], pdiffs = params["primer_difference"],
+            layout = config["layout"], trim_type = config["trim_type"],
+            min_length = config["min_length"], max_length = config["max_length"])
+
+        params["script"] = hashlib.md5(script.encode()).hexdigest()
+
+    return _signature(inputs, params)
+
+def _is_trimmed(target_dir, name = _FILENAME_TRIMMED, signature = None):
+    """
+    Check whether a unit has been trimmed and, given its ``signature``, that
+    it was trimmed from the same inputs using the same parameters.
+    """
+    if not all(osp.exists(x) for x in itervalues(_get_target_path(target_dir, name = name))):
+        return False
+
+    if signature:
+        path = _get_signature_path(target_dir, name = name)
+
+        if not osp.exists(path):
+            return False
+
+        with open(path) as f:
+            return json.load(f).get("key") == signature["key"]
+
+    return True
+
 def _mothur_trim_files(config, data_dir = None, **kwargs):
     logger.info("Using config %s to filter files." % config)
 
@@ -45,6 +162,7 @@ def _mothur_trim_files(config, data_dir = None, **kwargs):
 
     files      = config.pop("files")
     target_dir = config.pop("target_dir")
+    target_name = config.pop("target_name", _FILENAME_TRIMMED)
 
     primer_f   = config.pop("primer_f")
     primer_r   = config.pop("primer_r")
@@ -54,20 +172,24 @@ def _mothur_trim_files(config, data_dir = None, **kwargs):
 
     group      = config.pop("group")
 
+    primers_trimmed = config.pop("primers_trimmed", False)
+
+    processors = config.pop("processors", jobs)
+    config.pop("size", None)
+    config.pop("signature", None)
+
     success    = False
 
     minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
 
-    target_types = ("fasta", "group", "summary")
-    target_path  = dict_from_list(
-        target_types,
-        lmap(lambda x: osp.join(target_dir, "%s.%s" % (_FILENAME_TRIMMED, x)), target_types)
-    )
+    target_path  = _get_target_path(target_dir, name = target_name)
 
     if not all(osp.exists(x) for x in itervalues(target_path)):
         with make_temp_dir(root_dir = CACHE) as tmp_dir:
-            logger.info("[group %s] Copying FASTQ files %s for pre-processing at %s." % (group, files, tmp_dir))
-            copy(*files, dest = tmp_dir)
+            logger.info("[group %s] Staging FASTQ files %s for pre-processing at %s." % (group, files, tmp_dir))
+            staged, file_type = _stage_fastq_files(files, tmp_dir)
+
+            config["file_type"] = file_type
 
             prefix = get_random_str()
             logger.info("[group %s] Using prefix for mothur: %s" % (group, prefix))
@@ -76,13 +198,13 @@ def _mothur_trim_files(config, data_dir = None, **kwargs):
 
             if layout == "single":
                 fastq_file = osp.join(tmp_dir, "%s.file" % prefix)
-                fastq_data = "\n".join(lmap(_get_fastq_file_line, files))
+                fastq_data = "\n".join(lmap(_get_fastq_file_line, staged))
                 write(fastq_file, fastq_data)
 
                 config["fastq_file"] = fastq_file
                 config["group"] = osp.join(tmp_dir, "%s.group" % prefix)
 
-            if trim_type == "false":
+            if trim_type == "false" and not primers_trimmed:
                 oligos_file = osp.join(tmp_dir, "primers.oligos")
                 oligos_data = "primer %s %s %s" % (primer_f, primer_r, group)
                 write(oligos_file, oligos_data)
@@ -90,61 +212,60 @@ def _mothur_trim_files(config, data_dir = None, **kwargs):
                 config["oligos"] = oligos_file
 
             mothur_file = osp.join(tmp_dir, "script")
-            
-            build_mothur_script(
-                template = "mothur/trim",
-                output   = mothur_file,
-                inputdir = tmp_dir, prefix = prefix, processors = jobs,
-                qaverage = settings.get("quality_average"),
-                maxambig = settings.get("maximum_ambiguity"),
-                maxhomop = settings.get("maximum_homopolymers"),
-                pdiffs   = settings.get("primer_difference"),
-                proccessors = jobs,
-                **config
-            )
-
-            logger.info("[group %s] Running mothur..." % group)
 
             try:
-                with ShellEnvironment(cwd = tmp_dir) as shell:
-                    code = shell("mothur %s" % mothur_file)
-
-                    if not code:
-                        logger.success("[group %s] mothur ran successfully." % group)
-
-                        logger.info("[group %s] Attempting to copy filtered files." % group)
-
-                        choice = (
-                            ".trim.contigs.trim.good.fasta",
-                            ".contigs.good.groups",
-                            ".trim.contigs.trim.good.summary"
-                        ) if layout == "paired" else (
-                            ".trim.good.fasta",
-                            ".good.group",
-                            ".trim.good.summary"
-                        )
-                            # group(s): are you f'king kiddin' me?
-
-                        makedirs(target_dir, exist_ok = True)
-                
-                        copy(
-                            osp.join(tmp_dir, "%s%s" % (prefix, choice[0])),
-                            dest = target_path["fasta"]
-                        )
-
-                        copy(
-                            osp.join(tmp_dir, "%s%s" % (prefix, choice[1])),
-                            dest = target_path["group"]
-                        )
-
-                        copy(
-                            osp.join(tmp_dir, "%s%s" % (prefix, choice[2])),
-                            dest = target_path["summary"]
-                        )
-
-                        logger.info("[group %s] Successfully copied filtered files at %s." % (group, target_dir))
-                
-                        success = True
+                with resource_budget(jobs) as budget, budget.acquire(maximum = processors) as processors:
+                    build_mothur_script(
+                        template = "mothur/trim",
+                        output   = mothur_file,
+                        inputdir = tmp_dir, prefix = prefix, processors = processors,
+                        qaverage = settings.get("quality_average"),
+                        maxambig = settings.get("maximum_ambiguity"),
+                        maxhomop = settings.get("maximum_homopolymers"),
+                        pdiffs   = settings.get("primer_difference"),
+                        **config
+                    )
+
+                    logger.info("[group %s] Running mothur using %s processors..." % (group, processors))
+
+                    code = run_mothur(mothur_file, cwd = tmp_dir, name = "trim")
+
+                if not code:
+                    logger.success("[group %s] mothur ran successfully." % group)
+
+                    logger.info("[group %s] Attempting to move filtered files." % group)
+
+                    choice = (
+                        ".trim.contigs.trim.good.fasta",
+                        ".contigs.good.groups",
+                        ".trim.contigs.trim.good.summary"
+                    ) if layout == "paired" else (
+                        ".trim.good.fasta",
+                        ".good.group",
+                        ".trim.good.summary"
+                    )
+                        # group(s): are you f'king kiddin' me?
+
+                    makedirs(target_dir, exist_ok = True)
+            
+                    move(
+                        osp.join(tmp_dir, "%s%s" % (prefix, choice[0])),
+                        dest = target_path["fasta"]
+                    )
+
+                    move(
+                        osp.join(tmp_dir, "%s%s" % (prefix, choice[1])),
+                        dest = target_path["group"]
+                    )
+
+                    move(
+                        osp.join(tmp_dir, "%s%s" % (prefix, choice[2])),
+                        dest = target_path["summary"]
+                    )
+
+                    logger.info("[group %s] Successfully moved filtered files at %s." % (group, target_dir))
+            
+                    success = True
             except PopenError as e:
                 logger.error("[group %s] Unable to filter files. Error: %s" % (group, e))
     else:
@@ -153,85 +274,369 @@ def _mothur_trim_files(config, data_dir = None, **kwargs):
     if success and minimal_output:
         remove(*files)
 
+    return success
+
+def _native_trim_files(config, data_dir = None, **kwargs):
+    """
+    Trim and screen FASTQ files natively (merging paired-end reads into
+    contigs), writing the same trimmed files as ``_mothur_trim_files``.
+    """
+    jobs       = kwargs.get("jobs", settings.get("jobs"))
+
+    files      = config["files"]
+    target_dir = config["target_dir"]
+    group      = config["group"]
+
+    minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
+
+    target_path  = _get_target_path(target_dir, name = config.get("target_name", _FILENAME_TRIMMED))
+
+    if all(osp.exists(x) for x in itervalues(target_path)):
+        logger.warn("[group %s] Filtered files already exists." % group)
+        return False
+
+    untrimmed = config["trim_type"] == "false"
+    primers   = untrimmed and not config.get("primers_trimmed")
+
+    paired    = config["layout"] == "paired"
+
+    with resource_budget(jobs) as budget, budget.acquire(maximum = min(config.get("processors", jobs), len(files))) as processors:
+        logger.info("[group %s] Screening files natively using %s processors..." % (group, processors))
+
+        stats = screen_fastq(files, target_path, jobs = processors, paired = paired,
+            min_length = config["min_length"],
+            max_length = config["max_length"],
+            maxambig   = settings.get("maximum_ambiguity"),
+            maxhomop   = settings.get("maximum_homopolymers"),
+            qaverage   = settings.get("quality_average") if untrimmed and not paired else None,
+            primer_f   = config["primer_f"] if primers else None,
+            primer_r   = config["primer_r"] if primers else None,
+            pdiffs     = settings.get("primer_difference")
+        )
+
+    logger.success("[group %s] %s of %s reads passed screening." % (group, stats["passed"], stats["reads"]))
+
+    if minimal_output:
+        remove(*files)
+
+    return True
+
+def _cutadapt_trim_files(config, trim_fn, data_dir = None, **kwargs):
+    jobs           = kwargs.get("jobs", settings.get("jobs"))
+    minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
+
+    group = config["group"]
+    files = config["files"]
+
+    with make_temp_dir(root_dir = CACHE) as tmp_dir:
+        try:
+            trimmed = trim_primers(files, tmp_dir, config["primer_f"], config["primer_r"],
+                paired = config["layout"] == "paired", jobs = config.get("processors", jobs))
+        except PopenError as e:
+            logger.error("[group %s] Unable to trim primers. Error: %s" % (group, e))
+            return False
+
+        config  = dict(config, files = trimmed, primers_trimmed = True)
+        success = trim_fn(config, data_dir = data_dir, **dict(kwargs, minimal_output = False))
+
+    if success and minimal_output:
+        remove(*files)
+
+    return success
+
+def _trim_files(config, data_dir = None, **kwargs):
+    """
+    Trim a unit using the configured ``trim_backend``, unless it has already
+    been trimmed with the same signature. Stale outputs are removed first.
+
+    With ``primer_backend`` set to ``cutadapt``, primers are first removed per
+    sample using cutadapt.
+    """
+    backend        = kwargs.get("trim_backend", settings.get("trim_backend"))
+    primer_backend = kwargs.get("primer_backend", settings.get("primer_backend"))
+
+    target_dir     = config["target_dir"]
+    target_name    = config.get("target_name", _FILENAME_TRIMMED)
+    signature      = config.get("signature")
+
+    if _is_trimmed(target_dir, name = target_name, signature = signature):
+        logger.warn("[group %s] Filtered files already exists." % config["group"])
+        return False
+
+    signature_path = _get_signature_path(target_dir, name = target_name)
+
+    remove(signature_path, *itervalues(_get_target_path(target_dir, name = target_name)), raise_err = False)
+
+    trim_fn = _mothur_trim_files
+
+    if backend == "native":
+        trim_fn = _native_trim_files
+
+    if primer_backend == "cutadapt" and config["trim_type"] == "false":
+        success = _cutadapt_trim_files(config, trim_fn, data_dir = data_dir, **kwargs)
+    else:
+        success = trim_fn(config, data_dir = data_dir, **kwargs)
+
+    if success and signature:
+        write(signature_path, json.dumps(signature), force = True)
+
+    return success
+
+def _get_sra_fastq_files(data_dir, sra_id):
+    sra_dir = osp.join(data_dir, sra_id)
+    files   = []
+
+    if osp.isdir(sra_dir):
+        files = [osp.join(sra_dir, fastq_file) for fastq_file in sorted(os.listdir(sra_dir))
+            if is_fastq(fastq_file)]
+
+    return files
+
+def get_trim_units(data):
+    """
+    Yield each (group, layout, trim_type) unit of a study along with the SRA
+    metadata it is built from.
+    """
+    for layout, trim_type in itertools.product(("paired", "single"), ("true", "false")):
+        for group, values in iteritems(data):
+            if len(values):
+                filtered = lfilter(lambda x: x["layout"] == layout and x["trimmed"] == trim_type, values)
+
+                yield {
+                    "group": group, "layout": layout, "trim_type": trim_type,
+                    "data": values, "filtered": filtered
+                }
+            else:
+                logger.warn("No FASTQ files found for group %s" % group)
+
+def build_trim_config(unit, data_dir = None, manifest = None, **kwargs):
+    """
+    Build the config of a trim unit, skipping FASTQ files the ``manifest``
+    (see ``refresh_manifest``) records as empty and signing it with the
+    checksums the manifest records.
+    """
+    data_dir  = get_data_dir(NAME, data_dir)
+
+    group     = unit["group"]
+    layout    = unit["layout"]
+    trim_type = unit["trim_type"]
+
+    files     = []
+    manifest  = manifest or Manifest(data_dir)
+
+    for d in unit["filtered"]:
+        sra_id = d["sra"]
+        paths  = _get_sra_fastq_files(data_dir, sra_id)
+
+        if not manifest.is_stale(sra_id):
+            empty = set(manifest.files(sra_id)) - set(manifest.files(sra_id, non_empty = True))
+
+            if empty:
+                logger.warn("[group %s] Skipping empty FASTQ file(s) %s." % (group, sorted(empty)))
+                paths = [path for path in paths if path not in empty]
+
+        files += paths
+
+    if not files:
+        logger.warn("No FASTQ files found for group %s of type (layout: %s, trimmed: %s)" % (group, layout, trim_type))
+        return None
+
+    logger.info("Filtering FASTQ files for group %s of type (layout: %s, trimmed: %s)" % (group, layout, trim_type))
+
+    sample  = unit["data"][0]
+
+    tar_dir = osp.join(data_dir, _DATA_DIR_NAME_TRIMMED, group, layout,
+        "trimmed" if trim_type == "true" else "untrimmed")
+
+    config  = {
+        "files": files,
+        "target_dir": tar_dir,
+
+        "group": group,
+
+        # NOTE: This is under the assumption that each group has the same primer.
+        "primer_f": sample["primer_f"],
+        "primer_r": sample["primer_r"],
+
+        "layout": layout, "trim_type": trim_type,
+        
+        "min_length": sample["min_length"],
+        "max_length": sample["max_length"]
+    }
+
+    config["signature"] = trim_signature(config, manifest = manifest, **kwargs)
+
+    return config
+
+def shard_trim_config(config, shard_size = 0):
+    """
+    Split a trim unit into shards of ``shard_size`` SRA runs each. Shards keep
+    the order of the unit's files and are trimmed into
+    ``<target_dir>/.shards/<key>/shard.*``, keyed on their SRA runs.
+    """
+    runs = collections.OrderedDict()
+
+    for f in config["files"]:
+        runs.setdefault(osp.dirname(f), []).append(f)
+
+    if shard_size <= 0 or len(runs) <= shard_size:
+        return [config]
+
+    shards = []
+
+    for chunk in chunkify(list(runs.items()), shard_size):
+        sras = [osp.basename(sra_dir) for sra_dir, _ in chunk]
+        key  = hashlib.md5(" ".join(sras).encode()).hexdigest()[:12]
+
+        shard = dict(config,
+            files       = flatten([files for _, files in chunk]),
+            target_dir  = osp.join(config["target_dir"], _DIR_NAME_SHARDS, key),
+            target_name = _FILENAME_SHARD
+        )
+
+        if config.get("signature"):
+            inputs = config["signature"]["inputs"]
+            shard["signature"] = _signature({ _input_key(f): inputs[_input_key(f)] for f in shard["files"] },
+                config["signature"]["params"])
+
+        shards.append(shard)
+
+    return shards
+
+def merge_trim_shards(config, shards, minimal_output = False):
+    """
+    Concatenate the trimmed files of a unit's shards (in order) into the
+    unit's target, keeping only the first summary header.
+
+    Shards are kept so that only new or changed shards are trimmed on a
+    subsequent run, shards no longer part of the unit are removed.
+    """
+    target_dir  = config["target_dir"]
+    target_path = _get_target_path(target_dir)
+    shard_paths = [_get_target_path(shard["target_dir"], name = _FILENAME_SHARD) for shard in shards]
+
+    if not all(_is_trimmed(shard["target_dir"], name = _FILENAME_SHARD, signature = shard.get("signature"))
+        for shard in shards):
+        logger.error("[group %s] Unable to merge shards, not all shards were trimmed." % config["group"])
+        return False
+
+    for type_, target in iteritems(target_path):
+        temp = "%s.%s" % (target, os.getpid())
+
+        with open(temp, "wb") as dst:
+            for i, paths in enumerate(shard_paths):
+                with open(paths[type_], "rb") as src:
+                    if type_ == "summary" and i:
+                        src.readline()
+
+                    shutil.copyfileobj(src, dst)
+
+        os.replace(temp, target)
+
+    if config.get("signature"):
+        write(_get_signature_path(target_dir), json.dumps(config["signature"]), force = True)
+
+    shards_dir = osp.join(target_dir, _DIR_NAME_SHARDS)
+    current    = set(osp.basename(shard["target_dir"]) for shard in shards)
+
+    for key in os.listdir(shards_dir):
+        if minimal_output or key not in current:
+            remove(osp.join(shards_dir, key), recursive = True)
+
+    logger.success("[group %s] Merged %s shards into %s." % (config["group"], len(shards), target_dir))
+
+    return True
+
+def schedule_trim_configs(configs, jobs = None):
+    """
+    Order trim units by their total input size (largest first) and assign each
+    a share of processors proportional to its size.
+    """
+    jobs  = int(jobs or settings.get("jobs"))
+
+    for config in configs:
+        config["size"] = sum(osp.getsize(f) for f in config["files"])
+
+    configs.sort(key = lambda x: x["size"], reverse = True)
+
+    total = sum(config["size"] for config in configs) or 1
+
+    for config in configs:
+        config["processors"] = max(1, min(jobs, int(round(jobs * config["size"] / total))))
+
+    return configs
+
+def plan_trim_configs(configs, jobs = None, shard_size = 0):
+    """
+    Skip trim units already trimmed, split the rest into shards of
+    ``shard_size`` SRA runs each and schedule them (see
+    ``schedule_trim_configs``).
+
+    Returns the configs to be trimmed along with each sharded unit and its
+    shards, to be merged once trimmed (see ``merge_trim_shards``).
+    """
+    shard_size = int(shard_size or 0)
+
+    units   = []
+    pending = []
+
+    for config in configs:
+        if _is_trimmed(config["target_dir"], signature = config["signature"]):
+            logger.warn("[group %s] Filtered files already exists." % config["group"])
+            continue
+
+        shards = shard_trim_config(config, shard_size = shard_size)
+
+        if len(shards) > 1:
+            logger.info("[group %s] Sharding %s files into %s shards." % (config["group"], len(config["files"]), len(shards)))
+            units.append((config, shards))
+
+        pending += shards
+
+    return schedule_trim_configs(pending, jobs = jobs), units
+
 def trim_seqs(data_dir = None, data = [], *args, **kwargs):
     input = kwargs.pop("input", None)
 
-    data_dir, data_input = get_input_data(input = input, data_dir = data_dir, *args, **kwargs)
-
     if not data:
-        data = data_input
+        data_dir, data = get_input_data(input = input, data_dir = data_dir, *args, **kwargs)
+
+    data_dir = get_data_dir(NAME, data_dir)
 
     jobs = kwargs.get("jobs", settings.get("jobs"))
 
     trimmed_dir = makedirs(osp.join(data_dir, _DATA_DIR_NAME_TRIMMED), exist_ok = True)
     logger.info("Storing trimmed FASTQ files at %s." % trimmed_dir)
 
-    mothur_configs = []
-    
     for group, values in iteritems(data):
         for i, _ in enumerate(values):
             values[i]["group"] = group
         data[group] = values
 
-    study_group = data
-
-    logger.info("Found %s groups." % len(study_group))
+    logger.info("Found %s groups." % len(data))
     logger.info("Building configs for mothur...")
 
-    for layout, trim_type in itertools.product(("paired", "single"), ("true", "false")):
-        for group, data in iteritems(study_group):
-            if len(data):
-                filtered = lfilter(lambda x: x["layout"] == layout and x["trimmed"] == trim_type, data)
-                files    = []
-                
-                for d in filtered:
-                    sra_id  = d["sra"]
-                    sra_dir = osp.join(data_dir, sra_id)
-
-                    # fasta_files = get_files(sra_dir, "*.fastq")
-                    fasta_files = os.listdir(sra_dir)
-                    fasta_files = [osp.join(sra_dir, fasta_file) for fasta_file in fasta_files
-                        if fasta_file.endswith(".fastq")]
-
-                    files += fasta_files
-
-                if files:
-                    logger.info("Filtering FASTQ files for group %s of type (layout: %s, trimmed: %s)" % (group, layout, trim_type))
-
-                    sample  = data[0]
-
-                    tar_dir = osp.join(trimmed_dir, group, layout,
-                        "trimmed" if trim_type == "true" else "untrimmed")
-
-                    mothur_configs.append({
-                        "files": files,
-                        "target_dir": tar_dir,
-
-                        "group": group,
-
-                        # NOTE: This is under the assumption that each group has the same primer.
-                        "primer_f": sample["primer_f"],
-                        "primer_r": sample["primer_r"],
-
-                        "layout": layout, "trim_type": trim_type,
-                        
-                        "min_length": sample["min_length"],
-                        "max_length": sample["max_length"]
-                    })
-                else:
-                    logger.warn("No FASTQ files found for group %s of type (layout: %s, trimmed: %s)" % (group, layout, trim_type))
-            else:
-                logger.warn("No FASTQ files found for group %s" % group)
+    # checksums of inputs are recorded (in parallel) once, the signature of each unit reusing them.
+    manifest = refresh_manifest(data_dir, [d["sra"] for values in itervalues(data) for d in values], jobs = jobs)
+
+    mothur_configs = lfilter(None, [build_trim_config(unit, data_dir = data_dir, manifest = manifest, **kwargs)
+        for unit in get_trim_units(data)])
+
+    mothur_configs, units = plan_trim_configs(mothur_configs, jobs = jobs,
+        shard_size = kwargs.get("trim_shard_size", settings.get("trim_shard_size")))
 
     if mothur_configs:
         logger.info("Filtering files using mothur using %s jobs...." % jobs)
 
-        trim_chunks = settings.get("trim_chunks")
+        # a single long-lived pool, idle workers pull the next (largest) unit as soon as they're free.
+        with resource_budget(jobs), parallel.no_daemon_pool(processes = min(int(jobs), len(mothur_configs))) as pool:
+            length    = len(mothur_configs)
+            function_ = build_fn(_trim_files, data_dir = data_dir, *args, **kwargs)
+            results   = pool.imap(function_, mothur_configs)
 
-        for chunk in chunkify(mothur_configs, trim_chunks):
-            with parallel.no_daemon_pool(processes = jobs) as pool:
-                length    = len(mothur_configs)
-                function_ = build_fn(_mothur_trim_files, *args, **kwargs)
-                results   = pool.imap(function_, chunk)
+            list(tq.tqdm(results, total = length))
+
+    minimal_output = kwargs.get("minimal_output", settings.get("minimal_output"))
 
-                list(tq.tqdm(results, total = length))
\ No newline at end of file
+    for config, shards in units:
+        merge_trim_shards(config, shards, minimal_output = minimal_output)
@@ -0,0 +1,68 @@
+import os, os.path as osp
+import json
+
+from s3mart import __name__ as NAME
+
+from bpyutils.util.system import makedirs
+from bpyutils._compat import itervalues
+from bpyutils import log
+
+from s3mart.data.util import file_lock
+
+logger = log.get_logger(name = NAME)
+
+_LEDGER_NAME = "ledger.json"
+
+class Ledger:
+    """
+    A persistent record of the stages completed within a working directory,
+    each along with the signature it was run with and the files it output.
+    """
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.path     = osp.join(work_dir, _LEDGER_NAME)
+        self.entries  = { }
+
+        self.load()
+
+    def load(self):
+        if osp.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+        return self
+
+    def save(self):
+        makedirs(self.work_dir, exist_ok = True)
+
+        with file_lock("%s.lock" % self.path):
+            temp = "%s.%s" % (self.path, os.getpid())
+
+            with open(temp, "w") as f:
+                json.dump(self.entries, f)
+
+            os.replace(temp, self.path)
+
+    def get(self, stage):
+        return self.entries.get(stage)
+
+    def set(self, stage, key, outputs):
+        self.entries[stage] = { "key": key, "outputs": outputs }
+
+    def unset(self, *stages):
+        for stage in stages:
+            self.entries.pop(stage, None)
+
+    def has_outputs(self, stage):
+        entry = self.get(stage)
+        return bool(entry) and all(osp.exists(osp.join(self.work_dir, f)) for f in itervalues(entry["outputs"]))
+
+    def is_complete(self, stage, key = None):
+        """
+        Check whether a stage has been completed and, given its ``key``, that
+        it was run with the same signature.
+        """
+        if not self.has_outputs(stage):
+            return False
+
+        return key is None or self.get(stage)["key"] == key
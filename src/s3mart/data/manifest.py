@@ -0,0 +1,165 @@
+import os, os.path as osp
+import json
+import mmap
+
+import tqdm as tq
+
+from s3mart import settings, __name__ as NAME
+
+from bpyutils.util.system import makedirs
+from bpyutils._compat import iteritems
+from bpyutils import parallel, log
+
+from s3mart.data.util  import file_lock, checksum
+from s3mart.data.budget import resource_budget
+from s3mart.data.fastq import get_fastq_files, get_compression, open_fastq
+
+logger = log.get_logger(name = NAME)
+
+_MANIFEST_NAME = "manifest.json"
+_CHUNK_SIZE    = 16 * 1024 * 1024
+
+def count_reads(path):
+    """
+    Count the number of reads within a (optionally compressed) FASTQ file by
+    counting newlines, memory-mapping uncompressed files.
+    """
+    lines = 0
+
+    if get_compression(path):
+        with open_fastq(path) as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                lines += chunk.count(b"\n")
+    elif osp.getsize(path):
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as m:
+            lines = sum(m[i:i + _CHUNK_SIZE].count(b"\n") for i in range(0, len(m), _CHUNK_SIZE))
+
+    return lines // 4
+
+def scan_sra_dir(sra_dir):
+    """
+    Scan an SRA directory for FASTQ files, recording their size, mtime, read
+    count and checksum.
+    """
+    files = []
+
+    for path in get_fastq_files(sra_dir):
+        stat = os.stat(path)
+
+        files.append({
+            "path":     path,
+            "size":     stat.st_size,
+            "mtime":    stat.st_mtime,
+            "reads":    count_reads(path),
+            "checksum": checksum(path)
+        })
+
+    return {
+        "mtime": os.stat(sra_dir).st_mtime if osp.isdir(sra_dir) else None,
+        "files": files
+    }
+
+def is_stale(entry, sra_dir):
+    """
+    Check whether a manifest entry no longer reflects an SRA directory.
+    """
+    if not entry or not osp.isdir(sra_dir):
+        return True
+
+    if os.stat(sra_dir).st_mtime != entry["mtime"]:
+        return True
+
+    for f in entry["files"]:
+        if not osp.exists(f["path"]):
+            return True
+
+        stat = os.stat(f["path"])
+
+        if stat.st_size != f["size"] or stat.st_mtime != f["mtime"]:
+            return True
+
+    return False
+
+class Manifest:
+    """
+    A persistent record of the FASTQ files fetched for each SRA within a data
+    directory.
+    """
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.path     = osp.join(data_dir, _MANIFEST_NAME)
+        self.entries  = { }
+
+        self.load()
+
+    def load(self):
+        if osp.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+        return self
+
+    def save(self):
+        makedirs(self.data_dir, exist_ok = True)
+
+        with file_lock("%s.lock" % self.path):
+            temp = "%s.%s" % (self.path, os.getpid())
+
+            with open(temp, "w") as f:
+                json.dump(self.entries, f)
+
+            os.replace(temp, self.path)
+
+    def get(self, sra):
+        return self.entries.get(sra)
+
+    def set(self, sra, entry):
+        self.entries[sra] = entry
+
+    def files(self, sra, non_empty = False):
+        """
+        Get the FASTQ files recorded for an SRA, optionally only the ones that
+        contain reads.
+        """
+        entry = self.get(sra) or { "files": [] }
+        return [f["path"] for f in entry["files"] if not non_empty or f["reads"]]
+
+    def reads(self, sra):
+        entry = self.get(sra) or { "files": [] }
+        return sum(f["reads"] for f in entry["files"])
+
+    def is_stale(self, sra):
+        return is_stale(self.get(sra), osp.join(self.data_dir, sra))
+
+    def __iter__(self):
+        return iteritems(self.entries)
+
+def _scan_sra_dir(sra_dir):
+    with resource_budget() as budget, budget.acquire(maximum = 1):
+        return scan_sra_dir(sra_dir)
+
+def refresh_manifest(data_dir, sra_ids, jobs = None):
+    """
+    Rescan (in parallel) the SRA directories of a data directory whose entries
+    within its manifest are stale, saving the manifest if any were.
+
+    Returns the manifest.
+    """
+    jobs     = int(jobs or settings.get("jobs"))
+
+    manifest = Manifest(data_dir)
+    stale    = [sra_id for sra_id in sra_ids if manifest.is_stale(sra_id)]
+
+    logger.info("Scanning %s of %s SRA directories..." % (len(stale), len(sra_ids)))
+
+    if stale:
+        with resource_budget(jobs), parallel.pool(processes = min(jobs, len(stale))) as pool:
+            sra_dirs = [osp.join(data_dir, sra_id) for sra_id in stale]
+            results  = pool.imap(_scan_sra_dir, sra_dirs)
+
+            for sra_id, entry in zip(stale, tq.tqdm(results, total = len(stale), desc = "Checking data integrity")):
+                manifest.set(sra_id, entry)
+
+        manifest.save()
+
+    return manifest
@@ -0,0 +1,256 @@
+import os, os.path as osp
+import re
+import json
+import time
+import threading
+import subprocess
+import collections
+
+from s3mart.config  import PATH
+from s3mart import __name__ as NAME
+
+from bpyutils.util.system  import makedirs, get_files
+from bpyutils._compat import iteritems
+from bpyutils import log
+
+logger = log.get_logger(name = NAME)
+
+PROFILE_DIR = osp.join(PATH["CACHE"], "profiles")
+
+_COMMAND_PATTERN = re.compile(r"^mothur > ([\w.]+)\(")
+_TOOK_PATTERN    = re.compile(r"It took (\d+(?:\.\d+)?) sec")
+
+_SAMPLE_INTERVAL = 0.5
+
+_CLOCK_TICKS     = os.sysconf("SC_CLK_TCK")   if hasattr(os, "sysconf") else 100
+_PAGE_SIZE       = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _read_stats():
+    """
+    Read the parent, CPU time (including waited for children) and resident
+    set size of every process from ``/proc``.
+    """
+    stats = { }
+
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+
+        try:
+            with open("/proc/%s/stat" % pid) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+
+        # fields after the command name, starting from the state (field 3).
+        stats[int(pid)] = (int(fields[1]), sum(int(x) for x in fields[11:15]) / _CLOCK_TICKS,
+            int(fields[21]) * _PAGE_SIZE)
+
+    return stats
+
+def _process_tree(pid, stats):
+    children = collections.defaultdict(list)
+
+    for child, (parent, _, _) in iteritems(stats):
+        children[parent].append(child)
+
+    tree, stack = [ ], [pid]
+
+    while stack:
+        pid_ = stack.pop()
+
+        if pid_ in stats:
+            tree.append(pid_)
+            stack.extend(children[pid_])
+
+    return tree
+
+class _Sampler(threading.Thread):
+    """
+    Sample the CPU time and resident set size of a process along with all of
+    its descendants.
+    """
+    def __init__(self, pid, interval = _SAMPLE_INTERVAL):
+        super(_Sampler, self).__init__(daemon = True)
+
+        self.pid      = pid
+        self.interval = interval
+
+        self.cpu      = 0
+        self.peak_rss = 0
+
+        self._lock    = threading.Lock()
+        self._done    = threading.Event()
+
+    def sample(self):
+        if not osp.isdir("/proc"):
+            return
+
+        stats = _read_stats()
+        tree  = _process_tree(self.pid, stats)
+
+        with self._lock:
+            if tree:
+                self.cpu      = max(self.cpu, sum(stats[pid][1] for pid in tree))
+                self.peak_rss = max(self.peak_rss, sum(stats[pid][2] for pid in tree))
+
+    def reset_peak(self):
+        """
+        Get the peak resident set size since the last reset.
+        """
+        with self._lock:
+            peak, self.peak_rss = self.peak_rss, 0
+
+        return peak
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+def _exit_code(status):
+    """
+    Decode a wait status into an exit code, negative for the signal that
+    terminated the process (as ``subprocess`` does).
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+
+    return os.WEXITSTATUS(status) if os.WIFEXITED(status) else status
+
+def parse_log(lines):
+    """
+    Parse the output of mothur, returning each command run along with the
+    elapsed times it reported ("It took N secs...").
+    """
+    commands = [ ]
+
+    for line in lines:
+        match = _COMMAND_PATTERN.match(line.strip())
+
+        if match:
+            commands.append({ "command": match.group(1), "reported": 0 })
+        elif commands:
+            for took in _TOOK_PATTERN.findall(line):
+                commands[-1]["reported"] += float(took)
+
+    return commands
+
+def run_mothur(script, cwd = None, name = "mothur", profile_dir = PROFILE_DIR):
+    """
+    Run a mothur script, returning its exit code.
+
+    mothur's output is written to ``<script>.logfile``. The wall time, CPU time
+    and peak RSS of each command (sampled across mothur and every process it
+    spawns) along with the elapsed time mothur reports are written to a JSON
+    profile within ``profile_dir``.
+    """
+    logfile  = "%s.logfile" % script
+    commands = [ ]
+
+    start    = time.time()
+
+    with open(logfile, "w") as log_:
+        try:
+            process = subprocess.Popen(["mothur", script], cwd = cwd, stdout = subprocess.PIPE,
+                stderr = subprocess.STDOUT, universal_newlines = True)
+        except OSError as e:
+            logger.error("Unable to run mothur. Error: %s" % e)
+            return 127
+
+        sampler = _Sampler(process.pid)
+        sampler.start()
+
+        def close(command):
+            sampler.sample()
+
+            command["wall"]     = time.time() - command.pop("_start")
+            command["cpu"]      = sampler.cpu - command.pop("_cpu")
+            command["peak_rss"] = sampler.reset_peak()
+
+        for line in process.stdout:
+            log_.write(line)
+
+            if _COMMAND_PATTERN.match(line.strip()):
+                if commands:
+                    close(commands[-1])
+
+                sampler.sample()
+                sampler.reset_peak()
+
+                commands.append({ "_start": time.time(), "_cpu": sampler.cpu })
+
+        if commands:
+            close(commands[-1])
+
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = code = _exit_code(status)
+
+        sampler.stop()
+
+    with open(logfile) as f:
+        for command, parsed in zip(commands, parse_log(f)):
+            command.update(parsed)
+
+    profile = {
+        "name":      name,
+        "script":    script,
+        "cwd":       cwd,
+        "code":      code,
+        "start":     start,
+        "wall":      time.time() - start,
+        "cpu_user":  rusage.ru_utime,
+        "cpu_sys":   rusage.ru_stime,
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss":  rusage.ru_maxrss * 1024,
+        "commands":  commands
+    }
+
+    if profile_dir:
+        makedirs(profile_dir, exist_ok = True)
+
+        path = osp.join(profile_dir, "%s-%d-%s.json" % (name, start * 1000, process.pid))
+
+        with open(path, "w") as f:
+            json.dump(profile, f, indent = 2)
+
+        logger.info("Profile of mothur run %s written to %s." % (name, path))
+
+    return code
+
+def read_profiles(profile_dir = PROFILE_DIR):
+    profiles = [ ]
+
+    for path in sorted(get_files(profile_dir, "*.json")) if osp.isdir(profile_dir) else [ ]:
+        with open(path) as f:
+            profiles.append(json.load(f))
+
+    return profiles
+
+def report_profiles(profiles):
+    """
+    Aggregate the commands of mothur profiles across runs, returning a row per
+    run and command, sorted by total wall time (descending).
+    """
+    rows = collections.OrderedDict()
+
+    for profile in profiles:
+        for command in profile["commands"]:
+            key = (profile["name"], command["command"])
+
+            if key not in rows:
+                rows[key] = { "name": key[0], "command": key[1], "runs": 0,
+                    "wall": 0, "reported": 0, "cpu": 0, "peak_rss": 0 }
+
+            row = rows[key]
+
+            row["runs"]     += 1
+            row["wall"]     += command.get("wall", 0)
+            row["reported"] += command.get("reported", 0)
+            row["cpu"]      += command.get("cpu", 0)
+            row["peak_rss"]  = max(row["peak_rss"], command.get("peak_rss", 0))
+
+    return sorted(rows.values(), key = lambda x: x["wall"], reverse = True)
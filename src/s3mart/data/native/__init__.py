@@ -0,0 +1,5 @@
+from s3mart.data.native.qc import fastq_stats, native_qc
+from s3mart.data.native.screen import screen_fastq
+from s3mart.data.native.derep import dereplicate
+from s3mart.data.native.classify import build_index, classify
+from s3mart.data.native.assign import map_sequences
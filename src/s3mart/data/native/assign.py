@@ -0,0 +1,92 @@
+import itertools
+
+import numpy as np
+
+from s3mart import __name__ as NAME
+
+from bpyutils import log
+
+from s3mart.data.native.derep import read_fasta
+from s3mart.data.native.tree  import get_profile, take_profile, distances
+
+logger = log.get_logger(name = NAME)
+
+_BLOCK_SIZE = 512
+
+_GAPS = np.frombuffer(b"-.", dtype = np.uint8)
+
+def _to_matrix(records):
+    return np.frombuffer(b"".join(sequence.upper() for _, sequence in records),
+        dtype = np.uint8).reshape(len(records), -1)
+
+def _batches(fasta, size):
+    records = read_fasta(fasta)
+    return iter(lambda: list(itertools.islice(records, size)), [])
+
+def map_sequences(fasta, reference, cutoff = 0.03, block_size = _BLOCK_SIZE):
+    """
+    Map every sequence of an aligned FASTA file to its nearest sequence of an
+    aligned ``reference`` (aligned against the same template), as long as
+    their distance (see ``s3mart.data.native.tree.distances``) is within
+    ``cutoff``.
+
+    The reference is profiled once. Sequences are compared against it in
+    blocks of ``block_size``, with exact distances computed only for the
+    reference sequences that could be within ``cutoff``. Returns a dict of
+    the sequences mapped along with the reference sequence and distance
+    each was mapped to.
+    """
+    references = list(read_fasta(reference))
+    mapped     = { }
+
+    if not references:
+        return mapped
+
+    names      = [name.decode() for name, _ in references]
+    matrix     = _to_matrix(references)
+
+    # columns gapped within every sequence (queries included) aren't ever compared.
+    gapped     = np.isin(matrix, _GAPS).all(axis = 0)
+
+    for batch in _batches(fasta, block_size):
+        query  = _to_matrix(batch)
+
+        if query.shape[1] != matrix.shape[1]:
+            raise ValueError("Sequences of %s and %s aren't aligned against the same template." % (fasta, reference))
+
+        gapped &= np.isin(query, _GAPS).all(axis = 0)
+
+    profile    = get_profile(matrix[:, ~gapped])
+
+    # distances are float32, the cutoff is compared at the same precision.
+    cutoff     = np.float32(cutoff)
+    total      = 0
+
+    for batch in _batches(fasta, block_size):
+        query   = get_profile(_to_matrix(batch)[:, ~gapped])
+
+        both    = query["bases"] @ profile["bases"].T
+        matches = sum(query["chars"][c] @ profile["chars"][c].T for c in set(query["chars"]) & set(profile["chars"]))
+
+        # runs of gaps only add to a distance, those over the cutoff without them can't be mapped.
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            bound = np.where(both > 0, (both - matches) / both, 1.0)
+
+        candidates = np.flatnonzero((bound <= cutoff).any(axis = 0))
+        total     += len(batch)
+
+        if not len(candidates):
+            continue
+
+        block   = distances(query, take_profile(profile, candidates))
+        nearest = np.argmin(block, axis = 1)
+
+        for i, (name, _) in enumerate(batch):
+            distance = block[i, nearest[i]]
+
+            if distance <= cutoff:
+                mapped[name.decode()] = (names[candidates[nearest[i]]], float(distance))
+
+    logger.info("Mapped %s of %s sequences within a distance of %s." % (len(mapped), total, cutoff))
+
+    return mapped
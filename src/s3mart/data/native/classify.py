@@ -0,0 +1,256 @@
+import os, os.path as osp
+import re
+import json
+import zlib
+import hashlib
+import itertools
+
+import numpy as np
+
+from s3mart.config  import PATH
+from s3mart import __name__ as NAME
+
+from bpyutils.util.types   import build_fn
+from bpyutils.util.system  import makedirs
+from bpyutils import parallel, log
+
+from s3mart.data.util import file_lock
+from s3mart.data.native.derep import read_fasta
+
+logger = log.get_logger(name = NAME)
+
+_KMER_SIZE   = 8
+
+_FILENAME_TABLE    = "table.npy"
+_FILENAME_LINEAGES = "lineages.json"
+
+_BATCH_SIZE  = 1000
+_BLOCK_SIZE  = 4096
+
+# 0-3 for every (unambiguous) base, 255 for anything else.
+_CODE = np.full(256, 255, dtype = np.uint8)
+
+for _i, _bases in enumerate(("Aa", "Cc", "Gg", "TtUu")):
+    _CODE[[ord(b) for b in _bases]] = _i
+
+_GAPS = b"-."
+
+_CONFIDENCE_PATTERN = re.compile(r"\(\d+(?:\.\d+)?\)$")
+
+# tables of the indices loaded within a process, memory-mapped (and shared) read-only.
+_INDICES = { }
+
+def get_kmers(sequence, k = _KMER_SIZE):
+    """
+    Get the unique k-mers (encoded as integers) of a (possibly aligned)
+    sequence, skipping k-mers with an ambiguous base.
+    """
+    codes = _CODE[np.frombuffer(sequence.translate(None, _GAPS), dtype = np.uint8)]
+
+    if len(codes) < k:
+        return np.zeros(0, dtype = np.int64)
+
+    windows = np.lib.stride_tricks.sliding_window_view(codes, k)
+    windows = windows[(windows != 255).all(axis = 1)].astype(np.int64)
+
+    return np.unique(windows @ (4 ** np.arange(k - 1, -1, -1, dtype = np.int64)))
+
+def read_taxonomy(path):
+    """
+    Read a mothur taxonomy file, returning the lineage of each sequence
+    (stripped of any confidences).
+    """
+    taxonomy = { }
+
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                name, lineage = line.rstrip("\n").split("\t", 1)
+                taxonomy[name] = tuple(_CONFIDENCE_PATTERN.sub("", t.strip())
+                    for t in lineage.strip().split(";") if t.strip())
+
+    return taxonomy
+
+def _index_key(reference, taxonomy, k):
+    identity = [(osp.basename(p), os.stat(p).st_size, os.stat(p).st_mtime) for p in (reference, taxonomy)]
+    return hashlib.md5(json.dumps({ "files": identity, "k": k }).encode()).hexdigest()[:12]
+
+def _build_table(reference, taxonomy, target_dir, k = _KMER_SIZE):
+    taxonomy = read_taxonomy(taxonomy)
+
+    genera   = { }
+    kmers, genus_ids = [ ], [ ]
+
+    for name, sequence in read_fasta(reference):
+        lineage = taxonomy.get(name.decode())
+
+        if not lineage:
+            continue
+
+        genus   = genera.setdefault(lineage, len(genera))
+
+        kmers.append(get_kmers(sequence, k = k))
+        genus_ids.append(genus)
+
+    n_kmers  = 4 ** k
+    n_genera = len(genera)
+    n_seqs   = len(kmers)
+
+    sizes    = np.bincount(genus_ids, minlength = n_genera)
+
+    pairs    = np.concatenate(kmers) * n_genera + np.repeat(genus_ids, [len(x) for x in kmers])
+    pairs, counts = np.unique(pairs, return_counts = True)
+
+    # the probability of a k-mer within any sequence, the prior of Wang et al. (2007).
+    prior    = (np.bincount(pairs // n_genera, weights = counts, minlength = n_kmers) + 0.5) / (n_seqs + 1)
+    denom    = np.log(sizes + 1)
+
+    table    = np.lib.format.open_memmap(osp.join(target_dir, _FILENAME_TABLE), mode = "w+",
+        dtype = np.float32, shape = (n_kmers, n_genera))
+
+    for start in range(0, n_kmers, _BLOCK_SIZE):
+        stop  = min(start + _BLOCK_SIZE, n_kmers)
+        block = np.log(prior[start:stop])[:, None] - denom[None, :]
+
+        lo, hi = np.searchsorted(pairs, [start * n_genera, stop * n_genera])
+        rows, columns = np.divmod(pairs[lo:hi], n_genera)
+
+        block[rows - start, columns] = np.log(counts[lo:hi] + prior[rows]) - denom[columns]
+
+        table[start:stop] = block
+
+    table.flush()
+
+    with open(osp.join(target_dir, _FILENAME_LINEAGES), "w") as f:
+        json.dump([list(lineage) for lineage in sorted(genera, key = genera.get)], f)
+
+    logger.success("Built a %s-mer table of %s genera from %s reference sequences." % (k, n_genera, n_seqs))
+
+def build_index(reference, taxonomy, target_dir = None, k = _KMER_SIZE):
+    """
+    Build (once) the k-mer log-probability table of the Wang et al. (2007)
+    classifier ``classify.seqs`` uses, for a reference alignment and its
+    taxonomy.
+
+    The table (k-mers by genera) is stored as a NumPy array for classifiers to
+    memory-map, cached under a directory keyed on the reference, taxonomy and
+    ``k``. Returns the path to the directory.
+    """
+    target_dir = target_dir or osp.join(PATH["CACHE"], "silva", "classifier")
+    path       = osp.join(target_dir, _index_key(reference, taxonomy, k))
+
+    makedirs(target_dir, exist_ok = True)
+
+    with file_lock("%s.lock" % path):
+        if osp.exists(osp.join(path, _FILENAME_LINEAGES)):
+            logger.info("Using cached classifier index at %s." % path)
+            return path
+
+        logger.info("Building classifier index from %s and %s..." % (reference, taxonomy))
+
+        temp = makedirs("%s.%s" % (path, os.getpid()), exist_ok = True)
+
+        _build_table(reference, taxonomy, temp, k = k)
+        os.replace(temp, path)
+
+    return path
+
+def _load_index(path):
+    if path not in _INDICES:
+        table = np.load(osp.join(path, _FILENAME_TABLE), mmap_mode = "r")
+
+        with open(osp.join(path, _FILENAME_LINEAGES)) as f:
+            lineages = [tuple(lineage) for lineage in json.load(f)]
+
+        depth = max(len(lineage) for lineage in lineages)
+
+        # an identifier for the taxon (along with its ancestors) of each genus at each level.
+        taxa  = { }
+        ids   = np.full((len(lineages), depth), -1, dtype = np.int64)
+
+        for i, lineage in enumerate(lineages):
+            for level in range(len(lineage)):
+                ids[i, level] = taxa.setdefault(lineage[:level + 1], len(taxa))
+
+        _INDICES[path] = (table, lineages, ids, int(round(np.log(table.shape[0]) / np.log(4))))
+
+    return _INDICES[path]
+
+def classify_sequence(name, sequence, index, cutoff = 80, iters = 100):
+    """
+    Classify a sequence as ``classify.seqs`` does, returning its lineage along
+    with the bootstrap confidence of each level (in mothur's taxonomy format).
+
+    The genus of the highest summed log-probability over the sequence's k-mers
+    is assigned, its confidence at each level being the percentage of
+    ``iters`` bootstrap subsamples (an eighth of the k-mers each) assigned a
+    genus sharing the taxon at that level. Levels below ``cutoff`` are
+    reported as unclassified.
+    """
+    table, lineages, ids, k = index
+
+    kmers = get_kmers(sequence, k = k)
+
+    if not len(kmers):
+        return "unknown;"
+
+    rows  = np.asarray(table[kmers], dtype = np.float64)
+    best  = int(np.argmax(rows.sum(axis = 0)))
+
+    # deterministic for a sequence, regardless of the batch or process it's classified in.
+    rng   = np.random.default_rng(zlib.crc32(name))
+    picks = rng.integers(0, len(kmers), size = (iters, max(1, len(kmers) // 8)))
+
+    samples = np.zeros((iters, len(kmers)))
+    np.add.at(samples, (np.repeat(np.arange(iters), picks.shape[1]), picks.ravel()), 1)
+
+    winners = np.argmax(samples @ rows, axis = 1)
+
+    lineage = lineages[best]
+    result  = [ ]
+
+    for level, taxon in enumerate(lineage):
+        confidence = int(round(np.mean(ids[winners, level] == ids[best, level]) * 100))
+
+        if confidence < cutoff:
+            break
+
+        result.append((taxon, confidence))
+
+    if not result:
+        return "unknown;"
+
+    # levels below the cutoff are named after the last level classified.
+    taxon, confidence = result[-1]
+    result += [("%s_unclassified" % taxon, confidence)] * (len(lineage) - len(result))
+
+    return "".join("%s(%s);" % x for x in result)
+
+def _classify_batch(records, index_dir = None, cutoff = 80, iters = 100):
+    index = _load_index(index_dir)
+    return [b"%s\t%s\n" % (name, classify_sequence(name, sequence, index, cutoff = cutoff,
+        iters = iters).encode()) for name, sequence in records]
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    return iter(lambda: list(itertools.islice(iterator, size)), [])
+
+def classify(fasta, index_dir, output, cutoff = 80, iters = 100, jobs = 1):
+    """
+    Classify every sequence of a FASTA file against a classifier index (see
+    ``build_index``), writing a mothur taxonomy file in the order of the FASTA
+    file. Batches are classified in parallel, every process memory-mapping
+    the same table.
+    """
+    total = 0
+
+    with parallel.pool(processes = max(1, int(jobs))) as pool, open(output, "wb") as f:
+        function_ = build_fn(_classify_batch, index_dir = index_dir, cutoff = cutoff, iters = iters)
+
+        for lines in pool.imap(function_, _batches(read_fasta(fasta), _BATCH_SIZE)):
+            f.writelines(lines)
+            total += len(lines)
+
+    logger.success("Classified %s sequences into %s." % (total, output))
+
+    return { "classified": total }
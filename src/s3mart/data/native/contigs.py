@@ -0,0 +1,185 @@
+import numpy as np
+
+from s3mart import __name__ as NAME
+
+from bpyutils import log
+
+logger = log.get_logger(name = NAME)
+
+_PHRED_OFFSET = 33
+
+_BASE_N       = ord("N")
+
+_COMPLEMENT   = np.arange(256, dtype = np.uint8)
+_COMPLEMENT[[ord(b) for b in "ACGTNacgtn"]] = [ord(b) for b in "TGCANTGCAN"]
+
+def _matrix(sequences, width):
+    return np.frombuffer(b"".join(sequences), dtype = np.uint8).reshape(-1, width)
+
+def _get_overlaps(n1, n2, min_length = None, max_length = None, min_overlap = 10):
+    """
+    Candidate overlap lengths (``n1 + n2`` less the contig length) for reads
+    of length ``n1`` and ``n2``, banded to the ones yielding a contig between
+    ``min_length`` and ``max_length``.
+
+    Overlaps beyond ``min(n1, n2)`` are the ones where the reads run through
+    an amplicon shorter than them, overhanging each other. Returns no
+    overlaps if none yield a contig within the band.
+    """
+    low, high = min_overlap, n1 + n2 - min_overlap
+
+    if max_length:
+        low  = max(low,  n1 + n2 - int(max_length))
+
+    if min_length:
+        high = min(high, n1 + n2 - int(min_length))
+
+    return np.arange(low, high + 1)
+
+def _get_columns(n1, n2, overlap):
+    """
+    Get the columns of the forward and reverse (complemented) reads where
+    they overlap, the reverse read starting at ``n1 - overlap`` of the
+    forward read.
+    """
+    offset = n1 - overlap
+    start, stop = max(0, offset), min(n1, offset + n2)
+
+    return slice(start, stop), slice(start - offset, stop - offset)
+
+def _best_overlaps(forward, reverse, overlaps):
+    """
+    Score every candidate (ungapped) overlap of the forward reads and reverse
+    complemented reverse reads, returning the best overlap for each pair.
+    """
+    n1, n2     = forward.shape[1], reverse.shape[1]
+
+    best_score = np.full(len(forward), np.iinfo(np.int64).min, dtype = np.int64)
+    best       = np.full(len(forward), overlaps[0] if len(overlaps) else 0, dtype = np.int64)
+
+    for overlap in overlaps:
+        columns_x, columns_y = _get_columns(n1, n2, overlap)
+
+        x      = forward[:, columns_x]
+        y      = reverse[:, columns_y]
+
+        valid  = (x != _BASE_N) & (y != _BASE_N)
+        equal  = x == y
+
+        score  = np.count_nonzero(equal & valid, axis = 1) - np.count_nonzero(~equal & valid, axis = 1)
+        better = score > best_score
+
+        best_score[better] = score[better]
+        best[better]       = overlap
+
+    return best
+
+def _consensus(x, y, qx, qy, deltaq = 6):
+    """
+    Build the consensus of an overlapping region as ``make.contigs`` does.
+    Agreeing bases keep the higher quality, an N defers to the other read and
+    mismatches take the base with the higher quality unless the qualities are
+    within ``deltaq`` of each other, in which case an N (quality 0) is called.
+    """
+    bases  = np.where(qy > qx, y, x)
+    quals  = np.maximum(qx, qy)
+
+    n_x    = x == _BASE_N
+    n_y    = y == _BASE_N
+
+    bases  = np.where(n_x, y, np.where(n_y, x, bases))
+    quals  = np.where(n_x, qy, np.where(n_y, qx, quals))
+
+    ambiguous = (x != y) & ~n_x & ~n_y & (np.abs(qx.astype(np.int16) - qy) < deltaq)
+
+    bases  = np.where(ambiguous, _BASE_N, bases).astype(np.uint8)
+    quals  = np.where(ambiguous, 0, quals).astype(np.uint8)
+
+    return bases, quals
+
+def _merge_uniform(forward, forward_q, reverse, reverse_q, deltaq = 6, **kwargs):
+    n1, n2    = forward.shape[1], reverse.shape[1]
+
+    contigs   = [None] * len(forward)
+    qualities = [None] * len(forward)
+
+    overlaps  = _get_overlaps(n1, n2, **kwargs)
+
+    if not len(overlaps):
+        logger.warn("No overlap of reads of length %s and %s yields a contig within %s-%s, dropping %s pairs." %
+            (n1, n2, kwargs.get("min_length"), kwargs.get("max_length"), len(forward)))
+        return contigs, qualities
+
+    # reverse complement the reverse reads, reversing their qualities.
+    reverse   = _COMPLEMENT[reverse[:, ::-1]]
+    reverse_q = reverse_q[:, ::-1]
+
+    best      = _best_overlaps(forward, reverse, overlaps)
+
+    for overlap in np.unique(best):
+        rows  = np.flatnonzero(best == overlap)
+
+        columns_x, columns_y = _get_columns(n1, n2, overlap)
+
+        bases, quals = _consensus(
+            forward[rows, columns_x], reverse[rows, columns_y],
+            forward_q[rows, columns_x], reverse_q[rows, columns_y],
+            deltaq = deltaq
+        )
+
+        # bases of either read running through the other's start (past the amplicon) are trimmed.
+        contig  = np.hstack([forward[rows, :columns_x.start],   bases, reverse[rows, columns_y.stop:]])
+        quality = np.hstack([forward_q[rows, :columns_x.start], quals, reverse_q[rows, columns_y.stop:]]) + _PHRED_OFFSET
+
+        width   = contig.shape[1]
+
+        contig  = contig.tobytes()
+        quality = quality.tobytes()
+
+        for i, row in enumerate(rows):
+            contigs[row]   = contig[i * width:(i + 1) * width]
+            qualities[row] = quality[i * width:(i + 1) * width]
+
+    return contigs, qualities
+
+def merge_pairs(forward, forward_q, reverse, reverse_q, deltaq = 6, min_length = None, max_length = None,
+    min_overlap = 10):
+    """
+    Merge a batch of read pairs into contigs, returning lists of contig
+    sequences and qualities (as bytes).
+
+    Pairs are aligned using a vectorised, ungapped scorer over the candidate
+    overlaps that yield a contig between ``min_length`` and ``max_length``
+    (or any overlap of at least ``min_overlap`` bases), including reads
+    running through an amplicon shorter than them. Pairs no overlap yields
+    such a contig for are dropped (as empty contigs). Pairs are processed
+    in blocks sharing the same read lengths.
+    """
+    lengths   = np.array([(len(a), len(b)) for a, b in zip(forward, reverse)], dtype = np.int64).reshape(-1, 2)
+
+    contigs   = [None] * len(forward)
+    qualities = [None] * len(forward)
+
+    for n1, n2 in np.unique(lengths, axis = 0):
+        rows = np.flatnonzero((lengths[:, 0] == n1) & (lengths[:, 1] == n2))
+
+        if not n1 or not n2:
+            continue
+
+        merged, merged_q = _merge_uniform(
+            _matrix([forward[i]   for i in rows], n1),
+            _matrix([forward_q[i] for i in rows], n1) - _PHRED_OFFSET,
+            _matrix([reverse[i]   for i in rows], n2),
+            _matrix([reverse_q[i] for i in rows], n2) - _PHRED_OFFSET,
+            deltaq = deltaq, min_length = min_length, max_length = max_length, min_overlap = min_overlap
+        )
+
+        for i, row in enumerate(rows):
+            contigs[row]   = merged[i]
+            qualities[row] = merged_q[i]
+
+    # keep empty reads as empty contigs, they're screened out later.
+    contigs   = [c if c is not None else b"" for c in contigs]
+    qualities = [q if q is not None else b"" for q in qualities]
+
+    return contigs, qualities
@@ -0,0 +1,245 @@
+import os, os.path as osp
+import zlib
+import heapq
+import itertools
+import collections
+
+from s3mart import __name__ as NAME
+
+from bpyutils.util.types   import build_fn
+from bpyutils.util.system  import makedirs, make_temp_dir
+from bpyutils import parallel, log
+
+from s3mart.data.fastq import open_fastq
+
+logger = log.get_logger(name = NAME)
+
+_BUFFER_SIZE = 1024 * 1024
+
+def read_fasta(path):
+    """
+    Stream records of a (optionally compressed, multi-line) FASTA file as
+    tuples of ``(name, sequence)`` bytes.
+    """
+    name, sequence = None, []
+
+    with open_fastq(path) as f:
+        for line in f:
+            line = line.rstrip()
+
+            if line.startswith(b">"):
+                if name is not None:
+                    yield name, b"".join(sequence)
+
+                name, sequence = line[1:].split()[0], []
+            elif line:
+                sequence.append(line)
+
+    if name is not None:
+        yield name, b"".join(sequence)
+
+def read_groups(path):
+    with open_fastq(path) as f:
+        for line in f:
+            name, group = line.split()
+            yield name, group
+
+def read_count_table(path):
+    """
+    Read a mothur count table (in either its full or compressed format),
+    returning its groups and a dict of counts per group for each sequence.
+    """
+    groups, index, counts = [ ], { }, collections.OrderedDict()
+
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip("\n")
+
+            if line.startswith("#Compressed"):
+                continue
+
+            if line.startswith("#"):
+                # the group indices of a compressed table.
+                for pair in line[1:].split("\t"):
+                    i, group = pair.split(",", 1)
+                    index[i] = group
+
+                continue
+
+            fields = line.split("\t")
+
+            if fields[0] == "Representative_Sequence":
+                groups = fields[2:]
+                continue
+
+            if index:
+                counts[fields[0]] = { index[i]: int(c) for i, c in (x.split(",") for x in fields[2:]) }
+            elif groups:
+                counts[fields[0]] = { group: int(c) for group, c in zip(groups, fields[2:]) }
+            else:
+                counts[fields[0]] = { }
+
+            counts[fields[0]]["_total"] = int(fields[1])
+
+    return groups, counts
+
+class _Buckets:
+    """
+    A set of on-disk buckets records are partitioned into.
+    """
+    def __init__(self, path, size, prefix):
+        self.paths = [osp.join(path, "%s-%s" % (prefix, i)) for i in range(size)]
+        self.files = [open(p, "wb", buffering = _BUFFER_SIZE) for p in self.paths]
+
+    def write(self, key, line):
+        self.files[zlib.crc32(key) % len(self.files)].write(line)
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+def _partition_lockstep(fasta, group, buckets):
+    """
+    Partition records by sequence assuming the group file lists names in the
+    same order as the FASTA file. Returns the groups seen, ``None`` if the
+    orders differ.
+    """
+    groups = set()
+
+    for i, (record, group_record) in enumerate(itertools.zip_longest(read_fasta(fasta), read_groups(group))):
+        if not record or not group_record or record[0] != group_record[0]:
+            return None
+
+        (name, sequence), (_, group_) = record, group_record
+
+        groups.add(group_)
+        buckets.write(sequence, b"%d\t%s\t%s\t%s\n" % (i, name, group_, sequence))
+
+    return groups
+
+def _join_bucket(path_fasta, path_group, buckets):
+    with open(path_group, "rb") as f:
+        names = dict(line.rstrip(b"\n").split(b"\t") for line in f)
+
+    with open(path_fasta, "rb") as f:
+        for line in f:
+            i, name, sequence = line.rstrip(b"\n").split(b"\t")
+            buckets.write(sequence, b"%s\t%s\t%s\t%s\n" % (i, name, names[name], sequence))
+
+def _partition_join(fasta, group, buckets, tmp_dir, size):
+    """
+    Partition records by sequence, joining names with their groups through a
+    first partitioning of both files by name.
+    """
+    by_name_fasta = _Buckets(tmp_dir, size, "fasta")
+    by_name_group = _Buckets(tmp_dir, size, "group")
+
+    groups = set()
+
+    for i, (name, sequence) in enumerate(read_fasta(fasta)):
+        by_name_fasta.write(name, b"%d\t%s\t%s\n" % (i, name, sequence))
+
+    for name, group_ in read_groups(group):
+        groups.add(group_)
+        by_name_group.write(name, b"%s\t%s\n" % (name, group_))
+
+    by_name_fasta.close()
+    by_name_group.close()
+
+    for path_fasta, path_group in zip(by_name_fasta.paths, by_name_group.paths):
+        _join_bucket(path_fasta, path_group, buckets)
+
+        os.remove(path_fasta)
+        os.remove(path_group)
+
+    return groups
+
+def _dereplicate_bucket(path, groups = None):
+    """
+    Dereplicate a bucket, writing each unique sequence (keyed on its first
+    occurrence) along with its counts per group, sorted by first occurrence.
+
+    Records needn't be in order (as when joined on disk), the first
+    occurrence being the one of least index.
+    """
+    index  = { group: i for i, group in enumerate(groups) }
+    unique = { }
+
+    with open(path, "rb") as f:
+        for line in f:
+            i, name, group, sequence = line.rstrip(b"\n").split(b"\t")
+            i = int(i)
+
+            if sequence not in unique:
+                unique[sequence] = [i, name, [0] * len(groups)]
+            elif i < unique[sequence][0]:
+                unique[sequence][:2] = i, name
+
+            unique[sequence][2][index[group]] += 1
+
+    target = "%s.unique" % path
+
+    with open(target, "wb") as f:
+        for sequence, (i, name, counts) in sorted(unique.items(), key = lambda x: x[1][0]):
+            f.write(b"%d\t%s\t%s\t%s\n" % (i, name, sequence, b"\t".join(b"%d" % c for c in counts)))
+
+    os.remove(path)
+
+    return target
+
+def _read_unique(path):
+    with open(path, "rb") as f:
+        for line in f:
+            i, rest = line.split(b"\t", 1)
+            yield int(i), rest
+
+def dereplicate(fasta, group, output_fasta, output_count, buckets = 256, jobs = 1):
+    """
+    Dereplicate a FASTA file with bounded memory, writing a mothur compatible
+    unique FASTA and count table (as ``unique.seqs`` and ``count.seqs`` do).
+
+    Records are hash-partitioned on their sequence into ``buckets`` on-disk
+    buckets, each dereplicated in parallel. Unique sequences are named after
+    their first occurrence and written in order of first occurrence.
+    """
+    makedirs(osp.dirname(osp.abspath(output_fasta)), exist_ok = True)
+
+    with make_temp_dir(root_dir = osp.dirname(osp.abspath(output_fasta))) as tmp_dir:
+        partitions = _Buckets(tmp_dir, buckets, "sequence")
+        groups     = _partition_lockstep(fasta, group, partitions)
+
+        if groups is None:
+            logger.warn("Names of %s and %s are not in the same order, joining them on disk." % (fasta, group))
+
+            partitions.close()
+            partitions = _Buckets(tmp_dir, buckets, "sequence")
+
+            groups = _partition_join(fasta, group, partitions, tmp_dir, buckets)
+
+        partitions.close()
+
+        groups = sorted(groups)
+
+        with parallel.pool(processes = max(1, min(int(jobs), buckets))) as pool:
+            function_ = build_fn(_dereplicate_bucket, groups = groups)
+            uniques   = pool.map(function_, partitions.paths)
+
+        reads   = 0
+        total   = 0
+
+        with open(output_fasta, "wb") as f_fasta, open(output_count, "wb") as f_count:
+            f_count.write(b"Representative_Sequence\ttotal\t%s\n" % b"\t".join(groups))
+
+            for _, rest in heapq.merge(*[_read_unique(path) for path in uniques], key = lambda x: x[0]):
+                name, sequence, counts = rest.rstrip(b"\n").split(b"\t", 2)
+                count = sum(int(c) for c in counts.split(b"\t"))
+
+                f_fasta.write(b">%s\n%s\n" % (name, sequence))
+                f_count.write(b"%s\t%d\t%s\n" % (name, count, counts))
+
+                reads += count
+                total += 1
+
+    logger.success("Dereplicated %s reads into %s unique sequences." % (reads, total))
+
+    return { "reads": reads, "unique": total }
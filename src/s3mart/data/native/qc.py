@@ -0,0 +1,231 @@
+import os, os.path as osp
+import json
+
+import numpy as np
+import tqdm as tq
+
+from s3mart import settings, __name__ as NAME
+
+from bpyutils.util.types   import build_fn
+from bpyutils.util.system  import makedirs, write
+from bpyutils import parallel, log
+
+from s3mart.data.budget import resource_budget
+from s3mart.data.fastq  import read_fastq_batches, fastq_prefix
+
+logger = log.get_logger(name = NAME)
+
+_PHRED_OFFSET   = 33
+_PHRED_MAX      = 94
+
+_SUFFIX_STATS   = "_s3mart_qc.json"
+
+_BASE_N         = ord("N")
+_BASE_G         = ord("G")
+_BASE_C         = ord("C")
+
+class QCStats:
+    """
+    Accumulates per-base quality distributions, length histograms, N content
+    and read counts over batches of reads.
+    """
+    def __init__(self):
+        self.reads    = 0
+        self.bases    = 0
+        self.gc       = 0
+
+        self.lengths  = np.zeros(1, dtype = np.int64)
+        self.quality  = np.zeros((1, _PHRED_MAX), dtype = np.int64)
+        self.n_counts = np.zeros(1, dtype = np.int64)
+
+        self.mean_quality = np.zeros(_PHRED_MAX, dtype = np.int64)
+
+    def _grow(self, size):
+        if size > len(self.n_counts):
+            pad = size - len(self.n_counts)
+
+            self.quality  = np.pad(self.quality,  ((0, pad), (0, 0)))
+            self.n_counts = np.pad(self.n_counts, (0, pad))
+
+        if size + 1 > len(self.lengths):
+            self.lengths  = np.pad(self.lengths,  (0, size + 1 - len(self.lengths)))
+
+    def update(self, sequences, qualities):
+        if not sequences:
+            return
+
+        lengths = np.fromiter((len(x) for x in sequences), dtype = np.int64, count = len(sequences))
+        width   = int(lengths.max())
+
+        self._grow(width)
+
+        bases   = np.frombuffer(b"".join(sequences), dtype = np.uint8)
+        quals   = np.frombuffer(b"".join(qualities), dtype = np.uint8).astype(np.int32)
+        quals  -= _PHRED_OFFSET
+        np.clip(quals, 0, _PHRED_MAX - 1, out = quals)
+
+        self.reads   += len(sequences)
+        self.bases   += len(bases)
+        self.gc      += int(np.count_nonzero(bases == _BASE_G) + np.count_nonzero(bases == _BASE_C))
+
+        self.lengths += np.bincount(lengths, minlength = len(self.lengths))
+
+        size    = len(self.n_counts)
+
+        if lengths.min() == width:
+            # fast path, reads of a batch usually share the same length.
+            bases = bases.reshape(-1, width)
+            quals = quals.reshape(-1, width)
+
+            index = quals + (np.arange(width, dtype = np.int32) * _PHRED_MAX)
+            means = quals.mean(axis = 1)
+
+            n_counts = np.count_nonzero(bases == _BASE_N, axis = 0)
+            n_counts = np.pad(n_counts, (0, size - width))
+        else:
+            positions = np.arange(len(bases), dtype = np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+            index = positions * _PHRED_MAX + quals
+
+            reads = np.repeat(np.arange(len(lengths)), lengths)
+            means = np.bincount(reads, weights = quals, minlength = len(lengths)) / np.maximum(lengths, 1)
+
+            n_counts = np.bincount(positions[bases == _BASE_N], minlength = size)
+
+        self.quality  += np.bincount(index.ravel(), minlength = size * _PHRED_MAX).reshape(size, _PHRED_MAX)
+        self.n_counts += n_counts
+
+        self.mean_quality += np.bincount(means.astype(np.int64), minlength = _PHRED_MAX)
+
+    def _percentiles(self, q):
+        cumulative = np.cumsum(self.quality, axis = 1)
+        totals     = cumulative[:, -1:]
+
+        return np.argmax(cumulative >= np.maximum(totals, 1) * q, axis = 1)
+
+    def to_dict(self):
+        covered  = self.quality.sum(axis = 1)
+        scores   = np.arange(_PHRED_MAX)
+
+        mean     = (self.quality * scores).sum(axis = 1) / np.maximum(covered, 1)
+
+        return {
+            "reads": self.reads,
+            "bases": self.bases,
+            "gc_percent": 100.0 * self.gc / max(self.bases, 1),
+            "length_histogram": { int(i): int(c) for i, c in enumerate(self.lengths) if c },
+            "mean_quality_histogram": { int(i): int(c) for i, c in enumerate(self.mean_quality) if c },
+            "per_base_quality": {
+                "mean":   mean.round(2).tolist(),
+                "p10":    self._percentiles(0.10).tolist(),
+                "p25":    self._percentiles(0.25).tolist(),
+                "median": self._percentiles(0.50).tolist(),
+                "p75":    self._percentiles(0.75).tolist(),
+                "p90":    self._percentiles(0.90).tolist(),
+            },
+            "per_base_n_percent": (100.0 * self.n_counts / np.maximum(covered, 1)).round(4).tolist(),
+        }
+
+def fastq_stats(path, batch_size = 100000):
+    """
+    Compute QC statistics for a (optionally compressed) FASTQ file in a single
+    streaming pass.
+    """
+    stats = QCStats()
+
+    for _, sequences, qualities in read_fastq_batches(path, batch_size = batch_size):
+        stats.update(sequences, qualities)
+
+    return stats.to_dict()
+
+def _native_qc_file(file_, output_dir = None):
+    target = osp.join(output_dir, "%s%s" % (fastq_prefix(file_), _SUFFIX_STATS))
+
+    if not osp.exists(target):
+        with resource_budget() as budget, budget.acquire(maximum = 1):
+            stats = fastq_stats(file_)
+            stats["file"] = file_
+
+        write(target, json.dumps(stats), force = True)
+    else:
+        logger.warn("Native QC for file %s already exists." % file_)
+
+    return target
+
+def _write_multiqc_summary(output_dir):
+    """
+    Aggregate every per-file report within ``output_dir`` into MultiQC custom
+    content files.
+    """
+    general = { }
+    quality = { }
+    lengths = { }
+
+    for fname in sorted(os.listdir(output_dir)):
+        if fname.endswith(_SUFFIX_STATS):
+            sample = fname[:-len(_SUFFIX_STATS)]
+
+            with open(osp.join(output_dir, fname)) as f:
+                stats = json.load(f)
+
+            per_base_n = stats["per_base_n_percent"]
+
+            general[sample] = {
+                "reads": stats["reads"],
+                "bases": stats["bases"],
+                "gc_percent": round(stats["gc_percent"], 2),
+                "mean_length": round(stats["bases"] / max(stats["reads"], 1), 2),
+                "max_n_percent": max(per_base_n) if per_base_n else 0,
+            }
+
+            quality[sample] = { i + 1: q for i, q in enumerate(stats["per_base_quality"]["mean"]) }
+            lengths[sample] = { int(k): v for k, v in stats["length_histogram"].items() }
+
+    sections = {
+        "general_stats": {
+            "id": "s3mart_qc_general_stats",
+            "plot_type": "generalstats",
+            "pconfig": [
+                { "reads":         { "title": "Reads",  "format": "{:,.0f}" } },
+                { "bases":         { "title": "Bases",  "format": "{:,.0f}", "hidden": True } },
+                { "gc_percent":    { "title": "% GC",   "suffix": "%" } },
+                { "mean_length":   { "title": "Length" } },
+                { "max_n_percent": { "title": "Max % N", "suffix": "%" } },
+            ],
+            "data": general
+        },
+        "per_base_quality": {
+            "id": "s3mart_qc_per_base_quality",
+            "section_name": "Per Base Sequence Quality",
+            "plot_type": "linegraph",
+            "pconfig": { "id": "s3mart_qc_per_base_quality_plot", "xlab": "Position (bp)", "ylab": "Mean Phred Score" },
+            "data": quality
+        },
+        "length_distribution": {
+            "id": "s3mart_qc_length_distribution",
+            "section_name": "Sequence Length Distribution",
+            "plot_type": "linegraph",
+            "pconfig": { "id": "s3mart_qc_length_distribution_plot", "xlab": "Length (bp)", "ylab": "Reads" },
+            "data": lengths
+        }
+    }
+
+    for name, section in sections.items():
+        write(osp.join(output_dir, "s3mart_qc_%s_mqc.json" % name), json.dumps(section), force = True)
+
+def native_qc(files, output_dir = None, jobs = None):
+    """
+    Run the native QC engine over a list of files in parallel and write a
+    MultiQC compatible summary to ``output_dir``.
+    """
+    output_dir = makedirs(output_dir or os.getcwd(), exist_ok = True)
+    jobs       = int(jobs or settings.get("jobs"))
+
+    if files:
+        with resource_budget(jobs), parallel.pool(processes = min(jobs, len(files))) as pool:
+            function_ = build_fn(_native_qc_file, output_dir = output_dir)
+            results   = pool.imap(function_, files)
+
+            list(tq.tqdm(results, total = len(files), desc = "Native QC"))
+
+    _write_multiqc_summary(output_dir)
@@ -0,0 +1,266 @@
+import os, os.path as osp
+import shutil
+
+import numpy as np
+
+from s3mart import __name__ as NAME
+
+from bpyutils.util.types   import build_fn
+from bpyutils.util.system  import makedirs, remove
+from bpyutils import parallel, log
+
+from s3mart.data.fastq  import read_fastq_batches, get_samples, sample_name
+from s3mart.data.native.contigs import merge_pairs
+
+logger = log.get_logger(name = NAME)
+
+_PHRED_OFFSET   = 33
+
+_SUMMARY_HEADER = "seqname\tstart\tend\tnbases\tambigs\tpolymer\tnumSeqs\n"
+
+_IUPAC = {
+    "A": "A", "C": "C", "G": "G", "T": "T", "U": "T",
+    "R": "AG", "Y": "CT", "S": "CG", "W": "AT", "K": "GT", "M": "AC",
+    "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG", "N": "ACGT"
+}
+
+_COMPLEMENT = str.maketrans("ACGTURYSWKMBDHVN", "TGCAAYRSWMKVHDBN")
+
+# a bitmask (A = 1, C = 2, G = 4, T = 8) for every byte, 0 for anything else.
+_BASE_MASK = np.zeros(256, dtype = np.uint8)
+
+for _base, _bases in _IUPAC.items():
+    _mask = sum(1 << "ACGT".index(b) for b in _bases)
+
+    _BASE_MASK[ord(_base)]         = _mask
+    _BASE_MASK[ord(_base.lower())] = _mask
+
+_UNAMBIGUOUS = np.zeros(256, dtype = bool)
+_UNAMBIGUOUS[[ord(b) for b in "ACGTacgt"]] = True
+
+def _primer_mask(primer):
+    return _BASE_MASK[np.frombuffer(primer.upper().encode(), dtype = np.uint8)]
+
+def reverse_complement(primer):
+    return primer.upper().translate(_COMPLEMENT)[::-1]
+
+def _pad(sequences, lengths, width):
+    """
+    Lay out a list of byte strings as the rows of a zero-padded 2-D array.
+    """
+    matrix  = np.zeros((len(sequences), max(width, 1)), dtype = np.uint8)
+
+    flat    = np.frombuffer(b"".join(sequences), dtype = np.uint8)
+    rows    = np.repeat(np.arange(len(sequences)), lengths)
+    columns = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    matrix[rows, columns] = flat
+
+    return matrix
+
+def _strip_forward(sequences, lengths, primer, pdiffs):
+    """
+    Match a (IUPAC) forward primer at the start of every read, allowing up to
+    ``pdiffs`` mismatches.
+    """
+    size    = len(primer)
+    mask    = _primer_mask(primer)
+
+    heads   = _pad([s[:size] for s in sequences], np.minimum(lengths, size), size)
+    matches = np.count_nonzero(_BASE_MASK[heads] & mask, axis = 1)
+
+    return (lengths >= size) & (size - matches <= pdiffs)
+
+def _strip_reverse(sequences, lengths, primer, start):
+    """
+    Find the first exact (IUPAC) occurrence of the reverse complement of the
+    reverse primer after ``start``, returning whether it was found and where.
+    """
+    mask    = _primer_mask(reverse_complement(primer))
+    size    = len(mask)
+
+    width   = int(lengths.max())
+    windows = width - size + 1
+
+    if windows <= 0:
+        return np.zeros(len(sequences), dtype = bool), lengths
+
+    reads   = _BASE_MASK[_pad(sequences, lengths, width)]
+    found   = np.ones((len(sequences), windows), dtype = bool)
+
+    for i, m in enumerate(mask):
+        found &= (reads[:, i:i + windows] & m) != 0
+
+    found[np.arange(windows)[None, :] < start[:, None]] = False
+
+    return found.any(axis = 1), found.argmax(axis = 1)
+
+def _longest_homopolymer(flat, lengths):
+    if not len(flat):
+        return np.zeros(len(lengths), dtype = np.int64)
+
+    offsets = np.cumsum(lengths) - lengths
+
+    change  = np.ones(len(flat), dtype = bool)
+    change[1:] = flat[1:] != flat[:-1]
+    change[offsets[lengths > 0]] = True
+
+    starts  = np.flatnonzero(change)
+    runs    = np.diff(np.append(starts, len(flat)))
+
+    rows    = np.repeat(np.arange(len(lengths)), lengths)[starts]
+    longest = np.zeros(len(lengths), dtype = np.int64)
+
+    np.maximum.at(longest, rows, runs)
+
+    return longest
+
+def screen_batch(sequences, qualities, min_length = 0, max_length = None, maxambig = None,
+    maxhomop = None, qaverage = None, primer_f = None, primer_r = None, pdiffs = 0):
+    """
+    Apply mothur's ``trim.seqs`` (primers, ``qaverage``) and ``screen.seqs``
+    filters to a batch of reads.
+
+    Returns the trimmed sequences of the reads that pass along with their
+    indices, number of ambiguous bases and longest homopolymer.
+    """
+    lengths = np.fromiter((len(s) for s in sequences), dtype = np.int64, count = len(sequences))
+
+    keep    = np.ones(len(sequences), dtype = bool)
+    start   = np.zeros(len(sequences), dtype = np.int64)
+    end     = lengths.copy()
+
+    if primer_f:
+        keep  &= _strip_forward(sequences, lengths, primer_f, pdiffs)
+        start[:] = len(primer_f)
+
+    if primer_r and len(sequences):
+        found, position = _strip_reverse(sequences, lengths, primer_r, start)
+
+        keep  &= found
+        end    = np.where(found, position, end)
+
+    index     = np.flatnonzero(keep & (end > start))
+
+    trimmed   = [sequences[i][start[i]:end[i]] for i in index]
+    lengths   = end[index] - start[index]
+
+    flat      = np.frombuffer(b"".join(trimmed), dtype = np.uint8)
+    rows      = np.repeat(np.arange(len(index)), lengths)
+
+    ambigs    = np.bincount(rows[~_UNAMBIGUOUS[flat]], minlength = len(index))
+    polymers  = _longest_homopolymer(flat, lengths)
+
+    keep      = lengths >= int(min_length or 0)
+
+    if max_length:
+        keep &= lengths <= int(max_length)
+
+    if maxambig is not None:
+        keep &= ambigs <= int(maxambig)
+
+    if maxhomop is not None:
+        keep &= polymers <= int(maxhomop)
+
+    if qaverage:
+        quals = np.frombuffer(b"".join(qualities[i][start[i]:end[i]] for i in index), dtype = np.uint8)
+        sums  = np.bincount(rows, weights = quals.astype(np.float64) - _PHRED_OFFSET, minlength = len(index))
+
+        keep &= sums / np.maximum(lengths, 1) >= float(qaverage)
+
+    passed    = np.flatnonzero(keep)
+
+    return [trimmed[i] for i in passed], index[passed], ambigs[passed], polymers[passed]
+
+def _read_batches(files, **kwargs):
+    """
+    Stream batches of reads of a sample, merging pairs into contigs.
+    """
+    if len(files) == 1:
+        for batch in read_fastq_batches(files[0]):
+            yield batch
+    else:
+        for (names, forward, forward_q), (_, reverse, reverse_q) in \
+            zip(read_fastq_batches(files[0]), read_fastq_batches(files[1])):
+            contigs, qualities = merge_pairs(forward, forward_q, reverse, reverse_q, **kwargs)
+
+            yield names, contigs, qualities
+
+def _screen_file(args, target_dir = None, deltaq = 6, **kwargs):
+    i, files = args
+
+    group    = sample_name(files)
+    prefix   = osp.join(target_dir, "part-%s" % i)
+
+    stats    = { "reads": 0, "passed": 0 }
+
+    batches  = _read_batches(files, deltaq = deltaq,
+        min_length = kwargs.get("min_length"), max_length = kwargs.get("max_length"))
+
+    with open("%s.fasta" % prefix, "w") as fasta, \
+        open("%s.group" % prefix, "w") as groups, \
+        open("%s.summary" % prefix, "w") as summary:
+        if not i:
+            summary.write(_SUMMARY_HEADER)
+
+        for names, sequences, qualities in batches:
+            trimmed, index, ambigs, polymers = screen_batch(sequences, qualities, **kwargs)
+
+            names  = [names[j].split()[0].decode().replace(":", "_") for j in index]
+
+            fasta.write("".join(">%s\n%s\n" % (name, seq.decode()) for name, seq in zip(names, trimmed)))
+            groups.write("".join("%s\t%s\n" % (name, group) for name in names))
+            summary.write("".join("%s\t1\t%s\t%s\t%s\t%s\t1\n" % (name, len(seq), len(seq), a, p)
+                for name, seq, a, p in zip(names, trimmed, ambigs, polymers)))
+
+            stats["reads"]  += len(sequences)
+            stats["passed"] += len(trimmed)
+
+    return prefix, stats
+
+def _concatenate(sources, target):
+    if len(sources) == 1:
+        os.replace(sources[0], target)
+    else:
+        with open(target, "wb") as dst:
+            for source in sources:
+                with open(source, "rb") as src:
+                    shutil.copyfileobj(src, dst)
+
+def screen_fastq(files, target_path, jobs = 1, paired = False, **kwargs):
+    """
+    Trim and screen FASTQ files in a single streaming pass per sample, writing
+    mothur compatible ``fasta``, ``group`` and ``summary`` files to
+    ``target_path``. Reads are grouped by their sample name.
+
+    With ``paired``, mates are merged into contigs (see ``merge_pairs``)
+    before being screened. Files without a mate are skipped.
+    """
+    target_dir = makedirs(osp.dirname(target_path["fasta"]), exist_ok = True)
+    parts_dir  = makedirs(osp.join(target_dir, ".parts"), exist_ok = True)
+
+    samples    = get_samples(files, paired = paired)
+
+    if paired:
+        orphans = [sample[0] for sample in samples if len(sample) != 2]
+
+        if orphans:
+            logger.warn("Skipping FASTQ file(s) without a mate: %s" % orphans)
+
+        samples = [sample for sample in samples if len(sample) == 2]
+
+    files      = list(enumerate(samples))
+
+    with parallel.pool(processes = max(1, min(int(jobs), len(files)))) as pool:
+        function_ = build_fn(_screen_file, target_dir = parts_dir, **kwargs)
+        results   = pool.map(function_, files)
+
+    for type_ in ("fasta", "group", "summary"):
+        _concatenate(["%s.%s" % (prefix, type_) for prefix, _ in results], target_path[type_])
+
+    remove(parts_dir, recursive = True)
+
+    return {
+        "reads":  sum(stats["reads"]  for _, stats in results),
+        "passed": sum(stats["passed"] for _, stats in results)
+    }
@@ -0,0 +1,173 @@
+import numpy as np
+
+from s3mart import __name__ as NAME
+
+from bpyutils import log
+
+from s3mart.data.native.derep import read_fasta, read_count_table
+
+logger = log.get_logger(name = NAME)
+
+_BLOCK_SIZE = 512
+
+# elements compared at once when counting runs of gaps.
+_CHUNK_SIZE = 1 << 24
+
+_GAP   = ord("-")
+_DOT   = ord(".")
+_GAPS  = np.frombuffer(b"-.", dtype = np.uint8)
+
+def read_list(path, label = None):
+    """
+    Read the OTUs (along with the names of their sequences) of a mothur list
+    file at a ``label``, the first label if none is given.
+    """
+    with open(path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+
+            if label is None or fields[0] == str(label):
+                return { otu: names.split(",") for otu, names in zip(header[2:], fields[2:]) }
+
+    raise ValueError("Label %s not found within list file %s." % (label, path))
+
+def get_otu_representatives(list_file, count_table, label = None):
+    """
+    Pick the most abundant sequence of each OTU as its representative (as
+    ``get.oturep(method=abundance)`` does), returning a dict of OTUs and their
+    representatives.
+    """
+    _, counts = read_count_table(count_table)
+    otus      = read_list(list_file, label = label)
+
+    return { otu: max(names, key = lambda name: counts.get(name, { "_total": 0 })["_total"])
+        for otu, names in otus.items() }
+
+def get_profile(matrix):
+    """
+    Get the indicators ``distances`` compares a matrix of aligned sequences
+    (one per row) with: its gaps, its bases (along with a prefix sum of them)
+    and each of its characters.
+
+    Only the span of a sequence between its terminal ``.`` is profiled, as
+    mothur assumes terminal gaps are ``.`` (and interior ones ``-``).
+    """
+    matrix  = np.asarray(matrix, dtype = np.uint8)
+    columns = np.arange(matrix.shape[1])
+
+    dots    = matrix == _DOT
+    any_    = ~dots.all(axis = 1)
+    lo      = np.argmax(~dots, axis = 1)
+    hi      = matrix.shape[1] - np.argmax(~dots[:, ::-1], axis = 1)
+
+    span    = (columns >= lo[:, None]) & (columns < hi[:, None]) & any_[:, None]
+    matrix  = np.where(span, matrix, 0)
+
+    gaps    = matrix == _GAP
+    bases   = span & ~gaps
+
+    # the smallest type counting every column, halving what's gathered.
+    dtype   = np.uint16 if matrix.shape[1] < np.iinfo(np.uint16).max else np.int32
+
+    return {
+        "gaps":   gaps,
+        "bases":  bases.astype(np.float32),
+        # by column, each column gathered as a contiguous row.
+        "prefix": np.ascontiguousarray(np.pad(np.cumsum(bases, axis = 1, dtype = dtype), ((0, 0), (1, 0))).T),
+        "chars":  { c: (matrix == c).astype(np.float32) for c in np.unique(matrix[bases]) }
+    }
+
+def take_profile(profile, rows):
+    """
+    Get the profile (see ``get_profile``) of a subset of rows.
+    """
+    return {
+        "gaps":   profile["gaps"][rows],
+        "bases":  profile["bases"][rows],
+        "prefix": profile["prefix"][:, rows],
+        "chars":  { c: m[rows] for c, m in profile["chars"].items() }
+    }
+
+def _gap_opens(gaps, prefix):
+    """
+    Count, for each pair of a row of ``gaps`` and a column of ``prefix``, the runs
+    of gaps of the former spanning any base of the latter. Runs spanning only
+    gaps of the latter are skipped entirely, as are columns gapped in both.
+    """
+    opens = np.zeros((gaps.shape[0], prefix.shape[1]), dtype = np.float32)
+
+    rows, starts = np.nonzero(gaps & ~np.pad(gaps, ((0, 0), (1, 0)))[:, :-1])
+    _,    ends   = np.nonzero(gaps & ~np.pad(gaps, ((0, 0), (0, 1)))[:, 1:])
+
+    size   = max(1, _CHUNK_SIZE // max(1, prefix.shape[1]))
+
+    for start in range(0, len(rows), size):
+        stop    = start + size
+
+        spanned = prefix[ends[start:stop] + 1] > prefix[starts[start:stop]]
+        unique, index = np.unique(rows[start:stop], return_index = True)
+
+        opens[unique] += np.add.reduceat(spanned.view(np.uint8), index, axis = 0, dtype = np.int32)
+
+    return opens
+
+def distances(x, y):
+    """
+    Pairwise distances between the rows of two profiles (see ``get_profile``)
+    of aligned sequences as ``dist.seqs(calc=onegap)`` computes them.
+
+    Columns are compared where neither sequence has a terminal ``.``. A
+    mismatch counts a single difference, as does a run of gaps in one
+    sequence against bases in the other (a run continues across columns
+    gapped in both, which are ignored). The distance is the fraction of
+    differences over the bases and runs of gaps compared.
+    """
+    both     = x["bases"] @ y["bases"].T
+    matches  = sum(x["chars"][c] @ y["chars"][c].T for c in set(x["chars"]) & set(y["chars"]))
+    opens    = _gap_opens(x["gaps"], y["prefix"]) + _gap_opens(y["gaps"], x["prefix"]).T
+
+    compared = both + opens
+
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        return np.where(compared > 0, (both - matches + opens) / compared, 1.0)
+
+def write_distances(fasta, names, output, block_size = _BLOCK_SIZE):
+    """
+    Write the lower-triangular PHYLIP distance matrix (as ``dist.seqs(output=lt)``
+    does) of the sequences ``names`` of an aligned FASTA file, computed in
+    blocks of ``block_size`` rows.
+    """
+    wanted    = set(name.encode() for name in names)
+    records   = [(name, sequence) for name, sequence in read_fasta(fasta) if name in wanted]
+
+    if not records:
+        raise ValueError("None of the sequences found within %s." % fasta)
+
+    matrix    = np.frombuffer(b"".join(sequence.upper() for _, sequence in records),
+        dtype = np.uint8).reshape(len(records), -1)
+
+    # columns gapped within every sequence don't contribute to any distance.
+    matrix    = matrix[:, ~np.isin(matrix, _GAPS).all(axis = 0)]
+
+    profile   = get_profile(matrix)
+
+    with open(output, "w") as f:
+        f.write("%s\n" % len(records))
+
+        for start in range(0, len(records), block_size):
+            stop      = min(start + block_size, len(records))
+            block     = distances(take_profile(profile, slice(start, stop)), take_profile(profile, slice(0, stop)))
+
+            for i in range(start, stop):
+                name = records[i][0].decode()
+
+                if i:
+                    f.write("%s\t%s\n" % (name, "\t".join("%.6f" % d for d in block[i - start, :i])))
+                else:
+                    f.write("%s\n" % name)
+
+    logger.success("Wrote distances between %s sequences to %s." % (len(records), output))
+
+    return output
@@ -0,0 +1,60 @@
+import os.path as osp
+
+from s3mart import settings, __name__ as NAME
+
+from bpyutils.util.types   import build_fn
+from bpyutils.util.system  import makedirs, popen
+from bpyutils import parallel, log
+
+from s3mart.data.budget import resource_budget
+from s3mart.data.fastq  import fastq_prefix, get_samples
+from s3mart.data.native.screen import reverse_complement
+
+logger = log.get_logger(name = NAME)
+
+def _cutadapt_sample(files, output_dir = None, primer_f = None, primer_r = None,
+    pdiffs = 0, jobs = None):
+    outputs = [osp.join(output_dir, "%s.fastq.gz" % fastq_prefix(f)) for f in files]
+
+    if len(files) == 2:
+        # a pair is discarded unless both of its reads have a primer.
+        adapters = "-g ^{primer_f} -G ^{primer_r} --pair-filter=any"
+        output   = "-o {} -p {}".format(*outputs)
+    else:
+        # the 3' primer of a linked adapter is optional (cutadapt >= 3.0) unless required.
+        adapters = "-a '^{primer_f}...{primer_r};required'"
+        output   = "-o {}".format(*outputs)
+
+    adapters = adapters.format(primer_f = primer_f,
+        primer_r = reverse_complement(primer_r) if len(files) == 1 else primer_r)
+
+    with resource_budget(jobs) as budget, budget.acquire(maximum = jobs) as cores:
+        popen("cutadapt --cores {cores} -e {pdiffs} -Z --discard-untrimmed --quiet {adapters} {output} {files}".format(
+            cores = cores, pdiffs = pdiffs, adapters = adapters, output = output, files = " ".join(files)))
+
+    return outputs
+
+def trim_primers(files, output_dir, primer_f, primer_r, paired = False, jobs = None, pdiffs = None):
+    """
+    Remove primers from each sample using cutadapt, allowing up to ``pdiffs``
+    errors per primer. Reads without primers are discarded (as ``trim.seqs``
+    does with an oligos file) and the trimmed reads are written gzipped to
+    ``output_dir``.
+    """
+    jobs       = int(jobs or settings.get("jobs"))
+    pdiffs     = settings.get("primer_difference") if pdiffs is None else pdiffs
+
+    output_dir = makedirs(output_dir, exist_ok = True)
+    samples    = get_samples(files, paired = paired)
+
+    logger.info("Trimming primers from %s samples using cutadapt..." % len(samples))
+
+    # each sample gets an even share of the budget, cutadapt scales per core.
+    share      = max(1, jobs // max(1, len(samples)))
+
+    with parallel.pool(processes = max(1, min(jobs, len(samples)))) as pool:
+        function_ = build_fn(_cutadapt_sample, output_dir = output_dir,
+            primer_f = primer_f, primer_r = primer_r, pdiffs = pdiffs, jobs = share)
+        results   = pool.map(function_, samples)
+
+    return sorted(output for outputs in results for output in outputs)
@@ -0,0 +1,218 @@
+import os, os.path as osp
+import json
+import time
+
+from s3mart.config import PATH
+from s3mart import settings, __name__ as NAME
+
+from bpyutils.util.system import makedirs, remove
+from bpyutils._compat import iteritems, itervalues
+from bpyutils import log
+
+from s3mart.data.util import file_lock, checksum, link_file
+
+logger = log.get_logger(name = NAME)
+
+CACHE  = PATH["CACHE"]
+
+class SRACache:
+    """
+    A shared, content-addressed store of SRA and FASTQ files.
+
+    Files are stored once under ``objects/<checksum>`` and an index maps each
+    SRA accession to its files (relative to the SRA directory) and checksums.
+    Data directories link into the store instead of holding copies. Once the
+    store exceeds its byte budget, the least recently used accessions are
+    evicted.
+
+    Objects are verified against their checksum when stored and, once
+    modified since, when restored. A hard link shares its inode with the data
+    directory it was linked from, so writing to either in place changes both
+    (objects aren't made read-only, leaving the data directory's files
+    writable) and the entry is discarded on its next restore. For the same
+    reason, evicting an object only frees its space once no data directory
+    links to it anymore.
+    """
+    def __init__(self, location = None, size = None):
+        self.location = location or osp.join(CACHE, "sra")
+        self.size     = int(size if size is not None else settings.get("sra_cache_size"))
+
+        self.objects  = osp.join(self.location, "objects")
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _path(self, name):
+        return osp.join(self.location, name)
+
+    def _read_index(self):
+        path  = self._path("index.json")
+        index = { }
+
+        if osp.exists(path):
+            with open(path) as f:
+                index = json.load(f)
+
+        return index
+
+    def _write_index(self, index):
+        path = self._path("index.json")
+        temp = "%s.%s" % (path, os.getpid())
+
+        with open(temp, "w") as f:
+            json.dump(index, f)
+
+        os.replace(temp, path)
+
+    def _object(self, digest):
+        return osp.join(self.objects, digest)
+
+    def _verify(self, meta):
+        """
+        Check that the object of a file is intact, rehashing it only if it has
+        been modified since it was stored.
+        """
+        object_ = self._object(meta["checksum"])
+
+        if not osp.exists(object_):
+            return False
+
+        stat = os.stat(object_)
+
+        if stat.st_size != meta["size"]:
+            return False
+
+        if stat.st_mtime_ns == meta.get("mtime"):
+            return True
+
+        return checksum(object_) == meta["checksum"]
+
+    def _store(self, path, digest):
+        """
+        Link a file into the store as the object of ``digest`` (unless
+        present), verifying the object against it.
+        """
+        object_ = self._object(digest)
+
+        if not osp.exists(object_):
+            temp = "%s.%s" % (object_, os.getpid())
+
+            link_file(path, temp)
+
+            if checksum(temp) != digest:
+                remove(temp)
+                return None
+
+            os.replace(temp, object_)
+
+        stat = os.stat(object_)
+
+        return { "checksum": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns }
+
+    def get(self, accession, target_dir):
+        """
+        Link cached files for an accession into ``target_dir``. Returns the
+        list of linked paths, empty if the accession isn't cached.
+        """
+        if not self.enabled:
+            return []
+
+        with file_lock(self._path(".lock")):
+            index = self._read_index()
+            entry = index.get(accession)
+
+            if not entry:
+                return []
+
+            files = entry["files"]
+
+            for relpath, meta in iteritems(files):
+                if not self._verify(meta):
+                    logger.warn("Cache entry for %s is corrupt, discarding." % accession)
+                    index.pop(accession)
+                    self._write_index(index)
+
+                    return []
+
+            paths = []
+
+            for relpath, meta in iteritems(files):
+                target = osp.join(target_dir, relpath)
+
+                if not osp.exists(target):
+                    link_file(self._object(meta["checksum"]), target)
+
+                paths.append(target)
+
+            entry["accessed"] = time.time()
+            self._write_index(index)
+
+        logger.info("Restored %s file(s) for SRA %s from cache." % (len(paths), accession))
+
+        return paths
+
+    def put(self, accession, source_dir, files):
+        """
+        Add files (within ``source_dir``) of an accession to the cache and
+        evict least recently used accessions beyond the byte budget.
+        """
+        if not self.enabled:
+            return
+
+        makedirs(self.objects, exist_ok = True)
+
+        digests = [(path, checksum(path)) for path in files]
+        entries = { }
+
+        # objects are linked under the lock, never racing another study's eviction.
+        with file_lock(self._path(".lock")):
+            for path, digest in digests:
+                meta = self._store(path, digest)
+
+                if not meta:
+                    logger.warn("File %s of SRA %s changed while being cached, not caching." % (path, accession))
+                    return
+
+                entries[osp.relpath(path, source_dir)] = meta
+
+            index = self._read_index()
+            index[accession] = { "files": entries, "accessed": time.time() }
+
+            self._evict(index, keep = accession)
+            self._write_index(index)
+
+        logger.info("Cached %s file(s) for SRA %s." % (len(entries), accession))
+
+    def _evict(self, index, keep = None):
+        sizes = { }
+
+        for entry in itervalues(index):
+            for meta in itervalues(entry["files"]):
+                sizes[meta["checksum"]] = meta["size"]
+
+        total = sum(itervalues(sizes))
+
+        for accession in sorted(index, key = lambda x: index[x]["accessed"]):
+            if total <= self.size:
+                break
+
+            if accession == keep:
+                continue
+
+            entry = index.pop(accession)
+            used  = set(meta["checksum"] for e in itervalues(index) for meta in itervalues(e["files"]))
+
+            for meta in itervalues(entry["files"]):
+                digest = meta["checksum"]
+
+                if digest not in used and digest in sizes:
+                    object_ = self._object(digest)
+
+                    if osp.exists(object_) and os.stat(object_).st_nlink > 1:
+                        logger.info("Object %s of SRA %s is still linked from a data directory." % (digest, accession))
+
+                    remove(object_, raise_err = False)
+                    total -= sizes.pop(digest)
+
+            logger.info("Evicted SRA %s from cache." % accession)
@@ -1,17 +1,203 @@
-import os.path as osp
+import os, os.path as osp
+import fcntl
+import hashlib
+import shutil
+import contextlib
+import subprocess as sp
 
 from jinja2 import Template
 
 from bpyutils import log
-from bpyutils.util.system  import read, extract_all, write
+from bpyutils.util.system  import read, extract_all, write, makedirs, make_temp_dir, remove
 from bpyutils.util.request import download_file
+from bpyutils.exception import PopenError
 
 from s3mart.config import PATH
 from s3mart.const  import CONST
 from s3mart import __name__ as NAME, settings
+from s3mart.data.mothur import run_mothur
 
 logger = log.get_logger(name = NAME)
 
+_FICLONE = 0x40049409
+_CHUNK_SIZE = 1024 * 1024
+
+@contextlib.contextmanager
+def file_lock(path):
+    makedirs(osp.dirname(path), exist_ok = True)
+
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def checksum(path, algorithm = "md5"):
+    hash_ = hashlib.new(algorithm)
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            hash_.update(chunk)
+
+    return hash_.hexdigest()
+
+def _reflink(source, target):
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+def link_file(source, target, symlink = False):
+    """
+    Link a file to a target path without copying its contents where possible.
+
+    Attempts a hard link, then a reflink (FICLONE) and optionally a symbolic
+    link before falling back to a copy. Returns the method used.
+    """
+    makedirs(osp.dirname(osp.abspath(target)), exist_ok = True)
+
+    # unlinked rather than removed, a symbolic link's source is left alone.
+    if osp.lexists(target):
+        os.unlink(target)
+
+    try:
+        os.link(source, target)
+        return "hardlink"
+    except OSError:
+        pass
+
+    try:
+        _reflink(source, target)
+        return "reflink"
+    except (OSError, IOError):
+        if osp.lexists(target):
+            os.unlink(target)
+
+    if symlink:
+        os.symlink(osp.abspath(source), target)
+        return "symlink"
+
+    shutil.copy2(source, target)
+
+    return "copy"
+
+def stage_files(*files, **kwargs):
+    """
+    Stage files into a directory by linking them (see ``link_file``), copying
+    only when the source can't be linked.
+
+    Returns a dict of counts per method used along with the number of bytes
+    that didn't need to be copied.
+    """
+    dest    = kwargs["dest"]
+    symlink = kwargs.get("symlink", True)
+
+    stats   = { "bytes_avoided": 0 }
+    paths   = [ ]
+
+    for f in files:
+        target = osp.join(dest, osp.basename(f))
+        method = link_file(f, target, symlink = symlink)
+
+        stats[method] = stats.get(method, 0) + 1
+
+        if method != "copy":
+            stats["bytes_avoided"] += osp.getsize(f)
+
+        paths.append(target)
+
+    logger.info("Staged %s file(s) into %s (%s), avoided copying %s bytes." %
+        (len(files), dest, ", ".join("%s: %s" % (k, v) for k, v in stats.items() if k != "bytes_avoided"),
+            stats["bytes_avoided"]))
+
+    stats["paths"] = paths
+
+    return stats
+
+def _stream_file(source, fd):
+    """
+    Stream a file into an open file descriptor without copying through user
+    space, using ``copy_file_range`` (regular files) or ``sendfile`` (pipes)
+    and falling back to a buffered copy.
+    """
+    with open(source, "rb") as src:
+        size   = os.fstat(src.fileno()).st_size
+        copied = 0
+
+        for method in ("copy_file_range", "sendfile"):
+            if copied >= size or not hasattr(os, method):
+                continue
+
+            try:
+                while copied < size:
+                    if method == "copy_file_range":
+                        n = os.copy_file_range(src.fileno(), fd, size - copied, copied)
+                    else:
+                        n = os.sendfile(fd, src.fileno(), copied, size - copied)
+
+                    if not n:
+                        break
+
+                    copied += n
+            except OSError:
+                pass
+
+        src.seek(copied)
+
+        for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+            while chunk:
+                chunk   = chunk[os.write(fd, chunk):]
+
+        newline = not size or os.pread(src.fileno(), 1, size - 1) == b"\n"
+
+    return size, newline
+
+_COMPRESSORS = {
+    "gzip": lambda threads: ["pigz", "-c", "-p", str(threads)] if shutil.which("pigz") else ["gzip", "-c"],
+    "zstd": lambda threads: ["zstd", "-q", "-c", "-T%s" % threads]
+}
+
+def concatenate_files(sources, target, compression = None, threads = 1):
+    """
+    Concatenate files (in order) into a target, optionally piping through a
+    (multi-threaded) compressor. Files missing a trailing newline have one
+    appended so that records never run into each other. The target is
+    written to a temporary file and atomically renamed once complete.
+
+    Returns the number of bytes read from the sources.
+    """
+    temp  = "%s.%s.tmp" % (target, os.getpid())
+    total = 0
+
+    try:
+        with open(temp, "wb") as f:
+            proc = None
+            fd   = f.fileno()
+
+            if compression:
+                proc = sp.Popen(_COMPRESSORS[compression](threads), stdin = sp.PIPE, stdout = f)
+                fd   = proc.stdin.fileno()
+
+            for source in sources:
+                size, newline = _stream_file(source, fd)
+                total += size
+
+                if not newline:
+                    os.write(fd, b"\n")
+
+            if proc:
+                proc.stdin.close()
+
+                if proc.wait():
+                    raise PopenError(proc.returncode, " ".join(proc.args))
+
+        os.replace(temp, target)
+    finally:
+        if osp.exists(temp):
+            remove(temp)
+
+    return total
+
 def render_template(*args, **kwargs):
     script = kwargs["template"]
 
@@ -31,7 +217,7 @@ def build_mothur_script(*args, **kwargs):
     mothur_script = render_template(*args, **kwargs)
     write(output, mothur_script)
 
-def install_silva():
+def install_silva(pcr = False, jobs = None):
     silva_version = str(settings.get("silva_version"))
     silva_version_str = "v%s" % silva_version.replace(".", "_")
 
@@ -62,4 +248,95 @@ def install_silva():
 
     logger.success("SILVA successfully downloaded at %s." % silva_paths)
 
-    return silva_paths
\ No newline at end of file
+    if pcr:
+        silva_paths["pcr"] = install_silva_pcr(silva_paths,
+            start = settings.get("silva_pcr_start"), end = settings.get("silva_pcr_end"), jobs = jobs)
+
+    return silva_paths
+
+def _write_probe(reference, target):
+    """
+    Write the first sequence of an alignment (without gaps) as a FASTA file.
+    """
+    lines = []
+
+    with open(reference) as f:
+        for line in f:
+            if line.startswith(">") and lines:
+                break
+
+            lines.append(line.strip())
+
+    write(target, "%s\n%s\n" % (lines[0].split()[0], "".join(lines[1:]).replace(".", "").replace("-", "")),
+        force = True)
+
+def install_silva_pcr(silva_paths, start = None, end = None, jobs = None):
+    """
+    Build (once) the PCR-trimmed SILVA seed alignment along with the k-mer
+    search and classifier databases mothur builds on its first use, cached
+    under a directory keyed on the SILVA version and PCR region.
+
+    Returns the path to the PCR-trimmed alignment, ``None`` if it couldn't be
+    built. The rest of the cached databases sit next to it.
+    """
+    from s3mart.data.budget import resource_budget
+
+    seed, taxonomy = silva_paths["seed"], silva_paths["taxonomy"]
+
+    seed_root      = osp.splitext(osp.basename(seed))[0]
+    version        = seed_root.split("_", 1)[-1]
+
+    path_target    = osp.join(PATH["CACHE"], "silva", "pcr", "%s-%s-%s" % (version, start, end))
+    path_pcr       = osp.join(path_target, "%s.pcr.align" % seed_root)
+
+    with file_lock("%s.lock" % path_target):
+        if osp.exists(path_pcr):
+            logger.info("Using cached PCR-trimmed SILVA at %s." % path_pcr)
+            return path_pcr
+
+        logger.info("Building PCR-trimmed SILVA (start: %s, end: %s)..." % (start, end))
+
+        with make_temp_dir(root_dir = PATH["CACHE"]) as tmp_dir, \
+            resource_budget(jobs) as budget, budget.acquire(maximum = jobs) as processors:
+            link_file(seed, osp.join(tmp_dir, osp.basename(seed)))
+            link_file(taxonomy, osp.join(tmp_dir, osp.basename(taxonomy)))
+
+            probe = osp.join(tmp_dir, "probe.fasta")
+            _write_probe(seed, probe)
+
+            mothur_file = osp.join(tmp_dir, "script")
+            build_mothur_script(
+                template   = "mothur/silva_pcr",
+                output     = mothur_file,
+                silva_seed = osp.join(tmp_dir, osp.basename(seed)),
+                silva_pcr  = osp.join(tmp_dir, osp.basename(path_pcr)),
+                silva_seed_tax   = osp.join(tmp_dir, osp.basename(taxonomy)),
+                silva_seed_start = start,
+                silva_seed_end   = end,
+                probe      = probe,
+                processors = processors
+            )
+
+            code = run_mothur(mothur_file, cwd = tmp_dir, name = "silva_pcr")
+
+            if code:
+                logger.error("Unable to build PCR-trimmed SILVA, mothur exited with code %s." % code)
+                return None
+
+            if not osp.exists(osp.join(tmp_dir, osp.basename(path_pcr))):
+                logger.error("Unable to build PCR-trimmed SILVA, mothur didn't output %s." % osp.basename(path_pcr))
+                return None
+
+            remove(osp.join(tmp_dir, osp.basename(seed)))
+
+            # keep the alignment, taxonomy and every database built from them (the alignment last,
+            # marking the cache as complete).
+            fnames = [fname for fname in os.listdir(tmp_dir) if fname.startswith(seed_root)]
+            fnames = sorted(fnames, key = lambda x: x == osp.basename(path_pcr))
+
+            for fname in fnames:
+                link_file(osp.join(tmp_dir, fname), osp.join(path_target, fname))
+
+    logger.success("PCR-trimmed SILVA cached at %s." % path_pcr)
+
+    return path_pcr
\ No newline at end of file
@@ -0,0 +1,119 @@
+# imports - module imports
+from s3mart.data.native.assign import map_sequences
+from s3mart.data.functions.assign_seqs import (
+    get_otu_index,
+    build_otu_index,
+    name_otus,
+    read_shared,
+    read_otu_taxonomy,
+    update_outputs
+)
+
+def test_map_sequences(tmpdir):
+    reference = tmpdir.join("representatives.fasta")
+    reference.write(
+        ">Otu1\n..ACGTACGTACGTACGTACGTACGTACGTAC..\n"
+        ">Otu2\n..TTTTTTTTTTTTTTTTTTTTTTTTTTTTTT..\n"
+    )
+
+    fasta = tmpdir.join("aligned.fasta")
+    fasta.write(
+        # a single mismatch in 30 bases.
+        ">q1\n..ACGTACGTACGTACGTACGTACGTACGTAA..\n"
+        ">q2\n..TTTTTTTTTTTTTTTTTTTTTTTTTTTTTT..\n"
+        # two mismatches in 30 bases.
+        ">q3\n..ACGTACGTACGTACGTACGTACGTACGTTT..\n"
+    )
+
+    mapped = map_sequences(str(fasta), str(reference), cutoff = 0.05, block_size = 2)
+
+    assert sorted(mapped) == ["q1", "q2"]
+    assert mapped["q1"][0] == "Otu1"
+    assert abs(mapped["q1"][1] - 1 / 30.) < 1e-6
+    assert mapped["q2"] == ("Otu2", 0)
+
+def test_name_otus():
+    assert name_otus(["Otu001", "Otu002"], 2) == ["Otu003", "Otu004"]
+    assert name_otus(["Otu8", "Otu9"], 2)     == ["Otu10", "Otu11"]
+
+def test_build_otu_index(tmpdir):
+    fasta = tmpdir.join("classify.fasta")
+    fasta.write(">s1\nAC-GT\n>s2\nACTGT\n>s3\nTT-TT\n")
+
+    list_file = tmpdir.join("classify.opti_mcc.list")
+    list_file.write("label\tnumOtus\tOtu1\tOtu2\n0.03\t2\ts1,s2\ts3\n")
+
+    count_table = tmpdir.join("classify.count_table")
+    count_table.write("Representative_Sequence\ttotal\tA\ns1\t1\t1\ns2\t5\t5\ns3\t2\t2\n")
+
+    taxonomy = tmpdir.join("classify.opti_mcc.0.03.cons.taxonomy")
+    taxonomy.write("OTU\tSize\tTaxonomy\nOtu1\t6\tBacteria(100);\nOtu2\t2\tBacteria(100);Firmicutes(100);\n")
+
+    index = build_otu_index(str(fasta), str(list_file), str(count_table), str(taxonomy), str(tmpdir),
+        label = 0.03)
+
+    assert index == get_otu_index(str(tmpdir))
+
+    with open(index["fasta"]) as f:
+        assert f.read() == ">Otu1\nACTGT\n>Otu2\nTT-TT\n"
+
+    assert read_otu_taxonomy(index["taxonomy"]) == read_otu_taxonomy(str(taxonomy))
+
+def test_update_outputs(tmpdir):
+    shared = tmpdir.join("output.shared")
+    shared.write("label\tGroup\tnumOtus\tOtu1\tOtu2\n0.03\tA\t2\t6\t2\n")
+
+    taxonomy = tmpdir.join("output.taxonomy")
+    taxonomy.write("OTU\tSize\tTaxonomy\nOtu1\t6\tBacteria(100);\nOtu2\t2\tBacteria(100);Firmicutes(100);\n")
+
+    list_file = tmpdir.join("output.list")
+    list_file.write("label\tnumOtus\tOtu1\tOtu2\n0.03\t2\ts1,s2\ts3\n")
+
+    outputs  = { "shared": str(shared), "taxonomy": str(taxonomy), "list": str(list_file) }
+
+    counts   = {
+        "n1": { "B": 3, "C": 1, "_total": 4 },
+        "n2": { "B": 0, "C": 2, "_total": 2 },
+        "n3": { "B": 1, "C": 0, "_total": 1 }
+    }
+    assigned = { "n1": "Otu2", "n2": "Otu3", "n3": "Otu3" }
+
+    stats    = update_outputs(outputs, assigned, counts, ["B", "C"], {
+        "Otu1": "Bacteria(100);",
+        "Otu2": "Bacteria(100);Firmicutes(100);",
+        "Otu3": "Bacteria(100);Bacteroidetes(90);"
+    })
+
+    assert stats == { "otus": 1, "groups": 2 }
+
+    label, otus, rows = read_shared(outputs["shared"])
+
+    assert label == "0.03"
+    assert otus  == ["Otu1", "Otu2", "Otu3"]
+    assert rows  == { "A": [6, 2, 0], "B": [0, 3, 1], "C": [0, 1, 2] }
+
+    assert read_otu_taxonomy(outputs["taxonomy"]) == {
+        "Otu1": [6, "Bacteria(100);"],
+        "Otu2": [6, "Bacteria(100);Firmicutes(100);"],
+        "Otu3": [3, "Bacteria(100);Bacteroidetes(90);"]
+    }
+
+    assert list_file.read().splitlines() == [
+        "label\tnumOtus\tOtu1\tOtu2\tOtu3",
+        "0.03\t3\ts1,s2\ts3,n1\tn2,n3"
+    ]
+
+def test_map_sequences_gap_runs(tmpdir):
+    reference = tmpdir.join("representatives.fasta")
+    reference.write(">Otu1\n..ACGTACGTAC--AGTACGTACGTACGT..\n")
+
+    # an insertion against the reference, its run of gaps starting in a column gapped in both.
+    fasta = tmpdir.join("aligned.fasta")
+    fasta.write(">q1\n..ACGTACGTAC-AAGTACGTACGTACGT..\n")
+
+    assert map_sequences(str(fasta), str(reference), cutoff = 0.03) == { }
+
+    mapped = map_sequences(str(fasta), str(reference), cutoff = 0.05)
+
+    assert mapped["q1"][0] == "Otu1"
+    assert abs(mapped["q1"][1] - 1 / 26.) < 1e-6
@@ -0,0 +1,51 @@
+import os
+
+# imports - module imports
+from s3mart.data.budget import Budget, resource_budget, _ENV_BUDGET_DIR
+
+def test_budget_acquire(tmpdir):
+    budget = Budget.create(str(tmpdir.join("budget")), 2)
+
+    assert budget.slots == 2
+
+    with budget.acquire(maximum = 4) as slots:
+        assert slots == 2
+
+    with budget.acquire(maximum = 1) as a:
+        assert a == 1
+
+        with budget.acquire(maximum = 4) as b:
+            assert b == 1
+
+def test_budget_fair_share(tmpdir):
+    budget = Budget.create(str(tmpdir.join("budget")), 8)
+    others = [Budget(budget.path) for _ in range(3)]
+
+    assert budget.active() == 1
+
+    with others[0].borrow(), others[1].borrow():
+        assert budget.active() == 2
+
+        # a third of the slots, two other borrowers being active.
+        with budget.acquire(maximum = 8) as slots:
+            assert slots == 2
+            assert budget.active() == 3
+
+        with others[2].acquire(minimum = 4, maximum = 8) as slots:
+            assert slots == 4
+
+    with budget.acquire(maximum = 8) as slots:
+        assert slots == 8
+
+def test_resource_budget():
+    assert _ENV_BUDGET_DIR not in os.environ
+
+    with resource_budget(jobs = 3) as budget:
+        assert budget.slots == 3
+        assert os.environ[_ENV_BUDGET_DIR] == budget.path
+
+        with resource_budget(jobs = 8) as nested:
+            assert nested.path  == budget.path
+            assert nested.slots == 3
+
+    assert _ENV_BUDGET_DIR not in os.environ
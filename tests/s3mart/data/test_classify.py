@@ -0,0 +1,56 @@
+# imports - standard imports
+import random
+
+# imports - module imports
+from s3mart.data.native.classify import build_index, classify, get_kmers
+
+def _mutate(sequence, rate, rng):
+    return "".join(rng.choice("ACGT") if rng.random() < rate else base for base in sequence)
+
+def test_get_kmers():
+    # AAAAAAAA, AAAAAAAC and the k-mers spanning an N are skipped.
+    assert list(get_kmers(b"AAAA-AAAAC")) == [0, 1]
+    assert list(get_kmers(b"AAAAAAANAAAA")) == []
+
+def test_classify(tmpdir):
+    rng = random.Random(0)
+
+    reference, taxonomy, queries = [], [], []
+
+    for phylum in range(2):
+        ancestor = "".join(rng.choice("ACGT") for _ in range(800))
+
+        for genus in range(3):
+            sequence = _mutate(ancestor, 0.1, rng)
+
+            for i in range(3):
+                name = "r%s_%s_%s" % (phylum, genus, i)
+
+                reference.append(">%s\n%s\n" % (name, _mutate(sequence, 0.01, rng)))
+                taxonomy.append("%s\tBacteria;P%s;G%s_%s;\n" % (name, phylum, phylum, genus))
+
+            queries.append(">q%s_%s\n%s\n" % (phylum, genus, _mutate(sequence[200:450], 0.02, rng)))
+
+    tmpdir.join("ref.align").write("".join(reference))
+    tmpdir.join("ref.tax").write("".join(taxonomy))
+    tmpdir.join("query.fasta").write("".join(queries))
+
+    index = build_index(str(tmpdir.join("ref.align")), str(tmpdir.join("ref.tax")),
+        target_dir = str(tmpdir.join("index")))
+
+    # built once.
+    assert build_index(str(tmpdir.join("ref.align")), str(tmpdir.join("ref.tax")),
+        target_dir = str(tmpdir.join("index"))) == index
+
+    output = tmpdir.join("query.taxonomy")
+
+    assert classify(str(tmpdir.join("query.fasta")), index, str(output), jobs = 2) == { "classified": 6 }
+
+    lines = output.read().splitlines()
+
+    assert lines[0] == "q0_0\tBacteria(100);P0(100);G0_0(100);"
+    assert [line.split("\t")[0] for line in lines] == ["q%s_%s" % (p, g) for p in range(2) for g in range(3)]
+
+    for line in lines:
+        name, lineage = line.split("\t")
+        assert lineage.startswith("Bacteria(100);P%s(" % name[1])
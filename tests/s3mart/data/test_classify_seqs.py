@@ -0,0 +1,75 @@
+# imports - standard imports
+import os.path as osp
+
+# imports - third-party imports
+import pytest
+
+# imports - module imports
+from testutils import PATH
+from s3mart.data.native.derep import read_count_table
+from s3mart.data.functions.classify_seqs import write_tax_summary, shard_fasta, classify_seqs
+
+def test_read_count_table(tmpdir):
+    full       = tmpdir.join("full.count_table")
+    full.write("Representative_Sequence\ttotal\tA\tB\ns1\t3\t1\t2\n")
+
+    compressed = tmpdir.join("compressed.count_table")
+    compressed.write("#Compressed Format: groupIndex,abundance.\n#1,A\t2,B\n"
+        "Representative_Sequence\ttotal\tA\tB\ns1\t3\t1,1\t2,2\ns2\t4\t2,4\n")
+
+    assert read_count_table(str(full)) == (["A", "B"], { "s1": { "A": 1, "B": 2, "_total": 3 } })
+
+    groups, counts = read_count_table(str(compressed))
+
+    assert groups == ["A", "B"]
+    assert counts["s2"] == { "B": 4, "_total": 4 }
+
+def test_write_tax_summary(tmpdir):
+    taxonomy = tmpdir.join("seqs.taxonomy")
+    taxonomy.write(
+        "s1\tBacteria(100);Firmicutes(98);\n"
+        "s2\tBacteria(100);Bacteroidetes(90);\n"
+        "s3\tArchaea(100);Euryarchaeota(100);\n"
+    )
+
+    count_table = tmpdir.join("seqs.count_table")
+    count_table.write("Representative_Sequence\ttotal\tA\tB\ns1\t3\t1\t2\ns2\t1\t1\t0\ns3\t2\t0\t2\n")
+
+    summary = tmpdir.join("seqs.tax.summary")
+    write_tax_summary(str(taxonomy), str(count_table), str(summary))
+
+    assert summary.read() == (
+        "taxlevel\trankID\ttaxon\tdaughterlevels\ttotal\tA\tB\n"
+        "0\t0\tRoot\t2\t6\t2\t4\n"
+        "1\t0.1\tArchaea\t1\t2\t0\t2\n"
+        "2\t0.1.1\tEuryarchaeota\t0\t2\t0\t2\n"
+        "1\t0.2\tBacteria\t2\t4\t2\t2\n"
+        "2\t0.2.1\tBacteroidetes\t0\t1\t1\t0\n"
+        "2\t0.2.2\tFirmicutes\t0\t3\t1\t2\n"
+    )
+
+def test_write_tax_summary_mothur(tmpdir):
+    # classify.seqs output (wang taxonomy, compressed count table) along with its tax.summary.
+    data    = osp.join(PATH["DATA"], "classify")
+
+    summary = tmpdir.join("stability.wang.tax.summary")
+    write_tax_summary(osp.join(data, "stability.wang.taxonomy"), osp.join(data, "stability.count_table"),
+        str(summary))
+
+    with open(osp.join(data, "stability.wang.tax.summary"), "rb") as f:
+        assert summary.read_binary() == f.read()
+
+def test_shard_fasta(tmpdir):
+    fasta = tmpdir.join("seqs.fasta")
+    fasta.write("".join(">s%s\nACGT\n" % i for i in range(2500)))
+
+    shards = shard_fasta(str(fasta), str(tmpdir.join("shards")), shards = 4)
+
+    # shards hold at least a thousand sequences each.
+    assert len(shards) == 3
+    assert "".join(open(shard).read() for shard in shards) == fasta.read()
+
+def test_classify_seqs_backend(tmpdir):
+    with pytest.raises(ValueError):
+        classify_seqs(str(tmpdir.join("seqs.fasta")), str(tmpdir.join("seqs.count_table")),
+            str(tmpdir.join("seqs.taxonomy")), backend = "rdp")
@@ -0,0 +1,69 @@
+# imports - standard imports
+import time
+import threading
+
+# imports - module imports
+from s3mart.data.functions.cluster_seqs import (
+    get_bins,
+    schedule_bins,
+    run_bins,
+    read_bin_list,
+    merge_lists
+)
+
+def test_get_bins(tmpdir):
+    taxonomy = tmpdir.join("seqs.taxonomy")
+    taxonomy.write(
+        "s1\tBacteria(100);Firmicutes(98);Bacilli(90);\n"
+        "s2\tBacteria(100);Firmicutes(99);Clostridia(95);\n"
+        "s3\tBacteria(100);Bacteroidetes(90);Bacteroidia(90);\n"
+    )
+
+    assert get_bins(str(taxonomy), taxonomy_level = 2) == {
+        "Bacteria;Firmicutes":    ["s1", "s2"],
+        "Bacteria;Bacteroidetes": ["s3"]
+    }
+
+def test_schedule_bins():
+    bins = schedule_bins({ "small": ["s1"], "large": ["s%s" % i for i in range(2, 11)], "medium": ["s11", "s12"] },
+        jobs = 8)
+
+    assert [b["taxon"] for b in bins] == ["large", "medium", "small"]
+    assert [b["processors"] for b in bins] == [8, 1, 1]
+
+def test_run_bins():
+    bins    = schedule_bins({ "small": ["s1"], "large": ["s%s" % i for i in range(2, 11)], "medium": ["s11", "s12"] },
+        jobs = 8)
+
+    lock    = threading.Lock()
+    running = { "processors": 0, "peak": 0 }
+
+    def function(b):
+        with lock:
+            running["processors"] += b["processors"]
+            running["peak"] = max(running["peak"], running["processors"])
+
+        time.sleep(0.05)
+
+        with lock:
+            running["processors"] -= b["processors"]
+
+        return b["taxon"]
+
+    assert sorted(run_bins(bins, function, jobs = 8)) == ["large", "medium", "small"]
+    assert running["peak"] <= 8
+
+def test_merge_lists(tmpdir):
+    bin_list = tmpdir.join("bin.opti_mcc.list")
+    bin_list.write("label\tnumOtus\tOtu1\tOtu2\nunique\t2\ts1\ts2\n")
+
+    # OptiClust labels lists of singletons unique.
+    otus    = list(read_bin_list(str(bin_list), label = 0.03).values())
+
+    results = [{ "otus": otus }, { "otus": [["s3", "s4"]] }]
+    counts  = { "s1": { "_total": 1 }, "s2": { "_total": 5 }, "s3": { "_total": 2 }, "s4": { "_total": 2 } }
+
+    output  = tmpdir.join("merged.list")
+    merge_lists(results, counts, str(output), 0.03)
+
+    assert output.read() == "label\tnumOtus\tOtu1\tOtu2\tOtu3\n0.03\t3\ts2\ts3,s4\ts1\n"
@@ -0,0 +1,77 @@
+import random
+
+# imports - module imports
+from s3mart.data.native.contigs import merge_pairs
+from s3mart.data.native.screen  import screen_fastq, reverse_complement
+
+def _amplicon(length = 250, seed = 1):
+    random.seed(seed)
+    return "".join(random.choice("ACGT") for _ in range(length))
+
+def test_merge_pairs():
+    amplicon = _amplicon()
+
+    forward  = amplicon[:150].encode()
+    reverse  = reverse_complement(amplicon[-150:]).encode()
+
+    contigs, qualities = merge_pairs([forward], [b"I" * 150], [reverse], [b"I" * 150])
+
+    assert contigs == [amplicon.encode()]
+    assert len(qualities[0]) == 250
+
+    # a mismatch within the overlap, resolved by quality (or an N when the qualities are close).
+    mutated  = list(amplicon[:150])
+    mutated[120] = "A" if amplicon[120] != "A" else "C"
+    mutated  = "".join(mutated).encode()
+
+    contigs, _ = merge_pairs([mutated], [b"#" * 150], [reverse], [b"I" * 150], min_length = 240, max_length = 260)
+    assert contigs == [amplicon.encode()]
+
+    contigs, qualities = merge_pairs([mutated], [b"I" * 150], [reverse], [b"I" * 150])
+    assert contigs[0][120:121] == b"N" and qualities[0][120:121] == b"!"
+
+def test_merge_pairs_read_through():
+    # 2x300 reads over a 253 bp amplicon, each running through into adapter.
+    amplicon = _amplicon(length = 253)
+    adapters = _amplicon(length = 47, seed = 2), _amplicon(length = 47, seed = 3)
+
+    forward  = (amplicon + adapters[0]).encode()
+    reverse  = (reverse_complement(amplicon) + adapters[1]).encode()
+
+    contigs, qualities = merge_pairs([forward], [b"I" * 300], [reverse], [b"I" * 300],
+        min_length = 240, max_length = 260)
+
+    assert contigs == [amplicon.encode()]
+    assert len(qualities[0]) == 253
+
+    contigs, _ = merge_pairs([forward], [b"I" * 300], [reverse], [b"I" * 300])
+    assert contigs == [amplicon.encode()]
+
+def test_merge_pairs_outside_band():
+    amplicon = _amplicon()
+
+    forward  = amplicon[:150].encode()
+    reverse  = reverse_complement(amplicon[-150:]).encode()
+
+    # no overlap yields a contig this long, the pair is dropped rather than merged.
+    contigs, qualities = merge_pairs([forward], [b"I" * 150], [reverse], [b"I" * 150],
+        min_length = 400, max_length = 450)
+
+    assert contigs == [b""] and qualities == [b""]
+
+def test_screen_fastq_paired(tmpdir):
+    amplicon = _amplicon()
+    sra_dir  = tmpdir.mkdir("SRR1")
+
+    for mate, read in ((1, amplicon[:150]), (2, reverse_complement(amplicon[-150:]))):
+        sra_dir.join("SRR1_%s.fastq" % mate).write("@SRR1.1 1\n%s\n+\n%s\n" % (read, "I" * 150))
+
+    target_dir  = tmpdir.mkdir("trimmed")
+    target_path = { t: str(target_dir.join("trimmed.%s" % t)) for t in ("fasta", "group", "summary") }
+
+    files = [str(sra_dir.join("SRR1_%s.fastq" % mate)) for mate in (1, 2)]
+    stats = screen_fastq(files, target_path, paired = True, min_length = 240, max_length = 260, maxhomop = 8)
+
+    assert stats == { "reads": 1, "passed": 1 }
+    assert target_dir.join("trimmed.fasta").read() == ">SRR1.1\n%s\n" % amplicon
+    assert target_dir.join("trimmed.group").read() == "SRR1.1\tSRR1\n"
@@ -0,0 +1,62 @@
+# imports - standard imports
+import random
+
+# imports - module imports
+from s3mart.data.native.derep import dereplicate
+
+_FASTA  = ">r1\nACGT\n>r2\nGGCC\n>r3\nAC\nGT\n>r4\nGGCC\n>r5\nTTTT\n"
+_GROUPS = [("r1", "g2"), ("r2", "g1"), ("r3", "g1"), ("r4", "g1"), ("r5", "g2")]
+
+def _dereplicate(tmpdir, groups, buckets):
+    fasta = tmpdir.join("merged.fasta")
+    fasta.write(_FASTA)
+
+    group = tmpdir.join("merged.group")
+    group.write("".join("%s\t%s\n" % g for g in groups))
+
+    output_fasta = tmpdir.join("out", "merged.unique.fasta")
+    output_count = tmpdir.join("out", "merged.count_table")
+
+    stats = dereplicate(str(fasta), str(group), str(output_fasta), str(output_count), buckets = buckets, jobs = 2)
+
+    return stats, output_fasta.read(), output_count.read()
+
+def test_dereplicate(tmpdir):
+    stats, fasta, count = _dereplicate(tmpdir, _GROUPS, buckets = 3)
+
+    assert stats == { "reads": 5, "unique": 3 }
+
+    assert fasta == ">r1\nACGT\n>r2\nGGCC\n>r5\nTTTT\n"
+    assert count == "Representative_Sequence\ttotal\tg1\tg2\nr1\t2\t1\t1\nr2\t2\t2\t0\nr5\t1\t0\t1\n"
+
+    # group files listing names in a different order are joined on disk.
+    assert _dereplicate(tmpdir, _GROUPS[::-1], buckets = 3) == (stats, fasta, count)
+
+def test_dereplicate_join(tmpdir):
+    random.seed(0)
+
+    # a few distinct sequences over many reads, each shared by several buckets on disk.
+    reads  = [("r%s" % i, random.choice(["ACGT", "GGCC", "TTTT", "ACGA", "CCCA"]), random.choice(["g1", "g2", "g3"]))
+        for i in range(300)]
+
+    fasta  = tmpdir.join("merged.fasta")
+    fasta.write("".join(">%s\n%s\n" % (name, sequence) for name, sequence, _ in reads))
+
+    groups = [(name, group) for name, _, group in reads]
+
+    def dereplicate_(target, groups):
+        group = tmpdir.join("%s.group" % target)
+        group.write("".join("%s\t%s\n" % g for g in groups))
+
+        output_fasta = tmpdir.join(target, "merged.unique.fasta")
+        output_count = tmpdir.join(target, "merged.count_table")
+
+        dereplicate(str(fasta), str(group), str(output_fasta), str(output_count), buckets = 8, jobs = 2)
+
+        return output_fasta.read(), output_count.read()
+
+    lockstep = dereplicate_("lockstep", groups)
+
+    random.shuffle(groups)
+
+    assert dereplicate_("join", groups) == lockstep
@@ -0,0 +1,61 @@
+import gzip
+
+# imports - module imports
+from s3mart.data.fastq import (
+    is_fastq,
+    fastq_prefix,
+    get_fastq_files,
+    get_compression,
+    read_fastq,
+    decompress_fastq,
+    get_samples,
+    sample_name
+)
+
+_FASTQ = b"@r1 length=4\nACGT\n+\nIIII\n@r2\nNNAC\n+\n##II\n"
+
+def test_fastq_prefix():
+    assert fastq_prefix("/data/SRR1/SRR1_1.fastq")     == "SRR1_1"
+    assert fastq_prefix("/data/SRR1/SRR1_1.fastq.gz")  == "SRR1_1"
+    assert fastq_prefix("/data/SRR1/SRR1_1.fastq.zst") == "SRR1_1"
+
+    assert is_fastq("SRR1.fastq.gz")
+    assert not is_fastq("SRR1.sra")
+
+    assert get_compression("SRR1.fastq.gz")  == "gzip"
+    assert get_compression("SRR1.fastq.zst") == "zstd"
+    assert get_compression("SRR1.fastq")     == None
+
+def test_get_fastq_files(tmpdir):
+    directory = tmpdir.mkdir("SRR1")
+    directory.join("SRR1_1.fastq").write("")
+    directory.join("SRR1_2.fastq.gz").write("")
+    directory.join("SRR1.sra").write("")
+
+    files = get_fastq_files(str(directory))
+
+    assert [f.split("/")[-1] for f in files] == ["SRR1_1.fastq", "SRR1_2.fastq.gz"]
+
+def test_read_fastq(tmpdir):
+    path = str(tmpdir.join("SRR1.fastq.gz"))
+
+    with gzip.open(path, "wb") as f:
+        f.write(_FASTQ)
+
+    assert list(read_fastq(path)) == [
+        (b"r1 length=4", b"ACGT", b"IIII"),
+        (b"r2", b"NNAC", b"##II")
+    ]
+
+    target = decompress_fastq(path, str(tmpdir.join("SRR1.fastq")))
+
+    assert open(target, "rb").read() == _FASTQ
+
+def test_get_samples():
+    files = ["/d/SRR1/SRR1_1.fastq", "/d/SRR1/SRR1_2.fastq", "/d/SRR1/SRR1.fastq", "/d/SRR2/SRR2_1.fastq.gz"]
+
+    assert get_samples(files, paired = True) == [
+        ["/d/SRR1/SRR1_1.fastq", "/d/SRR1/SRR1_2.fastq"], ["/d/SRR1/SRR1.fastq"], ["/d/SRR2/SRR2_1.fastq.gz"]
+    ]
+    assert get_samples(files) == [[f] for f in files]
+    assert sample_name(get_samples(files, paired = True)[0]) == "SRR1"
@@ -0,0 +1,39 @@
+# imports - module imports
+from s3mart.data.functions import get_input_data, get_study
+
+_INPUT = "group,sra,layout\ng1,SRR1,single\ng1,SRR2,paired\ng2,SRR3,single\n"
+
+def test_get_input_data(tmpdir):
+    path = tmpdir.join("input.csv")
+    path.write(_INPUT)
+
+    data_dir, groups = get_input_data(input = str(path), data_dir = str(tmpdir))
+
+    assert data_dir == str(tmpdir)
+    assert sorted(groups) == ["g1", "g2"]
+    assert [d["sra"] for d in groups["g1"]] == ["SRR1", "SRR2"]
+
+    # mutating the returned groups must not leak into the memoised study.
+    groups["g1"][0]["group"] = "g1"
+    groups.pop("g2")
+
+    _, groups = get_input_data(input = str(path), data_dir = str(tmpdir))
+
+    assert sorted(groups) == ["g1", "g2"]
+    assert "group" not in groups["g1"][0]
+
+def test_get_study(tmpdir):
+    path = tmpdir.join("input.csv")
+    path.write(_INPUT)
+
+    _, study = get_study(input = str(path), data_dir = str(tmpdir))
+    _, other = get_study(input = str(path), data_dir = str(tmpdir))
+
+    assert study is other
+
+    path.write(_INPUT + "g3,SRR4,single\n")
+
+    _, other = get_study(input = str(path), data_dir = str(tmpdir))
+
+    assert study is not other
+    assert len(other.rows) == 4
@@ -0,0 +1,48 @@
+import gzip
+
+# imports - module imports
+from s3mart.data.manifest import Manifest, count_reads, scan_sra_dir
+
+_FASTQ = b"@r1\nACGT\n+\nIIII\n@r2\nACGT\n+\nIIII\n"
+
+def test_count_reads(tmpdir):
+    path = tmpdir.join("SRR1.fastq")
+    path.write(_FASTQ, mode = "wb")
+
+    assert count_reads(str(path)) == 2
+
+    path = str(tmpdir.join("SRR2.fastq.gz"))
+
+    with gzip.open(path, "wb") as f:
+        f.write(_FASTQ)
+
+    assert count_reads(path) == 2
+
+    path = tmpdir.join("SRR3.fastq")
+    path.write("")
+
+    assert count_reads(str(path)) == 0
+
+def test_manifest(tmpdir):
+    data_dir = tmpdir.mkdir("data")
+    sra_dir  = data_dir.mkdir("SRR1")
+    sra_dir.join("SRR1.fastq").write(_FASTQ, mode = "wb")
+    sra_dir.join("SRR1_2.fastq").write("")
+
+    manifest = Manifest(str(data_dir))
+
+    assert manifest.is_stale("SRR1")
+
+    manifest.set("SRR1", scan_sra_dir(str(sra_dir)))
+    manifest.save()
+
+    manifest = Manifest(str(data_dir))
+
+    assert not manifest.is_stale("SRR1")
+    assert manifest.reads("SRR1") == 2
+    assert len(manifest.files("SRR1")) == 2
+    assert manifest.files("SRR1", non_empty = True) == [str(sra_dir.join("SRR1.fastq"))]
+
+    sra_dir.join("SRR1_3.fastq").write("")
+
+    assert manifest.is_stale("SRR1")
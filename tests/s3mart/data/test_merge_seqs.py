@@ -0,0 +1,22 @@
+# imports - module imports
+from s3mart.data.functions.merge_seqs import merge_seqs
+
+def test_merge_seqs(tmpdir):
+    for group in ("g2", "g1"):
+        target_dir = tmpdir.join("trimmed", group).ensure(dir = True)
+
+        target_dir.join("trimmed.fasta").write(">%s.1\nACGT\n" % group)
+        target_dir.join("trimmed.group").write("%s.1\t%s\n" % (group, group))
+
+    merge_seqs(data_dir = str(tmpdir), merge_compression = "none")
+
+    assert tmpdir.join("merged.fasta").read() == ">g1.1\nACGT\n>g2.1\nACGT\n"
+    assert tmpdir.join("merged.group").read() == "g1.1\tg1\ng2.1\tg2\n"
+
+    # a group no longer trimmed is dropped from the merged files.
+    tmpdir.join("trimmed", "g2").remove()
+
+    merge_seqs(data_dir = str(tmpdir), merge_compression = "none")
+
+    assert tmpdir.join("merged.fasta").read() == ">g1.1\nACGT\n"
+    assert tmpdir.join("merged.group").read() == "g1.1\tg1\n"
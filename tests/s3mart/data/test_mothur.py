@@ -0,0 +1,54 @@
+# imports - standard imports
+import os
+import signal
+
+# imports - module imports
+from s3mart.data.mothur import parse_log, report_profiles, _exit_code
+
+def test_parse_log():
+    lines = [
+        "mothur v.1.48.0",
+        "mothur > align.seqs(fasta=merged.unique.fasta, reference=silva.pcr.align)",
+        "It took 12 secs to align 1000 sequences.",
+        "It took 1 secs to write the report.",
+        "mothur > quit()"
+    ]
+
+    assert parse_log(lines) == [
+        { "command": "align.seqs", "reported": 13 },
+        { "command": "quit", "reported": 0 }
+    ]
+
+def test_report_profiles():
+    profiles = [{
+        "name": "trim", "commands": [
+            { "command": "trim.seqs",   "wall": 10, "reported": 9, "cpu": 40, "peak_rss": 100 },
+            { "command": "screen.seqs", "wall": 2,  "reported": 2, "cpu": 4,  "peak_rss": 300 }
+        ]
+    }, {
+        "name": "trim", "commands": [
+            { "command": "trim.seqs",   "wall": 20, "reported": 19, "cpu": 80, "peak_rss": 200 }
+        ]
+    }]
+
+    rows = report_profiles(profiles)
+
+    assert [row["command"] for row in rows] == ["trim.seqs", "screen.seqs"]
+    assert rows[0] == { "name": "trim", "command": "trim.seqs", "runs": 2,
+        "wall": 30, "reported": 28, "cpu": 120, "peak_rss": 200 }
+
+def test_exit_code():
+    for code in (0, 1, 127):
+        pid = os.fork()
+
+        if not pid:
+            os._exit(code)
+
+        assert _exit_code(os.waitpid(pid, 0)[1]) == code
+
+    pid = os.fork()
+
+    if not pid:
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    assert _exit_code(os.waitpid(pid, 0)[1]) == -signal.SIGKILL
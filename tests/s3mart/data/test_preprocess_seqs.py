@@ -0,0 +1,55 @@
+# imports - standard imports
+import os.path as osp
+
+import pytest
+
+# imports - module imports
+from s3mart.data.ledger import Ledger
+from s3mart.data.functions.preprocess_seqs import (
+    STAGES,
+    get_stage_outputs,
+    get_stage_signatures,
+    plan_stages
+)
+
+def _complete(ledger, signatures, stages):
+    for stage in stages:
+        outputs = get_stage_outputs(stage, cutoff_level = 0.03)
+
+        for f in outputs.values():
+            open(osp.join(ledger.work_dir, f), "w").close()
+
+        ledger.set(stage, signatures[stage], outputs)
+
+def test_plan_stages(tmpdir):
+    ledger     = Ledger(str(tmpdir))
+    signatures = get_stage_signatures({ "screen": { "maxhomop": 8 } })
+
+    assert plan_stages(ledger, signatures) == list(STAGES)
+
+    _complete(ledger, signatures, STAGES[:5])
+    ledger.save()
+
+    ledger = Ledger(str(tmpdir))
+
+    # resumes from the first incomplete stage.
+    assert plan_stages(ledger, signatures) == ["cluster", "tree"]
+    assert plan_stages(ledger, signatures, to_stage = "cluster") == ["cluster"]
+    assert plan_stages(ledger, signatures, from_stage = "chimera", to_stage = "classify") == ["chimera", "classify"]
+
+    with pytest.raises(ValueError):
+        plan_stages(ledger, signatures, from_stage = "tree")
+
+    with pytest.raises(ValueError):
+        plan_stages(ledger, signatures, to_stage = "unknown")
+
+    # a change to a stage's parameters invalidates it along with every stage after it.
+    changed = get_stage_signatures({ "screen": { "maxhomop": 10 } })
+
+    assert changed["align"] == signatures["align"]
+    assert plan_stages(ledger, changed) == list(STAGES[1:])
+
+    # as does a missing output.
+    tmpdir.join("precluster.fasta").remove()
+
+    assert plan_stages(ledger, signatures) == list(STAGES[2:])
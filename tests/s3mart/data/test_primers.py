@@ -0,0 +1,61 @@
+import gzip
+
+import pytest
+
+# imports - module imports
+from s3mart.data.primers import trim_primers
+from s3mart.data.native.screen import reverse_complement
+
+from bpyutils.util.system import which
+
+@pytest.mark.skipif(not which("cutadapt"), reason = "cutadapt not installed")
+def test_trim_primers(tmpdir):
+    primer_f, primer_r = "GTGCCAGCMGCCGCGGTAA", "GGACTACHVGGGTWTCTAAT"
+    insert = "TACGGAGGATCCGAGCGTTATCCGGATTTATTGGGTTTAAAGGGAGCGTAG"
+
+    path = tmpdir.join("SRR1.fastq")
+    # r2 has neither primer, r3 only the forward primer.
+    path.write("@r1\n%s\n+\n%s\n@r2\n%s\n+\n%s\n@r3\n%s\n+\n%s\n" % (
+        "GTGCCAGCAGCCGCGGTAA" + insert + reverse_complement(primer_r).replace("B", "C").replace("D", "A").replace("W", "A"),
+        "I" * (19 + len(insert) + 20), insert, "I" * len(insert),
+        "GTGCCAGCAGCCGCGGTAA" + insert, "I" * (19 + len(insert))
+    ))
+
+    outputs = trim_primers([str(path)], str(tmpdir.join("out")), primer_f, primer_r, jobs = 1, pdiffs = 0)
+
+    assert [o.endswith("SRR1.fastq.gz") for o in outputs] == [True]
+
+    with gzip.open(outputs[0], "rt") as f:
+        lines = f.read().splitlines()
+
+    assert lines[0] == "@r1" and lines[1] == insert and len(lines) == 4
+
+@pytest.mark.skipif(not which("cutadapt"), reason = "cutadapt not installed")
+def test_trim_primers_paired(tmpdir):
+    primer_f, primer_r = "GTGCCAGCAGCCGCGGTAA", "GGACTACAAGGGTATCTAAT"
+    insert = "TACGGAGGATCCGAGCGTTATCCGGATTTATTGGGTTTAAAGGGAGCGTAG"
+
+    # r2 has only the forward primer, its pair is discarded.
+    reads  = {
+        1: [("r1", primer_f + insert), ("r2", primer_f + insert)],
+        2: [("r1", primer_r + reverse_complement(insert)), ("r2", reverse_complement(insert))]
+    }
+
+    files  = [ ]
+
+    for mate, records in reads.items():
+        path = tmpdir.join("SRR1_%s.fastq" % mate)
+        path.write("".join("@%s\n%s\n+\n%s\n" % (name, read, "I" * len(read)) for name, read in records))
+
+        files.append(str(path))
+
+    outputs = trim_primers(files, str(tmpdir.join("out")), primer_f, primer_r, paired = True, jobs = 1, pdiffs = 0)
+
+    assert len(outputs) == 2
+
+    for output, read in zip(outputs, (insert, reverse_complement(insert))):
+        with gzip.open(output, "rt") as f:
+            assert f.read().splitlines()[:2] == ["@r1", read]
+
+        with gzip.open(output, "rt") as f:
+            assert len(f.read().splitlines()) == 4
@@ -0,0 +1,39 @@
+import os
+import json
+
+# imports - module imports
+from s3mart.data.native import fastq_stats, native_qc
+
+_FASTQ = "@r1\nACGN\n+\nIIII\n@r2\nGGC\n+\n#5I\n"
+
+def test_fastq_stats(tmpdir):
+    path = tmpdir.join("SRR1.fastq")
+    path.write(_FASTQ)
+
+    stats = fastq_stats(str(path), batch_size = 1)
+
+    assert stats["reads"] == 2
+    assert stats["bases"] == 7
+    assert stats["length_histogram"] == { 3: 1, 4: 1 }
+
+    assert stats["per_base_quality"]["mean"] == [21.0, 30.0, 40.0, 40.0]
+    assert stats["per_base_n_percent"] == [0.0, 0.0, 0.0, 100.0]
+
+    assert round(stats["gc_percent"], 2) == round(100 * 5 / 7, 2)
+
+def test_native_qc(tmpdir):
+    path = tmpdir.join("SRR1.fastq")
+    path.write(_FASTQ)
+
+    output_dir = tmpdir.mkdir("qc")
+    native_qc([str(path)], output_dir = str(output_dir), jobs = 1)
+
+    files = os.listdir(str(output_dir))
+
+    assert "SRR1_s3mart_qc.json" in files
+    assert "s3mart_qc_general_stats_mqc.json" in files
+
+    with open(str(output_dir.join("s3mart_qc_general_stats_mqc.json"))) as f:
+        summary = json.load(f)
+
+    assert summary["data"]["SRR1"]["reads"] == 2
@@ -0,0 +1,52 @@
+# imports - module imports
+from s3mart.data.native.screen import screen_batch, screen_fastq, reverse_complement
+
+def test_screen_batch():
+    sequences = [b"ACGTACGTAA", b"ACGNACGTAA", b"AAAAAAAAAC", b"ACG"]
+    qualities = [b"IIIIIIIIII", b"IIIIIIIIII", b"IIIIIIIIII", b"III"]
+
+    trimmed, index, ambigs, polymers = screen_batch(sequences, qualities,
+        min_length = 5, max_length = 20, maxambig = 0, maxhomop = 8)
+
+    assert trimmed  == [b"ACGTACGTAA"]
+    assert list(index) == [0]
+    assert list(ambigs) == [0] and list(polymers) == [2]
+
+    trimmed, index, _, _ = screen_batch(sequences, [b"#" * len(s) for s in sequences], qaverage = 35)
+    assert not trimmed
+
+def test_screen_batch_primers():
+    sequences = [b"GGTTACGTACGTAA" + reverse_complement("CCA").encode(), b"GCTTACGTACGTAA" + b"TGG", b"ACGTACGTAA"]
+    qualities = [b"I" * len(s) for s in sequences]
+
+    trimmed, index, _, _ = screen_batch(sequences, qualities, primer_f = "GKTT", primer_r = "CCA", pdiffs = 0)
+
+    assert trimmed == [b"ACGTACGTAA"]
+    assert list(index) == [0]
+
+    trimmed, index, _, _ = screen_batch(sequences, qualities, primer_f = "GKTT", primer_r = "CCA", pdiffs = 1)
+    assert list(index) == [0, 1]
+
+def test_screen_fastq(tmpdir):
+    files = []
+
+    for name in ("SRR1", "SRR2"):
+        path = tmpdir.join("%s.fastq" % name)
+        path.write("@%s:1 extra\nACGTACGT\n+\nIIIIIIII\n@%s:2\nNNNNACGT\n+\nIIIIIIII\n" % (name, name))
+        files.append(str(path))
+
+    target_dir  = tmpdir.mkdir("trimmed")
+    target_path = { t: str(target_dir.join("trimmed.%s" % t)) for t in ("fasta", "group", "summary") }
+
+    stats = screen_fastq(files, target_path, jobs = 2, maxambig = 0)
+
+    assert stats == { "reads": 4, "passed": 2 }
+
+    assert target_dir.join("trimmed.fasta").read() == ">SRR1_1\nACGTACGT\n>SRR2_1\nACGTACGT\n"
+    assert target_dir.join("trimmed.group").read() == "SRR1_1\tSRR1\nSRR2_1\tSRR2\n"
+
+    summary = target_dir.join("trimmed.summary").read().splitlines()
+    assert summary[0].startswith("seqname\tstart\tend")
+    assert summary[1:] == ["SRR1_1\t1\t8\t8\t0\t1\t1", "SRR2_1\t1\t8\t8\t0\t1\t1"]
+
+    assert not target_dir.join(".parts").exists()
@@ -0,0 +1,61 @@
+import os, os.path as osp
+
+# imports - module imports
+from s3mart.data.sra_cache import SRACache
+
+def _make_sra(tmpdir, accession, content):
+    sra_dir = tmpdir.mkdir(accession)
+    path    = sra_dir.join("%s.fastq" % accession)
+    path.write(content)
+
+    return str(sra_dir), str(path)
+
+def test_sra_cache(tmpdir):
+    cache = SRACache(location = str(tmpdir.join("cache")), size = 1024)
+
+    sra_dir, path = _make_sra(tmpdir, "SRR1", "@r1\nACGT\n+\nIIII\n")
+    cache.put("SRR1", sra_dir, [path])
+
+    target = str(tmpdir.join("data", "SRR1"))
+    paths  = cache.get("SRR1", target)
+
+    assert paths == [osp.join(target, "SRR1.fastq")]
+    assert open(paths[0]).read() == "@r1\nACGT\n+\nIIII\n"
+
+    assert cache.get("SRR2", target) == []
+
+def test_sra_cache_corrupt(tmpdir):
+    cache = SRACache(location = str(tmpdir.join("cache")), size = 1024)
+
+    sra_dir, path = _make_sra(tmpdir, "SRR1", "@r1\nACGT\n+\nIIII\n")
+    cache.put("SRR1", sra_dir, [path])
+
+    # the data directory's files are left writable.
+    assert os.stat(path).st_mode & 0o200
+
+    # written in place (its object sharing the inode), keeping its size.
+    with open(path, "r+") as f:
+        f.write("@r2")
+
+    assert cache.get("SRR1", str(tmpdir.join("data", "SRR1"))) == []
+
+def test_sra_cache_eviction(tmpdir):
+    cache = SRACache(location = str(tmpdir.join("cache")), size = 10)
+
+    sra_dir, path = _make_sra(tmpdir, "SRR1", "A" * 8)
+    cache.put("SRR1", sra_dir, [path])
+
+    sra_dir, path = _make_sra(tmpdir, "SRR2", "C" * 8)
+    cache.put("SRR2", sra_dir, [path])
+
+    assert cache.get("SRR1", str(tmpdir.join("data", "SRR1"))) == []
+    assert cache.get("SRR2", str(tmpdir.join("data", "SRR2")))
+
+def test_sra_cache_disabled(tmpdir):
+    cache = SRACache(location = str(tmpdir.join("cache")), size = 0)
+
+    sra_dir, path = _make_sra(tmpdir, "SRR1", "A")
+    cache.put("SRR1", sra_dir, [path])
+
+    assert not cache.enabled
+    assert cache.get("SRR1", str(tmpdir.join("data"))) == []
@@ -0,0 +1,107 @@
+# imports - third-party imports
+import numpy as np
+
+# imports - module imports
+from s3mart.data.native.tree import get_otu_representatives, get_profile, distances, write_distances
+
+def test_get_otu_representatives(tmpdir):
+    list_file   = tmpdir.join("seqs.list")
+    list_file.write("label\tnumOtus\tOtu1\tOtu2\n0.03\t2\ts1,s2\ts3\n")
+
+    count_table = tmpdir.join("seqs.count_table")
+    count_table.write("Representative_Sequence\ttotal\tA\ns1\t1\t1\ns2\t5\t5\ns3\t2\t2\n")
+
+    assert get_otu_representatives(str(list_file), str(count_table), label = 0.03) == \
+        { "Otu1": "s2", "Otu2": "s3" }
+
+def test_write_distances(tmpdir):
+    fasta = tmpdir.join("seqs.align")
+    fasta.write(
+        ">s1\n..ACGTACGTAC..\n"
+        ">s2\n..ACGTACGTAA..\n"
+        ">s3\n..ACG---GTAC..\n"
+        ">s4\n..TTTTTTTTTT..\n"
+    )
+
+    output = tmpdir.join("seqs.phylip.dist")
+    write_distances(str(fasta), ["s1", "s2", "s3"], str(output), block_size = 2)
+
+    lines = output.read().splitlines()
+
+    assert lines[0] == "3"
+    assert lines[1] == "s1"
+    # a single mismatch in 10 bases.
+    assert lines[2] == "s2\t0.100000"
+    # a run of 3 gaps counts as a single mismatch, over 7 bases and a gap.
+    assert lines[3] == "s3\t%.6f\t%.6f" % (1 / 8., 2 / 8.)
+
+def _onegap(a, b):
+    # mothur's OneGapDist, column by column.
+    start = next((i for i in range(len(a)) if a[i] != "." and b[i] != "."), None)
+
+    if start is None:
+        return 1.0
+
+    end   = max(i for i in range(len(a)) if a[i] != "." and b[i] != ".")
+
+    difference, length = 0, 0
+    open_a, open_b     = False, False
+
+    for i in range(start, end + 1):
+        if a[i] == "-" and b[i] == "-":
+            pass
+        elif a[i] == "-":
+            if not open_a:
+                difference += 1
+                length     += 1
+                open_a, open_b = True, False
+        elif b[i] == "-":
+            if not open_b:
+                difference += 1
+                length     += 1
+                open_a, open_b = False, True
+        else:
+            difference += a[i] != b[i]
+            length     += 1
+            open_a, open_b = False, False
+
+    return difference / float(length) if length else 1.0
+
+def _distances(sequences):
+    matrix = np.frombuffer("".join(sequences).encode(), dtype = np.uint8).reshape(len(sequences), -1)
+    return distances(get_profile(matrix), get_profile(matrix))
+
+def test_distances():
+    # a run of gaps starting in a column gapped in both.
+    assert np.allclose(_distances(["AC--AGT", "AC-AAGT"])[0, 1], 1 / 6.)
+
+    sequences = [
+        "..AC--AGT-A..",
+        "...C-AAGTCA..",
+        "..ACG-A-T-A--",
+        "......AGTTACG",
+        "--AC.-AGT-A..",
+        ".............",
+        "..AAAA......."
+    ]
+
+    expected = np.array([[_onegap(a, b) for b in sequences] for a in sequences])
+
+    assert np.allclose(_distances(sequences), expected)
+
+def test_distances_random():
+    rng       = np.random.default_rng(0)
+    sequences = [ ]
+
+    for _ in range(40):
+        sequence = rng.choice(list("ACGT--"), size = 60)
+        lo, hi   = sorted(rng.integers(0, 60, size = 2))
+
+        sequence[:lo] = "."
+        sequence[hi:] = "."
+
+        sequences.append("".join(sequence))
+
+    expected = np.array([[_onegap(a, b) for b in sequences] for a in sequences])
+
+    assert np.allclose(_distances(sequences), expected)
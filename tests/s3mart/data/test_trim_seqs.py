@@ -0,0 +1,125 @@
+# imports - standard imports
+import sys
+
+# imports - module imports
+from s3mart.data.manifest import refresh_manifest
+from s3mart.data.functions.trim_seqs import (
+    schedule_trim_configs,
+    shard_trim_config,
+    trim_seqs,
+    get_trim_units,
+    build_trim_config
+)
+
+def test_schedule_trim_configs(tmpdir):
+    configs = []
+
+    for name, size in (("small", 10), ("large", 70), ("medium", 20)):
+        path = tmpdir.join("%s.fastq" % name)
+        path.write("A" * size)
+
+        configs.append({ "group": name, "files": [str(path)] })
+
+    configs = schedule_trim_configs(configs, jobs = 10)
+
+    assert [c["group"] for c in configs]      == ["large", "medium", "small"]
+    assert [c["processors"] for c in configs] == [7, 2, 1]
+
+def _write_study(data_dir, sras):
+    data = { "g1": [] }
+
+    for i, sra in enumerate(sras):
+        sra_dir = data_dir.mkdir(sra)
+        sra_dir.join("%s.fastq" % sra).write("".join("@%s.%s\n%s\n+\n%s\n" % (sra, j, "ACGT" * (i + 2), "I" * 4 * (i + 2))
+            for j in range(3)))
+
+        data["g1"].append({ "sra": sra, "layout": "single", "trimmed": "true",
+            "primer_f": "ACGT", "primer_r": "ACGT", "min_length": "1", "max_length": "100" })
+
+    return data
+
+def test_trim_seqs_sharded(tmpdir):
+    sras    = ["SRR1", "SRR2", "SRR3"]
+    outputs = []
+
+    for shard_size in (0, 2):
+        data_dir = tmpdir.mkdir("data-%s" % shard_size)
+        data     = _write_study(data_dir, sras)
+
+        trim_seqs(data_dir = str(data_dir), data = data, jobs = 2,
+            trim_backend = "native", trim_shard_size = shard_size)
+
+        target_dir = data_dir.join("trimmed", "g1", "single", "trimmed")
+
+        assert target_dir.join(".shards").exists() == bool(shard_size)
+
+        outputs.append([target_dir.join("trimmed.%s" % t).read() for t in ("fasta", "group", "summary")])
+
+    assert outputs[0] == outputs[1]
+    assert outputs[0][1].count("\n") == 9
+
+def test_shard_trim_config():
+    config = { "group": "g1", "target_dir": "/t", "files": ["/d/SRR1/SRR1_1.fastq", "/d/SRR1/SRR1_2.fastq",
+        "/d/SRR2/SRR2.fastq", "/d/SRR3/SRR3.fastq"] }
+
+    assert shard_trim_config(config, shard_size = 0) == [config]
+
+    shards = shard_trim_config(config, shard_size = 2)
+
+    assert [s["files"] for s in shards] == [config["files"][:3], config["files"][3:]]
+    assert shards[0]["target_dir"] != shards[1]["target_dir"]
+    assert shard_trim_config(config, shard_size = 2)[1]["target_dir"] == shards[1]["target_dir"]
+
+def test_trim_seqs_incremental(tmpdir):
+    data_dir   = tmpdir.mkdir("data")
+    data       = _write_study(data_dir, ["SRR1", "SRR2"])
+
+    target_dir = data_dir.join("trimmed", "g1", "single", "trimmed")
+    options    = dict(data_dir = str(data_dir), jobs = 2, trim_backend = "native", trim_shard_size = 1)
+
+    def mtimes():
+        return { s.basename: s.join("shard.fasta").mtime() for s in target_dir.join(".shards").listdir() }
+
+    trim_seqs(data = data, **options)
+    before = mtimes()
+
+    # unchanged inputs and parameters, nothing is trimmed again.
+    trim_seqs(data = data, **options)
+    assert mtimes() == before
+
+    # a new run only trims the new shard.
+    data_dir.mkdir("SRR3").join("SRR3.fastq").write("@SRR3.0\nACGTACGTACGT\n+\nIIIIIIIIIIII\n")
+    data["g1"].append(dict(data["g1"][0], sra = "SRR3"))
+
+    trim_seqs(data = data, **options)
+    after  = mtimes()
+
+    assert len(after) == 3
+    assert all(after[key] == mtime for key, mtime in before.items())
+    assert target_dir.join("trimmed.group").read().splitlines()[-1] == "SRR3.0\tSRR3"
+
+    # changing a parameter trims every shard again.
+    trim_seqs(data = data, **dict(options, primer_backend = "cutadapt"))
+    assert all(mtime != after[key] for key, mtime in mtimes().items())
+
+def test_build_trim_config_manifest(tmpdir, monkeypatch):
+    data_dir = tmpdir.mkdir("data")
+    data     = _write_study(data_dir, ["SRR1", "SRR2"])
+
+    for value in data["g1"]:
+        value["group"] = "g1"
+
+    unit     = [unit for unit in get_trim_units(data) if unit["filtered"]][0]
+    manifest = refresh_manifest(str(data_dir), ["SRR1", "SRR2"], jobs = 2)
+
+    signature = build_trim_config(unit, data_dir = str(data_dir), trim_backend = "native")["signature"]
+
+    # signed using the checksums of the manifest, nothing is hashed again.
+    def checksum(path):
+        raise AssertionError("%s hashed again." % path)
+
+    # the module, shadowed by the function of the same name within s3mart.data.functions.
+    monkeypatch.setattr(sys.modules["s3mart.data.functions.trim_seqs"], "checksum", checksum)
+
+    assert build_trim_config(unit, data_dir = str(data_dir), manifest = manifest,
+        trim_backend = "native")["signature"] == signature
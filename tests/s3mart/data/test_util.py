@@ -0,0 +1,149 @@
+import os
+import gzip
+
+# imports - module imports
+from s3mart.config import PATH
+from s3mart.data import util, budget
+from s3mart.data.util import link_file, stage_files, checksum, concatenate_files, install_silva_pcr, _write_probe
+
+def test_link_file(tmpdir):
+    source = tmpdir.join("source.fasta")
+    source.write(">seq\nACGT\n")
+
+    target = str(tmpdir.join("target", "target.fasta"))
+
+    assert link_file(str(source), target) == "hardlink"
+    assert open(target).read() == ">seq\nACGT\n"
+
+    assert checksum(target) == checksum(str(source))
+
+def test_stage_files(tmpdir):
+    files = []
+
+    for name in ("merged.fasta", "merged.group"):
+        path = tmpdir.join(name)
+        path.write("foobar")
+        files.append(str(path))
+
+    dest  = tmpdir.mkdir("stage")
+    stats = stage_files(*files, dest = str(dest))
+
+    assert stats["bytes_avoided"] == 12
+    assert sorted(os.listdir(str(dest))) == ["merged.fasta", "merged.group"]
+
+def test_stage_files_symlink(tmpdir, monkeypatch):
+    def fail(*args):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(util.os, "link", fail)
+    monkeypatch.setattr(util, "_reflink", fail)
+
+    source = tmpdir.join("silva.seed_v138_1.align")
+    source.write(">AB001\nACGT\n")
+
+    dest   = tmpdir.mkdir("stage")
+
+    # staged again onto the symbolic link of a previous run.
+    for _ in range(2):
+        assert stage_files(str(source), dest = str(dest))["symlink"] == 1
+
+    assert source.read() == ">AB001\nACGT\n"
+    assert os.path.islink(str(dest.join("silva.seed_v138_1.align")))
+    assert dest.join("silva.seed_v138_1.align").read() == ">AB001\nACGT\n"
+
+def test_concatenate_files(tmpdir):
+    sources = []
+
+    for i, content in enumerate(("a\nb\n", "c", "", "d\n")):
+        path = tmpdir.join("%s.txt" % i)
+        path.write(content)
+        sources.append(str(path))
+
+    target = tmpdir.join("merged.txt")
+    target.write("stale")
+
+    assert concatenate_files(sources, str(target)) == 7
+    assert target.read() == "a\nb\nc\nd\n"
+
+    target = str(tmpdir.join("merged.txt.gz"))
+    concatenate_files(sources, target, compression = "gzip")
+
+    with gzip.open(target, "rt") as f:
+        assert f.read() == "a\nb\nc\nd\n"
+
+    assert [f.basename for f in tmpdir.listdir() if f.ext == ".tmp"] == []
+
+def test_write_probe(tmpdir):
+    reference = tmpdir.join("silva.seed_v138_1.align")
+    reference.write(">AB001 Bacteria;Firmicutes\n..AC-G\nT--A..\n>AB002\nTTTT\n")
+
+    probe = tmpdir.join("probe.fasta")
+    _write_probe(str(reference), str(probe))
+
+    assert probe.read() == ">AB001\nACGTA\n"
+
+def _silva(tmpdir):
+    seed = tmpdir.join("silva", "silva.seed_v138_1.align")
+    seed.write(">AB001\n..AC-GT..\n", ensure = True)
+
+    taxonomy = tmpdir.join("silva", "silva.seed_v138_1.tax")
+    taxonomy.write("AB001\tBacteria;\n")
+
+    return { "seed": str(seed), "taxonomy": str(taxonomy) }
+
+def test_install_silva_pcr(tmpdir, monkeypatch):
+    monkeypatch.setitem(PATH, "CACHE", str(tmpdir.join("cache")))
+    monkeypatch.setattr(budget, "CACHE", str(tmpdir.join("cache")))
+
+    runs   = []
+    linked = []
+
+    def run_mothur(script, cwd = None, name = None):
+        runs.append(name)
+
+        # the alignment and one of the databases mothur builds from it.
+        for ext in ("pcr.align", "pcr.8mer"):
+            with open(os.path.join(cwd, "silva.seed_v138_1.%s" % ext), "w") as f:
+                f.write(ext)
+
+        return 0
+
+    def link_file_(source, target, **kwargs):
+        linked.append(os.path.basename(target))
+        return link_file(source, target, **kwargs)
+
+    monkeypatch.setattr(util, "run_mothur", run_mothur)
+    monkeypatch.setattr(util, "link_file",  link_file_)
+
+    silva_paths = _silva(tmpdir)
+
+    path = install_silva_pcr(silva_paths, start = 11894, end = 25319, jobs = 1)
+
+    assert path.endswith(os.path.join("11894-25319", "silva.seed_v138_1.pcr.align"))
+    assert open(path).read() == "pcr.align"
+
+    # the alignment is linked last, marking the cache as complete.
+    assert linked[-1] == "silva.seed_v138_1.pcr.align"
+    assert sorted(linked[-3:-1]) == ["silva.seed_v138_1.pcr.8mer", "silva.seed_v138_1.tax"]
+    assert sorted(os.listdir(os.path.dirname(path))) == [
+        "silva.seed_v138_1.pcr.8mer", "silva.seed_v138_1.pcr.align", "silva.seed_v138_1.tax"
+    ]
+
+    assert install_silva_pcr(silva_paths, start = 11894, end = 25319, jobs = 1) == path
+    assert runs == ["silva_pcr"]
+
+def test_install_silva_pcr_failure(tmpdir, monkeypatch):
+    monkeypatch.setitem(PATH, "CACHE", str(tmpdir.join("cache")))
+    monkeypatch.setattr(budget, "CACHE", str(tmpdir.join("cache")))
+
+    monkeypatch.setattr(util, "run_mothur", lambda script, cwd = None, name = None: 1)
+
+    silva_paths = _silva(tmpdir)
+
+    assert install_silva_pcr(silva_paths, start = 11894, end = 25319, jobs = 1) is None
+
+    # mothur exiting cleanly without an alignment.
+    monkeypatch.setattr(util, "run_mothur", lambda script, cwd = None, name = None: 0)
+
+    assert install_silva_pcr(silva_paths, start = 11894, end = 25319, jobs = 1) is None
+    assert not os.path.exists(str(tmpdir.join("cache", "silva", "pcr", "v138_1-11894-25319")))